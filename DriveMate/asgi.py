@@ -2,6 +2,8 @@
 ASGI config for DriveMate project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Besides Django's HTTP handling it serves the WebSocket endpoints below
+(DriveMate/websocket.py), e.g. with ``uvicorn DriveMate.asgi:application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -13,4 +15,11 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'DriveMate.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from DriveMate.websocket import websocket_router  # noqa: E402  (needs settings)
+
+application = websocket_router(django_application, {
+    "/ws/driver/inbox/": "rides.inbox.driver_inbox",
+    "/ws/admin/sos/": "rides.sos.admin_sos_feed",
+})
@@ -0,0 +1,130 @@
+"""
+Build-time Tailwind CSS.
+
+The pages used to load the Tailwind Play CDN runtime (a 400 KB script) and
+generate their styles in the browser on every load. Instead,
+`manage.py build_css` scans every project template for class names, compiles
+them with the same Tailwind build (3.4.17, DriveMate/tailwind/) under Node,
+minifies the result and writes one stylesheet,
+
+    accounts/static/css/drivemate.css
+
+which the templates link with {% static %}. Only classes that appear in a
+template are emitted. `collectstatic` then stores it, like every static file,
+under a content-hashed name with .gz and .br copies (StaticFilesStorage below),
+and WhiteNoise serves hashed names with far-future, immutable cache headers.
+
+Rebuild and commit the CSS after changing classes in a template;
+AssetTests checks that it is up to date with the templates.
+"""
+import json
+import re
+import shutil
+import subprocess
+from pathlib import Path
+
+from django.conf import settings
+from django.template.utils import get_app_template_dirs
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+TAILWIND_DIR = Path(__file__).resolve().parent / "tailwind"
+CSS_SOURCE = TAILWIND_DIR / "input.css"
+CSS_OUTPUT = Path(settings.BASE_DIR) / "accounts" / "static" / "css" / "drivemate.css"
+TEMPLATE_SUFFIXES = (".html", ".txt", ".js")
+
+# Anything between quotes, whitespace and markup delimiters may be a class,
+# including names in JS strings (classList.add('hidden')). Tailwind ignores
+# tokens that are not utilities, so over-matching only costs build time.
+TOKEN = re.compile(r"""[^\s"'`<>={}]+""")
+CANDIDATE = re.compile(r"^!?-?[a-z0-9@\[]")
+
+_CSS_COMMENT_OR_STRING = re.compile(r"""/\*.*?\*/|"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'""", re.S)
+# "--tw-pan-x: ;" keeps its space: an empty custom property is invalid in older browsers
+_CSS_PUNCTUATION = re.compile(r"(?<!:)\s*([{};,>~])\s*|:\s+(?![;}])")
+
+
+class AssetBuildError(Exception):
+    pass
+
+
+def template_files():
+    """Every template of the project's own apps (not Django's or third parties')."""
+    base = Path(settings.BASE_DIR).resolve()
+    dirs = [Path(d) for engine in settings.TEMPLATES for d in engine.get("DIRS", [])]
+    dirs += [Path(d) for d in get_app_template_dirs("templates")]
+    for directory in dirs:
+        if directory.resolve().is_relative_to(base) and directory.is_dir():
+            yield from sorted(p for p in directory.rglob("*") if p.suffix in TEMPLATE_SUFFIXES)
+
+
+def class_candidates(text):
+    found = set()
+    for token in TOKEN.findall(text):
+        token = token.rstrip(".,;:)")
+        if CANDIDATE.match(token):
+            found.add(token)
+    return found
+
+
+def scan_templates(files=None):
+    candidates = set()
+    for path in template_files() if files is None else files:
+        candidates |= class_candidates(Path(path).read_text(encoding="utf-8"))
+    return sorted(candidates)
+
+
+def compile_css(candidates, css="", config=None):
+    """Run Tailwind over the candidates; returns the unminified stylesheet."""
+    node = shutil.which("node")
+    if node is None:
+        raise AssetBuildError("building the CSS needs Node.js (`node` on PATH)")
+    payload = json.dumps({"candidates": list(candidates), "css": css, "config": config or {}})
+    result = subprocess.run([node, str(TAILWIND_DIR / "compile.js")], input=payload,
+                            capture_output=True, text=True, timeout=300)
+    if result.returncode != 0:
+        raise AssetBuildError(f"tailwind failed: {result.stderr.strip()}")
+    return result.stdout
+
+
+def minify_css(css):
+    """Drop comments and insignificant whitespace. Strings are left alone."""
+    parts, pos = [], 0
+    for match in _CSS_COMMENT_OR_STRING.finditer(css):
+        parts.append(_squeeze(css[pos:match.start()]))
+        if not match.group().startswith("/*"):
+            parts.append(match.group())
+        pos = match.end()
+    parts.append(_squeeze(css[pos:]))
+    return "".join(parts).replace(";}", "}").strip()
+
+
+def _squeeze(text):
+    text = re.sub(r"\s+", " ", text)
+    return _CSS_PUNCTUATION.sub(lambda m: m.group(1) or ":", text)
+
+
+def build_css(output=CSS_OUTPUT):
+    """Scan, compile, minify and write the stylesheet. Returns (candidates, bytes written)."""
+    candidates = scan_templates()
+    css = minify_css(compile_css(candidates, CSS_SOURCE.read_text(encoding="utf-8")))
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(css + "\n", encoding="utf-8")
+    return candidates, len(css) + 1
+
+
+class StaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """WhiteNoise's compressed manifest storage, usable before collectstatic.
+
+    {% static %} maps names to hashed ones through the manifest collectstatic
+    writes. Until that has run (a fresh checkout, the test runner) the plain
+    name is returned instead of raising.
+    """
+
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
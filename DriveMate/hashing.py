@@ -0,0 +1,124 @@
+"""
+Password hashing off the request thread.
+
+PBKDF2/Argon2 are deliberately CPU-heavy (hundreds of milliseconds per hash).
+Called inline, every login or registration pins a request worker for that
+long, and a burst of them saturates all workers while everything else
+queues behind. hash_password/verify_password run the hash in a bounded
+process pool instead:
+
+- PASSWORD_HASH_WORKERS processes per server process (default 1; 0 hashes
+  inline)
+- at most PASSWORD_HASH_MAX_PENDING hashes queued or running per server
+  process; beyond that HashingSaturated is raised immediately and the view
+  answers 503 with Retry-After instead of letting requests pile up
+- PASSWORD_HASH_TIMEOUT seconds to wait for a result (also HashingSaturated)
+
+Each gunicorn worker has its own pool, so the default of one process keeps
+hashing to WEB_WORKERS processes in total, the same order as the cores:
+a login burst can take those, but not every request thread of every worker.
+More would only oversubscribe the CPUs (hashes are CPU-bound). The gain is
+for everything else: benchmarks/login_throughput.py measures page latency
+during a burst next to the logins/s.
+
+The pool is started lazily in each server process with the "spawn" start
+method, so it is safe to create from a threaded server. Its processes load
+settings and the hashers only, not the apps (no django.setup()), to keep
+them small.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+from DriveMate import metrics
+
+
+class HashingSaturated(Exception):
+    """Too many password hashes in flight (or the pool is not answering); retry later."""
+
+
+_lock = threading.Lock()
+_executor = None
+_slots = None
+
+
+def _init_worker(settings_module):
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+
+
+def _make_password(raw_password):
+    from django.contrib.auth.hashers import make_password
+    return make_password(raw_password)
+
+
+def _check_password(raw_password, encoded):
+    from django.contrib.auth.hashers import check_password
+    return check_password(raw_password, encoded)
+
+
+def pool_size():
+    workers = getattr(settings, "PASSWORD_HASH_WORKERS", None)
+    return 1 if workers is None else workers
+
+
+def _get_executor():
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            workers = pool_size()
+            max_pending = getattr(settings, "PASSWORD_HASH_MAX_PENDING", None) or workers * 4
+            _executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(os.environ.get("DJANGO_SETTINGS_MODULE", "DriveMate.settings"),),
+            )
+            _slots = threading.BoundedSemaphore(max_pending)
+        return _executor, _slots
+
+
+def shutdown():
+    """Stop the pool (it is recreated on next use)."""
+    global _executor, _slots
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = _slots = None
+
+
+def _run(func, *args):
+    if not pool_size():
+        return func(*args)
+    executor, slots = _get_executor()
+    if not slots.acquire(blocking=False):
+        metrics.inc("drivemate_password_hash_rejected_total")
+        raise HashingSaturated()
+    try:
+        future = executor.submit(func, *args)
+    except BrokenProcessPool:
+        slots.release()
+        shutdown()
+        raise HashingSaturated()
+    future.add_done_callback(lambda f: slots.release())
+    try:
+        return future.result(timeout=getattr(settings, "PASSWORD_HASH_TIMEOUT", 10))
+    except FutureTimeout:
+        metrics.inc("drivemate_password_hash_rejected_total")
+        raise HashingSaturated()
+    except BrokenProcessPool:
+        shutdown()
+        raise HashingSaturated()
+
+
+def hash_password(raw_password):
+    """make_password() in the hashing pool."""
+    return _run(_make_password, raw_password)
+
+
+def verify_password(raw_password, encoded):
+    """check_password() in the hashing pool (no rehash-on-upgrade)."""
+    return _run(_check_password, raw_password, encoded)
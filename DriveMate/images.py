@@ -0,0 +1,169 @@
+"""
+Responsive renditions of uploaded images.
+
+Vehicle photos and driver profile pictures are uploaded at full camera size
+(up to UPLOAD_MAX_FILE_SIZE), but shown in carousels and avatars a few hundred
+pixels wide. After an upload commits, each original is resized to
+IMAGE_RENDITION_WIDTHS in every IMAGE_RENDITION_FORMATS format Pillow can
+encode, and the files are stored next to it:
+
+    vehicle_images/m4_1.png
+    vehicle_images/renditions/m4_1-320w.avif
+    vehicle_images/renditions/m4_1-320w.webp ...
+
+The model keeps the metadata in a JSONField, which the {% picture %} tag
+(vehicles/templatetags/responsive_images.py) turns into <source srcset>:
+
+    {"source": "vehicle_images/m4_1.png", "width": 3000, "height": 2000,
+     "sources": {"avif": [[320, "vehicle_images/renditions/m4_1-320w.avif"], ...],
+                 "webp": [...]}}
+
+Rendering is a job on the 'images' queue (DriveMate/jobs.py), queued in the
+same transaction as the upload and never run on the request. Pillow releases
+the GIL while decoding, resizing and encoding, so the worker's threads are
+enough. Until renditions exist, or while they still describe a replaced file
+("source" differs from the field), templates fall back to the original. A file
+Pillow cannot read gets {"source": name, "error": ...} with no "sources", so
+it is not queued again on every save; `generate_renditions --force` retries it.
+"""
+import logging
+import os
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from django.db.models.signals import post_save
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+from DriveMate import metrics
+from DriveMate.jobs import enqueue, job
+
+logger = logging.getLogger(__name__)
+
+# model label -> (file field, metadata JSONField)
+RENDITION_FIELDS = {
+    "vehicles.VehicleImage": ("image", "renditions"),
+    "accounts.Driver": ("profile_pic", "profile_pic_renditions"),
+}
+
+CONTENT_TYPES = {"avif": "image/avif", "webp": "image/webp", "jpeg": "image/jpeg"}
+
+
+def rendition_formats():
+    """Configured formats this Pillow build can encode, best first."""
+    return [fmt for fmt in getattr(settings, "IMAGE_RENDITION_FORMATS", ("avif", "webp"))
+            if fmt == "jpeg" or features.check(fmt)]
+
+
+def rendition_name(name, width, fmt):
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return f"{directory}/renditions/{stem}-{width}w.{fmt}" if directory else f"renditions/{stem}-{width}w.{fmt}"
+
+
+def _encode(image, fmt):
+    quality = getattr(settings, "IMAGE_RENDITION_QUALITY", {}).get(fmt, 75)
+    if fmt == "jpeg" and image.mode != "RGB":
+        image = image.convert("RGB")
+    buf = BytesIO()
+    image.save(buf, fmt.upper(), quality=quality)
+    return buf.getvalue()
+
+
+def build_renditions(field_file):
+    """Render and store every width/format of field_file. Returns the metadata dict."""
+    storage, name = field_file.storage, field_file.name
+    with storage.open(name, "rb") as fh:
+        original = Image.open(fh)
+        original = ImageOps.exif_transpose(original)
+        original.load()
+    if original.mode not in ("RGB", "RGBA"):
+        original = original.convert("RGBA" if "A" in original.getbands() or "transparency" in original.info else "RGB")
+    width, height = original.size
+
+    # never upscale; an image narrower than every width gets one rendition at its own size
+    widths = [w for w in sorted(getattr(settings, "IMAGE_RENDITION_WIDTHS", (320, 640, 1280))) if w < width] or [width]
+    resized = {w: original if w == width else original.resize((w, max(1, round(height * w / width))), Image.LANCZOS)
+               for w in widths}
+
+    sources = {}
+    for fmt in rendition_formats():
+        sources[fmt] = []
+        for w in widths:
+            target = rendition_name(name, w, fmt)
+            if storage.exists(target):
+                storage.delete(target)
+            saved = storage.save(target, ContentFile(_encode(resized[w], fmt)))
+            sources[fmt].append([w, saved])
+    return {"source": name, "width": width, "height": height, "sources": sources}
+
+
+def rendition_names(meta):
+    return {name for entries in (meta or {}).get("sources", {}).values() for _, name in entries}
+
+
+@job(queue="images", max_attempts=3)
+def render_instance(label, pk):
+    """Build renditions for one row and store the metadata. Returns it, or None."""
+    model = apps.get_model(label)
+    file_field, meta_field = RENDITION_FIELDS[label]
+    obj = model.objects.filter(pk=pk).only(file_field, meta_field).first()
+    field_file = getattr(obj, file_field, None) if obj else None
+    if not field_file:
+        return None
+    old = getattr(obj, meta_field) or {}
+    try:
+        meta = build_renditions(field_file)
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError, ValueError) as exc:
+        logger.warning("Could not render %s for %s pk=%s", field_file.name, label, pk, exc_info=True)
+        metrics.inc("drivemate_image_renditions_total", (("result", "error"),))
+        failed = {"source": field_file.name, "error": type(exc).__name__}
+        model.objects.filter(pk=pk, **{file_field: field_file.name}).update(**{meta_field: failed})
+        return None
+    # .update() skips post_save, and the file filter drops results for a
+    # file that was replaced while we were rendering
+    updated = model.objects.filter(pk=pk, **{file_field: field_file.name}).update(**{meta_field: meta})
+    stale = rendition_names(old) - rendition_names(meta) if updated else rendition_names(meta)
+    if getattr(field_file.storage, "content_addressed", False):
+        stale = ()  # renditions may be shared; they are deleted with their blob (DriveMate/storage.py)
+    for name in stale:
+        field_file.storage.delete(name)
+    metrics.inc("drivemate_image_renditions_total", (("result", "ok" if updated else "stale"),))
+    return meta if updated else None
+
+
+def render_in_thread(label, pk):
+    """render_instance() for pool threads, which manage their own DB connections."""
+    close_old_connections()
+    try:
+        return render_instance(label, pk)
+    finally:
+        close_old_connections()
+
+
+def needs_renditions(instance, label):
+    file_field, meta_field = RENDITION_FIELDS[label]
+    field_file = getattr(instance, file_field)
+    meta = getattr(instance, meta_field) or {}
+    return bool(field_file) and meta.get("source") != field_file.name
+
+
+def _on_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    label = sender._meta.label
+    file_field = RENDITION_FIELDS[label][0]
+    if raw or (update_fields is not None and file_field not in update_fields):
+        return
+    if not needs_renditions(instance, label):
+        return
+    # queued in the upload's transaction: a worker only sees it once the file and row are committed;
+    # the key makes saving the same file again (before the job has run) a no-op
+    file_name = getattr(instance, file_field).name
+    enqueue(render_instance, key=f"render:{label}:{instance.pk}:{file_name}", using=kwargs.get("using"),
+            label=label, pk=instance.pk)
+
+
+def connect_signals():
+    for label in RENDITION_FIELDS:
+        post_save.connect(_on_save, sender=label, dispatch_uid=f"drivemate_renditions_{label}")
@@ -0,0 +1,282 @@
+"""
+A small database-backed job queue for work that does not have to finish
+before the response: rating averages, closing the requests that lost a
+ride, storing fares, image renditions.
+
+A job is a row in accounts.Job naming a function and its keyword arguments:
+
+    @job(queue="images", max_attempts=3)
+    def render_instance(label, pk): ...
+
+    enqueue(render_instance, label="vehicles.VehicleImage", pk=7)
+    enqueue(update_rating_averages, key=f"rating:{rating.pk}", driver_id=3)
+
+The row is written on the caller's connection, inside its transaction: a job
+exists if and only if the write that asked for it committed, and a job never
+runs before that data is visible. `key` makes enqueueing idempotent: while a
+job with the same key is kept (JOB_RETENTION after it finished), enqueueing
+it again returns the existing job.
+
+`manage.py run_workers` runs the jobs. Each queue in JOB_QUEUES has its own
+thread pool, so a backlog in one (say, images) cannot hold up another, and
+at most that many of its jobs run at once per worker process. An idle queue
+is polled every JOB_POLL_INTERVAL seconds, or as set per queue in
+JOB_POLL_INTERVALS (the SOS lane checks every 100 ms). Jobs are claimed
+with a conditional UPDATE ... WHERE status='queued', the same way
+RideRequest.accept settles races, so any number of worker processes can
+share the table. A job that raises is retried after an exponential,
+jittered backoff until max_attempts, then marked failed; a job whose worker
+died is picked up again after JOB_LOCK_TIMEOUT. Delivery is therefore at
+least once: jobs must be safe to run twice.
+
+Jobs in JOB_SCHEDULE are also queued by the workers every N seconds, once
+per interval however many workers there are (the expiry sweep of
+unanswered ride requests).
+
+With JOBS_EAGER each job runs on the enqueueing thread right after commit
+instead (tests, or a single-process setup without workers).
+"""
+import logging
+import os
+import random
+import signal
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from DriveMate import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def job(queue="default", max_attempts=None, backoff=None):
+    """Mark a module-level function as a job. It stays a plain function."""
+    def decorate(func):
+        func.job_queue = queue
+        func.job_max_attempts = max_attempts
+        func.job_backoff = backoff
+        return func
+    return decorate
+
+
+def _job_model():
+    return apps.get_model("accounts", "Job")
+
+
+def task_name(func):
+    return f"{func.__module__}.{func.__qualname__}"
+
+
+def enqueue(func, key=None, delay=None, using=None, **kwargs):
+    """Queue func(**kwargs); kwargs must be JSON-serialisable. Returns the Job."""
+    if not hasattr(func, "job_queue"):
+        raise TypeError(f"{task_name(func)} is not a @job")
+    Job = _job_model()
+    new = Job(
+        task=task_name(func), queue=func.job_queue, kwargs=kwargs, key=key,
+        max_attempts=func.job_max_attempts or settings.JOB_MAX_ATTEMPTS,
+        run_at=timezone.now() + (delay or timedelta(0)),
+    )
+    if key is None:
+        new.save(using=using)
+    else:
+        # INSERT ... ON CONFLICT DO NOTHING: the unique key settles duplicates, no savepoint needed
+        Job.objects.using(using).bulk_create([new], ignore_conflicts=True)
+        new = Job.objects.using(using).get(key=key)
+    if getattr(settings, "JOBS_EAGER", False):
+        transaction.on_commit(lambda: run_job(new.pk, "eager"), using=using)
+    return new
+
+
+def retry_delay(attempt, backoff=None):
+    """Seconds before retry number `attempt` (1, 2, ...): exponential, capped, jittered."""
+    base, cap = backoff or settings.JOB_RETRY_BACKOFF
+    delay = min(cap, base * 2 ** (attempt - 1))
+    return random.uniform(delay / 2, delay)
+
+
+def claim(queue, limit, worker):
+    """Lock up to `limit` due jobs of `queue` for `worker`; returns their ids."""
+    if limit <= 0:
+        return []
+    Job = _job_model()
+    now = timezone.now()
+    due = Job.objects.filter(queue=queue, status=Job.Status.QUEUED, run_at__lte=now).order_by("run_at", "pk")
+    claimed = []
+    for pk in due.values_list("pk", flat=True)[:limit]:
+        # only one worker's UPDATE matches a queued row
+        if Job.objects.filter(pk=pk, status=Job.Status.QUEUED).update(
+            status=Job.Status.RUNNING, locked_by=worker, locked_at=now, attempts=F("attempts") + 1
+        ):
+            claimed.append(pk)
+    return claimed
+
+
+def run_job(pk, worker):
+    """Run one job; claims it first unless `worker` already holds it. Returns True on success."""
+    Job = _job_model()
+    job_row = Job.objects.filter(pk=pk).first()
+    if job_row is None:
+        return False
+    if job_row.status != Job.Status.RUNNING or job_row.locked_by != worker:
+        if not Job.objects.filter(pk=pk, status=Job.Status.QUEUED).update(
+            status=Job.Status.RUNNING, locked_by=worker, locked_at=timezone.now(), attempts=F("attempts") + 1
+        ):
+            return False  # someone else has it, or it is finished
+        job_row.refresh_from_db()
+
+    held = Job.objects.filter(pk=pk, status=Job.Status.RUNNING, locked_by=worker)
+    labels = (("queue", job_row.queue),)
+    started = time.monotonic()
+    func = None
+    try:
+        func = import_string(job_row.task)
+        func(**job_row.kwargs)
+    except Exception as exc:
+        metrics.observe("drivemate_job_duration_seconds", time.monotonic() - started, labels)
+        error = "".join(traceback.format_exception(exc))[-4000:]
+        if job_row.attempts >= job_row.max_attempts:
+            held.update(status=Job.Status.FAILED, last_error=error, finished_at=timezone.now(), locked_by="")
+            logger.error("Job %s (%s) failed after %s attempts", pk, job_row.task, job_row.attempts, exc_info=True)
+            metrics.inc("drivemate_jobs_total", labels + (("result", "failed"),))
+        else:
+            delay = retry_delay(job_row.attempts, getattr(func, "job_backoff", None))
+            held.update(status=Job.Status.QUEUED, last_error=error, locked_by="",
+                        run_at=timezone.now() + timedelta(seconds=delay))
+            logger.warning("Job %s (%s) failed, retrying in %.0fs", pk, job_row.task, delay, exc_info=True)
+            metrics.inc("drivemate_jobs_total", labels + (("result", "retried"),))
+        return False
+    metrics.observe("drivemate_job_duration_seconds", time.monotonic() - started, labels)
+    held.update(status=Job.Status.DONE, finished_at=timezone.now(), locked_by="")
+    metrics.inc("drivemate_jobs_total", labels + (("result", "done"),))
+    return True
+
+
+def requeue_stale():
+    """Give jobs whose worker stopped answering (locked > JOB_LOCK_TIMEOUT ago) back to the queue."""
+    Job = _job_model()
+    stale = Job.objects.filter(status=Job.Status.RUNNING,
+                               locked_at__lt=timezone.now() - timedelta(seconds=settings.JOB_LOCK_TIMEOUT))
+    failed = stale.filter(attempts__gte=F("max_attempts")).update(
+        status=Job.Status.FAILED, last_error="worker lost", finished_at=timezone.now(), locked_by="")
+    return failed + stale.update(status=Job.Status.QUEUED, locked_by="", run_at=timezone.now())
+
+
+def prune():
+    """Delete jobs that finished more than JOB_RETENTION ago (their keys become free again)."""
+    Job = _job_model()
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_RETENTION)
+    deleted, _ = Job.objects.filter(status__in=[Job.Status.DONE, Job.Status.FAILED], finished_at__lt=cutoff).delete()
+    return deleted
+
+
+def enqueue_scheduled(seen=None, now=None):
+    """Queue each JOB_SCHEDULE job whose interval has begun. Returns the jobs.
+
+    The key names the interval, so however many workers call this, one job
+    runs per interval; `seen` (path -> last interval) saves the INSERT when
+    this process has already queued it.
+    """
+    now = time.time() if now is None else now
+    seen = {} if seen is None else seen
+    queued = []
+    for path, every in getattr(settings, "JOB_SCHEDULE", {}).items():
+        slot = int(now // every)
+        if seen.get(path) != slot:
+            queued.append(enqueue(import_string(path), key=f"schedule:{path}:{slot}"))
+            seen[path] = slot
+    return queued
+
+
+def run_pending(queues=None, worker="inline"):
+    """Run every due job of `queues` (default: all) on this thread, oldest first. Returns the count."""
+    ran = 0
+    for queue in queues or settings.JOB_QUEUES:
+        while True:
+            claimed = claim(queue, 1, worker)
+            if not claimed:
+                break
+            run_job(claimed[0], worker)
+            ran += 1
+    return ran
+
+
+def _run_in_thread(pk, worker):
+    """run_job() for pool threads, which manage their own DB connections."""
+    close_old_connections()
+    try:
+        return run_job(pk, worker)
+    except Exception:
+        logger.exception("Job %s could not be run", pk)
+    finally:
+        close_old_connections()
+
+
+class Worker:
+    """The loop behind `manage.py run_workers`: claims due jobs into one thread pool per queue."""
+
+    def __init__(self, limits=None, poll_interval=None):
+        self.limits = dict(settings.JOB_QUEUES if limits is None else limits)  # queue -> threads
+        self.poll_interval = settings.JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+        intervals = getattr(settings, "JOB_POLL_INTERVALS", {})
+        self.poll_intervals = {q: min(intervals.get(q, self.poll_interval), self.poll_interval) for q in self.limits}
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.stopping = threading.Event()
+        self.running = {q: set() for q in self.limits}  # futures in flight per queue
+        self.scheduled = {}  # JOB_SCHEDULE path -> last interval queued
+
+    def stop(self, *args):
+        self.stopping.set()
+
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+    def run(self, burst=False):
+        """Work until stop() (or, with burst, until nothing is due). Returns the number of jobs run."""
+        pools = {q: ThreadPoolExecutor(max_workers=n, thread_name_prefix=f"jobs-{q}") for q, n in self.limits.items()}
+        ran = 0
+        last_maintenance = 0.0
+        next_poll = dict.fromkeys(self.limits, 0.0)  # each queue is polled at its own interval
+        try:
+            while not self.stopping.is_set():
+                if time.monotonic() - last_maintenance > settings.JOB_LOCK_TIMEOUT / 2:
+                    requeue_stale()
+                    prune()
+                    last_maintenance = time.monotonic()
+                enqueue_scheduled(self.scheduled)
+                claimed = 0
+                now = time.monotonic()
+                for queue, limit in self.limits.items():
+                    in_flight = self.running[queue]
+                    in_flight -= {f for f in in_flight if f.done()}
+                    if (now < next_poll[queue] and not burst) or len(in_flight) >= limit:
+                        continue
+                    got = claim(queue, limit - len(in_flight), self.name)
+                    for pk in got:
+                        in_flight.add(pools[queue].submit(_run_in_thread, pk, self.name))
+                    if not got:
+                        next_poll[queue] = now + self.poll_intervals[queue]
+                    claimed += len(got)
+                ran += claimed
+                busy = any(self.running.values())
+                if burst and not claimed and not busy:
+                    break
+                if not claimed:
+                    wait = max(0.0, min(next_poll.values()) - time.monotonic())
+                    self.stopping.wait(min(wait, 0.1) if busy else wait)
+        finally:
+            for pool in pools.values():
+                pool.shutdown(wait=True)  # let running jobs finish; unclaimed ones stay queued
+            close_old_connections()
+        return ran
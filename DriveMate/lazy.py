@@ -0,0 +1,44 @@
+"""
+Lazily imported views for the URLconf.
+
+    path("login/", lazy_view("accounts.views.login_view"), name="login")
+
+Loading the URLconf no longer imports every view module (and what those
+import). A view module is imported the first time one of its views is
+called, or when tooling reads one of its attributes (query_budget,
+allowed_roles, csrf_exempt, ...). Name, module and qualname are known from
+the dotted path, so resolving and reversing URLs does not import anything.
+
+Only function views are supported (not ``SomeView.as_view()``).
+"""
+from django.utils.module_loading import import_string
+
+
+class LazyView:
+    def __init__(self, dotted_path):
+        self.dotted_path = dotted_path
+        self.__module__, self.__name__ = dotted_path.rsplit(".", 1)
+        self.__qualname__ = self.__name__
+        self._view = None
+
+    def resolve(self):
+        if self._view is None:
+            self._view = import_string(self.dotted_path)
+        return self._view
+
+    def __call__(self, request, *args, **kwargs):
+        return self.resolve()(request, *args, **kwargs)
+
+    def __getattr__(self, name):
+        # never import for dunders (copy/pickle/inspect) or the class-based-view
+        # probes Django makes while building its URL lookup tables
+        if name.startswith("__") or name in ("view_class", "view_initkwargs"):
+            raise AttributeError(name)
+        return getattr(self.resolve(), name)
+
+    def __repr__(self):
+        return f"<LazyView {self.dotted_path}>"
+
+
+def lazy_view(dotted_path):
+    return LazyView(dotted_path)
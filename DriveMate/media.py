@@ -0,0 +1,46 @@
+"""
+Serving uploaded media.
+
+Content-addressed names (DriveMate/storage.py) never change meaning, so they
+are served with a year-long, immutable Cache-Control and the digest as the
+ETag: browsers and CDNs keep them without revalidating, and a conditional
+request is answered 304 without touching the disk. Anything else (legacy
+names) is served as before, revalidated with Last-Modified.
+
+Identity documents (Driver.id_proof, which holds the licence scan) are the
+exception: they are sent "private, no-store", so neither a shared cache nor
+the browser of a shared device keeps a copy. Vehicle photos, profile pictures
+and their renditions stay public.
+"""
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
+
+from DriveMate.perf import query_budget
+from DriveMate.storage import blob_digest
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+PRIVATE_DIRS = ("id_proofs",)  # upload_to of Driver.id_proof
+
+
+@query_budget(0)
+def serve_media(request, path):
+    if PurePosixPath(path).parts[0] in PRIVATE_DIRS:
+        response = serve(request, path, document_root=settings.MEDIA_ROOT)
+        del response["Last-Modified"]
+        patch_cache_control(response, private=True, no_store=True)
+        return response
+    if blob_digest(path) is None:
+        return serve(request, path, document_root=settings.MEDIA_ROOT)
+    etag = f'"{PurePosixPath(path).name}"'  # <digest>.<ext>, or <digest>-<width>w.<ext> for renditions
+    if etag in request.META.get("HTTP_IF_NONE_MATCH", ""):
+        response = HttpResponseNotModified()
+    else:
+        response = serve(request, path, document_root=settings.MEDIA_ROOT)
+        del response["Last-Modified"]
+    response["ETag"] = etag
+    patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    return response
@@ -0,0 +1,382 @@
+"""
+In-process metrics with a Prometheus text exposition and Server-Timing headers.
+
+Every thread records into its own registry (plain dicts, no locks on the hot
+path); a scrape of /metrics merges the per-thread registries. Recording a
+request costs a few dict updates, i.e. microseconds.
+
+Collected:
+- drivemate_view_latency_seconds       histogram per view
+- drivemate_db_queries_total           counter per view
+- drivemate_db_time_seconds_total      counter per view
+- drivemate_routing_latency_seconds    histogram per routing outcome (calculate_distance_osrm)
+- drivemate_cache_requests_total       counter per cache and hit/miss (InstrumentedLocMemCache)
+- drivemate_ride_time_to_match_seconds histogram per dispatch mode (RideRequest.accept)
+- drivemate_sos_delivery_seconds       histogram of SOS trigger -> admin delivery (rides/sos.py)
+
+Metrics are recorded per process. With METRICS_DIR set (gunicorn.conf.py sets
+it), every process also writes its totals to a file there every
+METRICS_FLUSH_INTERVAL seconds and on exit, and /metrics adds up the files of
+all processes: each web worker, the run_workers sidecar and processes that
+have exited. So any worker answering a scrape reports the whole server, at
+most METRICS_FLUSH_INTERVAL behind for the other processes.
+"""
+import atexit
+import bisect
+import contextvars
+import fcntl
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# histograms measuring something slower than a request
+BUCKETS = {
+    "drivemate_ride_time_to_match_seconds": (1, 2, 5, 10, 20, 30, 60, 120, 300, 600, 1800),
+    "drivemate_sos_delivery_seconds": (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0),
+}
+
+HELP = {
+    "drivemate_view_latency_seconds": ("histogram", "View latency in seconds."),
+    "drivemate_db_queries_total": ("counter", "SQL queries executed, per view."),
+    "drivemate_db_time_seconds_total": ("counter", "Time spent in SQL, per view."),
+    "drivemate_routing_latency_seconds": ("histogram", "Latency of routing (OSRM) calls in seconds."),
+    "drivemate_cache_requests_total": ("counter", "Cache lookups by result."),
+    "drivemate_password_hash_rejected_total": ("counter", "Password hashes refused because the hashing pool was saturated."),
+    "drivemate_login_ratelimited_total": ("counter", "Login attempts rejected by the rate limiter, per bucket."),
+    "drivemate_image_renditions_total": ("counter", "Uploaded images rendered to responsive sizes, by result."),
+    "drivemate_jobs_total": ("counter", "Background jobs run, per queue and result (done, retried, failed)."),
+    "drivemate_job_duration_seconds": ("histogram", "Background job run time in seconds, per queue."),
+    "drivemate_ride_requests_expired_total": ("counter", "Pending ride requests auto-cancelled by the expiry sweeper."),
+    "drivemate_ride_requests_redispatched_total": ("counter", "Ride requests sent to the next nearest driver after an expiry."),
+    "drivemate_ride_time_to_match_seconds": ("histogram", "From asking for a driver to a driver accepting, per dispatch mode."),
+    "drivemate_dispatch_waves_total": ("counter", "Auto-dispatch waves, by result (sent; exhausted when the last wave found nobody)."),
+    "drivemate_inbox_messages_total": ("counter", "Driver inbox events published, by type."),
+    "drivemate_pubsub_dropped_total": ("counter", "Push messages dropped because a subscriber fell too far behind."),
+    "drivemate_sos_alerts_total": ("counter", "SOS alerts triggered, by role of the user."),
+    "drivemate_sos_delivery_seconds": ("histogram", "SOS end-to-end latency: trigger to first admin dashboard delivery."),
+    "drivemate_sos_slo_breaches_total": ("counter", "SOS alerts that missed SOS_DELIVERY_SLO, by reason (slow, undelivered)."),
+}
+
+
+class _Registry:
+    def __init__(self):
+        self.counters = defaultdict(float)   # (name, labels) -> value
+        self.histograms = {}                 # (name, labels) -> [bucket_counts, sum, count]
+
+
+_local = threading.local()
+_registries = []
+_registries_lock = threading.Lock()  # only taken the first time a thread records
+_flusher_pid = None  # the process whose flusher thread is running
+
+# per-request accumulator for Server-Timing entries added outside the middleware
+_request_timings = contextvars.ContextVar("drivemate_request_timings", default=None)
+
+
+def _registry():
+    registry = getattr(_local, "registry", None)
+    if registry is None:
+        registry = _local.registry = _Registry()
+        with _registries_lock:
+            _registries.append(registry)
+        _start_flusher()
+    return registry
+
+
+def _after_fork():
+    # what the parent recorded is in the parent's file, not the child's
+    global _local, _registries
+    _local = threading.local()
+    _registries = []
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def inc(name, labels=(), value=1.0):
+    _registry().counters[(name, labels)] += value
+
+
+def observe(name, value, labels=()):
+    histograms = _registry().histograms
+    entry = histograms.get((name, labels))
+    bounds = BUCKETS.get(name, LATENCY_BUCKETS)
+    if entry is None:
+        entry = histograms[(name, labels)] = [[0] * (len(bounds) + 1), 0.0, 0]
+    entry[0][bisect.bisect_left(bounds, value)] += 1
+    entry[1] += value
+    entry[2] += 1
+
+
+def add_server_timing(name, seconds, desc=None):
+    """Add an entry to the current request's Server-Timing header (no-op outside a request)."""
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((name, seconds, desc))
+
+
+def observe_routing(seconds, outcome):
+    observe("drivemate_routing_latency_seconds", seconds, (("outcome", outcome),))
+    add_server_timing("routing", seconds, outcome)
+
+
+def reset():
+    """Drop everything recorded so far (tests)."""
+    with _registries_lock:
+        for registry in _registries:
+            registry.counters.clear()
+            registry.histograms.clear()
+
+
+def _merge(counters, histograms, other_counters, other_histograms):
+    for key, value in list(other_counters.items()):
+        counters[key] += value
+    for key, (buckets, total, count) in list(other_histograms.items()):
+        merged = histograms.setdefault(key, [[0] * len(buckets), 0.0, 0])
+        merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+        merged[1] += total
+        merged[2] += count
+
+
+def snapshot():
+    """Merge this process's per-thread registries into (counters, histograms)."""
+    counters = defaultdict(float)
+    histograms = {}
+    with _registries_lock:
+        registries = list(_registries)
+    for registry in registries:
+        _merge(counters, histograms, registry.counters, registry.histograms)
+    return counters, histograms
+
+
+# --- several processes (METRICS_DIR) ---
+
+def _directory():
+    return getattr(settings, "METRICS_DIR", "")
+
+
+def _labels_key(labels):
+    return tuple(tuple(pair) for pair in labels)
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):  # gone, or being replaced
+        return {}, {}
+    counters = {(name, _labels_key(labels)): value for name, labels, value in data["counters"]}
+    histograms = {(name, _labels_key(labels)): [buckets, total, count]
+                  for name, labels, buckets, total, count in data["histograms"]}
+    return counters, histograms
+
+
+def _write(path, counters, histograms):
+    data = {
+        "counters": [[name, labels, value] for (name, labels), value in counters.items()],
+        "histograms": [[name, labels, *entry] for (name, labels), entry in histograms.items()],
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f"{path}.{os.getpid()}.tmp"
+    with open(partial, "w") as f:
+        json.dump(data, f)
+    os.replace(partial, path)  # readers see the old file or the new one, never half of one
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def flush():
+    """Write this process's totals to METRICS_DIR/<pid>.json."""
+    directory = _directory()
+    if directory:
+        _write(os.path.join(directory, f"{os.getpid()}.json"), *snapshot())
+
+
+def _flush_forever():
+    while True:
+        time.sleep(getattr(settings, "METRICS_FLUSH_INTERVAL", 5))
+        try:
+            flush()
+        except OSError:
+            pass
+
+
+def _start_flusher():
+    global _flusher_pid
+    if not _directory() or _flusher_pid == os.getpid():
+        return
+    with _registries_lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    threading.Thread(target=_flush_forever, name="metrics-flush", daemon=True).start()
+    atexit.register(flush)
+
+
+def _fold_exited(directory):
+    """Add the files of processes that have exited to archive.json, so the directory does not grow with recycling."""
+    with open(os.path.join(directory, ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        exited = [name for name in os.listdir(directory)
+                  if name.endswith(".json") and name[:-5].isdigit() and not _alive(int(name[:-5]))]
+        if not exited:
+            return
+        archive = os.path.join(directory, "archive.json")
+        counters, histograms = defaultdict(float), {}
+        for name in ["archive.json", *exited]:
+            _merge(counters, histograms, *_read(os.path.join(directory, name)))
+        _write(archive, counters, histograms)
+        for name in exited:
+            os.unlink(os.path.join(directory, name))
+
+
+def collect():
+    """(counters, histograms) of this process plus, with METRICS_DIR, every other process's last flush."""
+    counters, histograms = snapshot()
+    directory = _directory()
+    if directory and os.path.isdir(directory):
+        _fold_exited(directory)
+        own = f"{os.getpid()}.json"
+        for name in os.listdir(directory):
+            if name.endswith(".json") and name != own:
+                _merge(counters, histograms, *_read(os.path.join(directory, name)))
+    return counters, histograms
+
+
+def clear_directory():
+    """Forget what earlier runs of the server wrote (gunicorn.conf.py, at start)."""
+    directory = _directory()
+    if directory and os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if name.endswith(".json"):
+                os.unlink(os.path.join(directory, name))
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join('%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+
+def render_prometheus():
+    counters, histograms = collect()
+    lines = []
+    names = sorted({name for name, _ in counters} | {name for name, _ in histograms})
+    for name in names:
+        kind, help_text = HELP.get(name, ("untyped", name))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "histogram":
+            for (hname, labels), (buckets, total, count) in sorted(histograms.items()):
+                if hname != name:
+                    continue
+                cumulative = 0
+                for bound, n in zip(BUCKETS.get(name, LATENCY_BUCKETS), buckets):
+                    cumulative += n
+                    lines.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {count}")
+                lines.append(f"{name}_sum{_labels(labels)} {total:.6f}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+        else:
+            for (cname, labels), value in sorted(counters.items()):
+                if cname == name:
+                    lines.append(f"{name}{_labels(labels)} {value:g}")
+
+    # derived: cache hit ratio per cache
+    lookups = defaultdict(lambda: [0.0, 0.0])
+    for (name, labels), value in counters.items():
+        if name == "drivemate_cache_requests_total":
+            label_map = dict(labels)
+            lookups[label_map["cache"]][label_map["result"] == "hit"] += value
+    if lookups:
+        lines.append("# HELP drivemate_cache_hit_ratio Cache hits / lookups.")
+        lines.append("# TYPE drivemate_cache_hit_ratio gauge")
+        for cache, (misses, hits) in sorted(lookups.items()):
+            lines.append(f"drivemate_cache_hit_ratio{_labels([('cache', cache)])} {hits / (hits + misses):.4f}")
+    return "\n".join(lines) + "\n"
+
+
+class QueryCounter:
+    """connection.execute_wrapper counting queries and their total duration."""
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """Records per-view latency and DB usage, and sets the Server-Timing header."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = getattr(settings, "SERVER_TIMING", True)
+
+    def __call__(self, request):
+        queries = QueryCounter()
+        timings = []
+        token = _request_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(queries):
+                response = self.get_response(request)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_timings.reset(token)
+
+        match = getattr(request, "resolver_match", None)
+        view = (match.url_name or match.view_name) if match else "unmatched"
+        labels = (("view", view),)
+        observe("drivemate_view_latency_seconds", elapsed, labels)
+        inc("drivemate_db_queries_total", labels, queries.count)
+        inc("drivemate_db_time_seconds_total", labels, queries.seconds)
+
+        if self.server_timing:
+            entries = [
+                f'db;dur={queries.seconds * 1000:.2f};desc="{queries.count} queries"',
+                *(f'{name};dur={seconds * 1000:.2f}' + (f';desc="{desc}"' if desc else "")
+                  for name, seconds, desc in timings),
+                f"total;dur={elapsed * 1000:.2f}",
+            ]
+            response["Server-Timing"] = ", ".join(entries)
+        return response
+
+
+class InstrumentedLocMemCache(LocMemCache):
+    """LocMemCache that counts hits and misses for drivemate_cache_requests_total."""
+
+    def __init__(self, name, params):
+        super().__init__(name, params)
+        self._metrics_name = params.get("OPTIONS", {}).get("METRICS_NAME", name or "default")
+
+    def get(self, key, default=None, version=None):
+        sentinel = object()
+        value = super().get(key, sentinel, version)
+        hit = value is not sentinel
+        inc("drivemate_cache_requests_total", (("cache", self._metrics_name), ("result", "hit" if hit else "miss")))
+        return value if hit else default
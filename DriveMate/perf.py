@@ -0,0 +1,55 @@
+"""
+Performance budgets for DriveMate views.
+
+A budget is declared right next to the view it covers:
+
+    @query_budget(8, max_db_ms=50)
+    @login_required_role(allowed_roles=["customer"])
+    def my_trips(request):
+        ...
+
+The decorator only attaches metadata, it does not wrap the view, so it adds
+nothing to the request path. The query budget tests in accounts/tests.py walk
+the URLconf, call every view as the right role against seeded data and fail
+when a view goes over what it declared; ``manage.py explain_views`` walks it
+the same way and reports queries that scan whole tables.
+"""
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass(frozen=True)
+class QueryBudget:
+    max_queries: int
+    max_db_ms: Optional[float] = None
+
+
+def query_budget(max_queries, max_db_ms=None):
+    """Declare the maximum number of SQL queries (and optionally DB time in ms) a view may use."""
+    def decorator(view_func):
+        view_func.query_budget = QueryBudget(max_queries, max_db_ms)
+        return view_func
+    return decorator
+
+
+def get_query_budget(view_func):
+    """Return the QueryBudget declared on a view (or None)."""
+    return getattr(view_func, "query_budget", None)
+
+
+def routed_views():
+    """URL patterns of the project's own views (skips includes like admin and the DEBUG media server)."""
+    from django.urls import URLPattern, get_resolver
+
+    for pattern in get_resolver().url_patterns:
+        if isinstance(pattern, URLPattern) and pattern.callback.__module__.split(".")[0] != "django":
+            yield pattern
+
+
+def view_url(pattern, values):
+    """Fill the pattern's converters (ride_id, pk, ...) from values and return the path."""
+    url = "/" + str(pattern.pattern)
+    for name, converter in pattern.pattern.converters.items():
+        url = re.sub(rf"<(\w+:)?{name}>", str(values[name]), url)
+    return url
@@ -0,0 +1,224 @@
+"""
+On-demand request profiling.
+
+ProfilingMiddleware captures a profiler trace, every SQL query with its timing
+and the time spent rendering templates for
+
+- a random sample of requests (settings.PROFILING_SAMPLE_RATE, 0.0 = off), or
+- any request carrying a valid signed X-DriveMate-Profile header
+  (``python manage.py profile_token`` prints one).
+
+Captures are written to settings.PROFILING_DIR, oldest first deleted once there
+are more than settings.PROFILING_MAX_PROFILES. Admins browse them at
+/dashboard/admin/profiles/.
+
+With sampling off and no header the middleware does one dict lookup per
+request and nothing else.
+"""
+import contextvars
+import cProfile
+import io
+import json
+import marshal
+import pstats
+import random
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.db import connection
+
+PROFILE_HEADER = "HTTP_X_DRIVEMATE_PROFILE"
+TOKEN_SALT = "drivemate.profiling"
+TOKEN_MAX_AGE = 60 * 60  # seconds a signed token stays valid
+
+# template timings of the request being profiled (None when not profiling)
+_template_timings = contextvars.ContextVar("drivemate_template_timings", default=None)
+_template_hook_installed = False
+
+
+def make_profile_token():
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign("profile")
+
+
+def valid_profile_token(token):
+    try:
+        return signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=TOKEN_MAX_AGE) == "profile"
+    except signing.BadSignature:
+        return False
+
+
+def install_template_hook():
+    """Time Django template renders, but only while a request is being profiled."""
+    global _template_hook_installed
+    if _template_hook_installed:
+        return
+    from django.template.backends.django import Template
+
+    original_render = Template.render
+
+    def render(self, context=None, request=None):
+        timings = _template_timings.get()
+        if timings is None:
+            return original_render(self, context, request)
+        started = time.perf_counter()
+        try:
+            return original_render(self, context, request)
+        finally:
+            timings.append((self.template.name, (time.perf_counter() - started) * 1000))
+
+    Template.render = render
+    _template_hook_installed = True
+
+
+class SQLRecorder:
+    """connection.execute_wrapper that records each query and its duration."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({"sql": sql, "ms": round((time.perf_counter() - started) * 1000, 3)})
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, "PROFILING_SAMPLE_RATE", 0.0)
+        self.engine = getattr(settings, "PROFILING_ENGINE", "cprofile")
+        install_template_hook()
+
+    def __call__(self, request):
+        token = request.META.get(PROFILE_HEADER)
+        if token is None and not (self.sample_rate and random.random() < self.sample_rate):
+            return self.get_response(request)
+        if token is not None and not valid_profile_token(token):
+            return self.get_response(request)
+        return self.profile(request, trigger="header" if token else "sample")
+
+    def profile(self, request, trigger):
+        recorder = SQLRecorder()
+        timings = []
+        reset = _template_timings.set(timings)
+        profiler = self.start_profiler()
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(recorder):
+                response = self.get_response(request)
+        finally:
+            total_ms = (time.perf_counter() - started) * 1000
+            trace = self.stop_profiler(profiler)
+            _template_timings.reset(reset)
+
+        save_profile({
+            # sortable by capture time, which retention and the listing rely on
+            "id": f"{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 10**9:09d}-{uuid.uuid4().hex[:6]}",
+            "path": request.path,
+            "method": request.method,
+            "status": response.status_code,
+            "trigger": trigger,
+            "engine": trace["engine"],
+            "timestamp": time.time(),
+            "total_ms": round(total_ms, 3),
+            "sql_count": len(recorder.queries),
+            "sql_ms": round(sum(q["ms"] for q in recorder.queries), 3),
+            "sql": recorder.queries,
+            "template_ms": round(sum(ms for _, ms in timings), 3),
+            "templates": [{"name": name, "ms": round(ms, 3)} for name, ms in timings],
+            "stats": trace["text"],
+        }, trace.get("raw"), trace.get("raw_suffix"))
+        return response
+
+    def start_profiler(self):
+        if self.engine == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                pass
+            else:
+                profiler = Profiler()
+                profiler.start()
+                return profiler
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def stop_profiler(self, profiler):
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+            out = io.StringIO()
+            stats = pstats.Stats(profiler, stream=out)
+            stats.sort_stats("cumulative").print_stats(40)
+            # same format as pstats.Stats.dump_stats, loadable with pstats/snakeviz
+            raw = marshal.dumps(stats.stats)
+            return {"engine": "cprofile", "text": out.getvalue(), "raw": raw, "raw_suffix": ".prof"}
+        profiler.stop()
+        return {
+            "engine": "pyinstrument",
+            "text": profiler.output_text(unicode=True),
+            "raw": profiler.output_html().encode(),
+            "raw_suffix": ".html",
+        }
+
+
+# ----------------------------
+# storage
+# ----------------------------
+def profile_dir():
+    return Path(getattr(settings, "PROFILING_DIR", Path(settings.BASE_DIR) / "profiles"))
+
+
+def save_profile(data, raw=None, raw_suffix=None):
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    if raw is not None:
+        data["raw_file"] = data["id"] + raw_suffix
+        (directory / data["raw_file"]).write_bytes(raw)
+    (directory / f"{data['id']}.json").write_text(json.dumps(data))
+    enforce_retention(directory)
+
+
+def enforce_retention(directory):
+    keep = getattr(settings, "PROFILING_MAX_PROFILES", 200)
+    captures = sorted(directory.glob("*.json"))
+    for old in captures[:max(0, len(captures) - keep)]:
+        for path in directory.glob(old.stem + ".*"):
+            path.unlink(missing_ok=True)
+
+
+def list_profiles():
+    """Summaries of stored captures, newest first."""
+    directory = profile_dir()
+    if not directory.exists():
+        return []
+    summaries = []
+    for path in sorted(directory.glob("*.json"), reverse=True):
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        for key in ("sql", "templates", "stats"):
+            data.pop(key, None)
+        summaries.append(data)
+    return summaries
+
+
+def load_profile(profile_id):
+    """Full capture by id, or None. Ids are validated so they cannot escape PROFILING_DIR."""
+    if not profile_id or "/" in profile_id or "\\" in profile_id or profile_id.startswith("."):
+        return None
+    path = profile_dir() / f"{profile_id}.json"
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def raw_profile_path(data):
+    name = data.get("raw_file")
+    return profile_dir() / name if name else None
@@ -0,0 +1,253 @@
+"""
+Publish/subscribe for pushing events to open WebSocket connections.
+
+    publish("driver:7", {"type": "request.new", ...})     # any thread: views, jobs, signals
+
+    async with subscribe("driver:7") as inbox:           # on the ASGI event loop
+        message = await inbox.get()
+
+A subscriber is an asyncio queue on the event loop that subscribed; publish()
+hands it the message with call_soon_threadsafe and returns, so publishing
+never waits for a slow socket. A subscriber that falls PUBSUB_QUEUE_SIZE
+messages behind loses the newest ones (counted in
+drivemate_pubsub_dropped_total); messages are hints for the page, the
+database stays the source of truth.
+
+Without PUBSUB_BROKER_SOCKET this is in-process only: an event raised in one
+process (a gunicorn worker, `run_workers`) reaches sockets held by that
+process. With it, every process connects to a local broker
+(`manage.py run_pubsub_broker`) over that Unix socket; publish() sends the
+message there and the broker fans it out to all processes, the publisher
+included. While the broker is unreachable, messages are delivered in-process
+and the link reconnects in the background. Nothing here blocks the event
+loop: subscribers wait for the first connection in an executor thread, and a
+broker that stops reading costs a publisher at most BrokerLink.SEND_TIMEOUT.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+from DriveMate import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """Messages for some channels, queued on the event loop that subscribed."""
+
+    link = None  # the broker link to wait for on entering, set by subscribe()
+
+    def __init__(self, hub, channels, maxsize):
+        self.hub = hub
+        self.channels = channels
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+
+    def _put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            metrics.inc("drivemate_pubsub_dropped_total")
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+    async def __aenter__(self):
+        if self.link is not None and not self.link.connected:
+            await self.loop.run_in_executor(None, self.link.wait_connected)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+
+class Hub:
+    def __init__(self):
+        self._lock = threading.Lock()  # publishers run on many threads
+        self._subscribers = defaultdict(set)  # channel -> subscriptions
+
+    def subscribe(self, *channels, maxsize=None):
+        subscription = Subscription(self, channels, maxsize or settings.PUBSUB_QUEUE_SIZE)
+        with self._lock:
+            for channel in channels:
+                self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+    def deliver(self, channel, message):
+        """Hand `message` to this process' subscribers of `channel`."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._put, message)
+            except RuntimeError:  # its event loop has shut down
+                self.unsubscribe(subscription)
+        return len(subscribers)
+
+
+class BrokerLink:
+    """This process' connection to the local broker: JSON lines in both directions."""
+
+    RECONNECT_DELAY = 1.0
+    CONNECT_TIMEOUT = 1.0
+    SEND_TIMEOUT = 1.0
+
+    def __init__(self, hub, path):
+        self.hub = hub
+        self.path = path
+        self._connect_deadline = time.monotonic() + self.CONNECT_TIMEOUT
+        self._sock = None
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._connected = threading.Event()
+        self._reader = threading.Thread(target=self._read_forever, name="pubsub-broker", daemon=True)
+        self._reader.start()
+
+    def wait_connected(self, timeout=None):
+        """
+        Give the first connection up to CONNECT_TIMEOUT from the link's start,
+        so a short-lived process's first publish is not lost. Blocks; call it
+        from an executor on the event loop.
+        """
+        if timeout is None:
+            timeout = max(0.0, self._connect_deadline - time.monotonic())
+        self._connected.wait(timeout)
+        return self.connected
+
+    def send(self, channel, message):
+        """False if the broker is unreachable (the caller delivers locally instead)."""
+        line = json.dumps([channel, message], separators=(",", ":")).encode() + b"\n"
+        with self._lock:
+            if self._sock is None:
+                return False
+            try:
+                self._sock.sendall(line)  # OSError after SEND_TIMEOUT if the broker stopped reading
+            except OSError:
+                self._disconnect()
+                return False
+        return True
+
+    @property
+    def connected(self):
+        return self._sock is not None
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            self._disconnect()
+
+    def _disconnect(self):
+        if self._sock is not None:
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)  # wakes the reader thread
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+    def _read_forever(self):
+        while not self._closed.is_set():
+            try:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.connect(self.path)
+            except OSError as exc:
+                logger.warning("pubsub broker %s unreachable (%s); delivering in-process", self.path, exc)
+                self._closed.wait(self.RECONNECT_DELAY)
+                continue
+            # sends only: a socket timeout would also end the reader's idle wait
+            seconds, fraction = divmod(self.SEND_TIMEOUT, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO, struct.pack("ll", int(seconds), int(fraction * 1e6)))
+            with self._lock:
+                self._sock = sock
+            self._connected.set()
+            try:
+                for line in sock.makefile("rb"):
+                    channel, message = json.loads(line)
+                    self.hub.deliver(channel, message)
+            except (OSError, ValueError):
+                pass
+            with self._lock:
+                if self._sock is sock:
+                    self._disconnect()
+            self._closed.wait(self.RECONNECT_DELAY)
+
+
+_hub = Hub()
+_link = None
+_link_lock = threading.Lock()
+
+
+def _broker():
+    global _link
+    path = getattr(settings, "PUBSUB_BROKER_SOCKET", "")
+    if not path:
+        return None
+    if _link is None:
+        with _link_lock:
+            if _link is None:
+                _link = BrokerLink(_hub, path)
+    return _link
+
+
+def publish(channel, message):
+    """Send a JSON-serialisable message to everyone subscribed to channel."""
+    link = _broker()
+    if link is not None:
+        link.wait_connected()  # only ever waits in the link's first second
+    if link is None or not link.send(channel, message):
+        _hub.deliver(channel, message)
+
+
+def subscribe(*channels, maxsize=None):
+    """Subscribe on the running event loop; use as `async with`."""
+    subscription = _hub.subscribe(*channels, maxsize=maxsize)
+    subscription.link = _broker()  # entering waits (off the loop) for it to receive broker messages
+    return subscription
+
+
+async def serve_broker(path):
+    """The local broker: forward every line a client sends to all clients."""
+    clients = set()
+
+    async def handle(reader, writer):
+        clients.add(writer)
+        try:
+            while line := await reader.readline():
+                if not line.endswith(b"\n"):
+                    break  # cut off by a client giving up mid-send
+                for client in list(clients):
+                    client.write(line)
+                    if client.transport.get_write_buffer_size() > 1 << 20:
+                        client.close()  # a client that stopped reading does not hold up the others
+                        clients.discard(client)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            clients.discard(writer)
+            writer.close()
+
+    if os.path.exists(path):
+        os.unlink(path)  # left over from a previous run
+    server = await asyncio.start_unix_server(handle, path)
+    async with server:
+        await server.serve_forever()
@@ -0,0 +1,148 @@
+"""
+Token-bucket rate limiting for login attempts.
+
+login_view checks two buckets before it looks the user up or hashes
+anything: one per client IP, one per submitted e-mail address. A bucket holds
+up to `capacity` tokens and refills at `per_second`; every attempt takes one,
+and an empty bucket rejects the attempt with 429 + Retry-After. That costs a
+cache round trip or two and no password hash, so credential-stuffing traffic
+cannot pin the CPUs.
+
+A successful login gives its IP token back and refills the e-mail bucket, so
+only failed attempts add up: the owner of an account is never locked out by
+signing in often.
+
+Buckets live in the LOGIN_RATELIMIT_CACHE cache alias, the shared cache
+(SHARED_CACHE_URL) when there is one. Without it (None), and whenever the
+cache errors, they are kept in this process: each of the WEB_WORKERS
+processes then allows the full burst, so the real limit is WEB_WORKERS times
+the configured one. Either way a rejected attempt never touches the database.
+The read-modify-write on the cache is not atomic; concurrent attempts on one
+key can overshoot by a token or two, which is fine for this purpose.
+
+Settings:
+    LOGIN_RATELIMIT_IP      (capacity, tokens per second), e.g. (20, 20 / 60)
+    LOGIN_RATELIMIT_EMAIL   same, per e-mail address
+    LOGIN_RATELIMIT_CACHE   cache alias shared by all workers (None = per process)
+    LOGIN_RATELIMIT_PROXY_COUNT  reverse proxies in front of the app; the
+                            client IP is taken from X-Forwarded-For at that
+                            depth (0 = use REMOTE_ADDR)
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from DriveMate import metrics
+
+LOCAL_MAX_KEYS = 10000
+
+_local_lock = threading.Lock()
+_local_buckets = OrderedDict()  # key -> (tokens, updated_at), oldest first
+
+
+def take_token(state, now, capacity, per_second):
+    """Refill a (tokens, updated_at) bucket and try to take one token.
+
+    Returns (new_state, retry_after): retry_after is 0 when the token was
+    taken, otherwise the seconds until one is available.
+    """
+    tokens, updated_at = state if state else (capacity, now)
+    tokens = min(capacity, tokens + (now - updated_at) * per_second)
+    if tokens >= 1:
+        return (tokens - 1, now), 0
+    return (tokens, now), (1 - tokens) / per_second
+
+
+class TokenBucketLimiter:
+    def __init__(self, name, capacity, per_second, cache_alias="default"):
+        self.name = name
+        self.capacity = capacity
+        self.per_second = per_second
+        self.cache_alias = cache_alias
+        # an idle bucket is full again after this long, so it can expire
+        self.ttl = int(capacity / per_second) + 1
+
+    def cache_key(self, key):
+        digest = hashlib.sha1(str(key).encode()).hexdigest()
+        return f"ratelimit:{self.name}:{digest}"
+
+    def hit(self, key, now=None):
+        """Take a token for key. Returns 0 if allowed, else the seconds to wait."""
+        now = time.time() if now is None else now
+        cache_key = self.cache_key(key)
+        try:
+            if self.cache_alias is None:
+                raise LookupError("no shared cache")
+            cache = caches[self.cache_alias]
+            state, retry_after = take_token(cache.get(cache_key), now, self.capacity, self.per_second)
+            cache.set(cache_key, state, self.ttl)
+        except Exception:
+            state, retry_after = self._hit_local(cache_key, now)
+        if retry_after:
+            metrics.inc("drivemate_login_ratelimited_total", (("key", self.name),))
+        return retry_after
+
+    def refund(self, key, now=None, tokens=1):
+        """Give back tokens taken for key (up to a full bucket)."""
+        now = time.time() if now is None else now
+        cache_key = self.cache_key(key)
+        try:
+            if self.cache_alias is None:
+                raise LookupError("no shared cache")
+            cache = caches[self.cache_alias]
+            state = cache.get(cache_key)
+            if state is not None:
+                cache.set(cache_key, self._refilled(state, now, tokens), self.ttl)
+        except Exception:
+            with _local_lock:
+                state = _local_buckets.get(cache_key)
+                if state is not None:
+                    _local_buckets[cache_key] = self._refilled(state, now, tokens)
+
+    def _refilled(self, state, now, tokens):
+        left, updated_at = state
+        return min(self.capacity, left + (now - updated_at) * self.per_second + tokens), now
+
+    def _hit_local(self, cache_key, now):
+        with _local_lock:
+            state, retry_after = take_token(_local_buckets.pop(cache_key, None), now, self.capacity, self.per_second)
+            _local_buckets[cache_key] = state
+            while len(_local_buckets) > LOCAL_MAX_KEYS:
+                _local_buckets.popitem(last=False)
+        return state, retry_after
+
+
+def client_ip(request):
+    proxies = getattr(settings, "LOGIN_RATELIMIT_PROXY_COUNT", 0)
+    if proxies:
+        forwarded = [ip.strip() for ip in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",") if ip.strip()]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def _limiter(name, setting):
+    capacity, per_second = getattr(settings, setting)
+    return TokenBucketLimiter(name, capacity, per_second, settings.LOGIN_RATELIMIT_CACHE)
+
+
+def check_login_rate(request, email):
+    """Seconds the client must wait before another login attempt (0 = go ahead).
+
+    The e-mail bucket is only charged when the IP bucket allowed the attempt.
+    """
+    retry_after = _limiter("ip", "LOGIN_RATELIMIT_IP").hit(client_ip(request))
+    if not retry_after and email:
+        retry_after = _limiter("email", "LOGIN_RATELIMIT_EMAIL").hit(email)
+    return retry_after
+
+
+def login_succeeded(request, email):
+    """Give back what a successful login was charged: its IP token and the whole e-mail bucket."""
+    _limiter("ip", "LOGIN_RATELIMIT_IP").refund(client_ip(request))
+    email_limiter = _limiter("email", "LOGIN_RATELIMIT_EMAIL")
+    email_limiter.refund(email, tokens=email_limiter.capacity)
@@ -0,0 +1,86 @@
+"""
+Read-replica routing for read-heavy views.
+
+Views decorated with @use_replica send their ORM reads for DriveMate models to
+the replica alias (settings.DATABASE_REPLICA_ALIAS, set when
+DATABASE_REPLICA_URL is configured). Everything else, and every write, uses
+the primary:
+
+- only GET/HEAD requests are routed, so POST actions inside the same view
+  (e.g. cancelling from trip_detail) and all lifecycle transitions hit the
+  primary;
+- sessions and other Django contrib models always read from the primary;
+- read-your-writes: StickyPrimaryMiddleware stamps the session after each
+  unsafe request by a logged-in user, and for REPLICA_STICKY_SECONDS after that
+  the user's reads stay on the primary, so they never see replica lag on
+  their own changes.
+"""
+import contextvars
+import time
+from functools import wraps
+
+from django.conf import settings
+
+LAST_WRITE_SESSION_KEY = "db_last_write"
+REPLICA_APPS = {"accounts", "rides", "vehicles", "payments"}
+
+_replica_allowed = contextvars.ContextVar("drivemate_replica_allowed", default=False)
+
+
+def recently_wrote(request):
+    last_write = request.session.get(LAST_WRITE_SESSION_KEY)
+    sticky = getattr(settings, "REPLICA_STICKY_SECONDS", 5)
+    return last_write is not None and time.time() - last_write < sticky
+
+
+def use_replica(view_func):
+    """Let safe requests to this view read from the replica (see module docstring)."""
+    @wraps(view_func)
+    def _wrapped(request, *args, **kwargs):
+        if (
+            not getattr(settings, "DATABASE_REPLICA_ALIAS", None)
+            or request.method not in ("GET", "HEAD")
+            or recently_wrote(request)
+        ):
+            return view_func(request, *args, **kwargs)
+        token = _replica_allowed.set(True)
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            _replica_allowed.reset(token)
+    return _wrapped
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _replica_allowed.get() and model._meta.app_label in REPLICA_APPS:
+            return settings.DATABASE_REPLICA_ALIAS
+        return "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replica holds the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
+
+
+class StickyPrimaryMiddleware:
+    """Remember when a logged-in user last wrote, for read-your-writes."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            request.method not in ("GET", "HEAD", "OPTIONS")
+            and getattr(settings, "DATABASE_REPLICA_ALIAS", None)
+            and hasattr(request, "session")
+            and request.session.get("user_id")
+        ):
+            request.session[LAST_WRITE_SESSION_KEY] = time.time()
+        return response
@@ -2,6 +2,10 @@
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
+from DriveMate.database import database_config, replica_config
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
@@ -29,7 +33,11 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'DriveMate.metrics.MetricsMiddleware',
+    'DriveMate.profiling.ProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'DriveMate.routers.StickyPrimaryMiddleware',
+    'accounts.middleware.CurrentUserMiddleware',
     "whitenoise.middleware.WhiteNoiseMiddleware",
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -62,11 +70,31 @@ WSGI_APPLICATION = 'DriveMate.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# SQLite by default, PostgreSQL (with pooling options) when DATABASE_URL is
+# set; see DriveMate/database.py for the environment variables.
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(os.environ, sqlite_path=BASE_DIR / 'db.sqlite3'),
+}
+
+# Optional read replica (DATABASE_REPLICA_URL) for the read-heavy views marked
+# with @use_replica; see DriveMate/routers.py.
+DATABASE_REPLICA_ALIAS = None
+if replica_config(os.environ):
+    DATABASE_REPLICA_ALIAS = 'replica'
+    DATABASES[DATABASE_REPLICA_ALIAS] = replica_config(os.environ)
+DATABASE_ROUTERS = ['DriveMate.routers.PrimaryReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', '5'))
+
+# PRAGMAs applied to every new SQLite connection (DriveMate/sqlite.py);
+# ignored on PostgreSQL. SQLITE_WAL adds journal_mode=WAL, which is written
+# into the database file; gunicorn.conf.py turns it on for the server, so
+# management commands leave db.sqlite3 alone.
+SQLITE_WAL = os.environ.get('SQLITE_WAL', '') == '1'
+SQLITE_PRAGMAS = {
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+    'mmap_size': 128 * 1024 * 1024,
+    'cache_size': -20000,  # KiB
+    'temp_store': 'MEMORY',
 }
 
 
@@ -88,6 +116,20 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing pool (DriveMate/hashing.py): processes per server worker,
+# default 1 (so WEB_WORKERS in total); 0 hashes on the request thread. Beyond
+# MAX_PENDING hashes in flight, logins and registrations get a 503 with
+# Retry-After.
+PASSWORD_HASH_WORKERS = int(os.environ['PASSWORD_HASH_WORKERS']) if os.environ.get('PASSWORD_HASH_WORKERS') else None
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', '0')) or None  # None = 4 per worker
+PASSWORD_HASH_TIMEOUT = 10
+
+# Login throttling (DriveMate/ratelimit.py): token buckets per client IP and
+# per e-mail, as (burst capacity, tokens refilled per second).
+LOGIN_RATELIMIT_IP = (20, 20 / 60)
+LOGIN_RATELIMIT_EMAIL = (5, 5 / 300)
+LOGIN_RATELIMIT_PROXY_COUNT = int(os.environ.get('LOGIN_RATELIMIT_PROXY_COUNT', '0'))  # 1 behind Render's proxy
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
@@ -110,10 +152,162 @@ STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / "staticfiles"
 STATICFILES_DIRS=[os.path.join(BASE_DIR,'static')]
 
+# Static files are stored under content-hashed names with .gz/.br copies
+# (WhiteNoise serves those with immutable cache headers). The site CSS is
+# compiled from the templates: `manage.py build_css` then `collectstatic`;
+# see DriveMate/assets.py.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'DriveMate.assets.StaticFilesStorage'},
+}
+
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Responsive images (DriveMate/images.py): vehicle photos and driver profile
+# pics are resized to these widths in each format after upload, by a job on
+# the 'images' queue. `manage.py generate_renditions` backfills with
+# IMAGE_WORKERS threads (0 = one at a time).
+IMAGE_RENDITION_WIDTHS = (160, 320, 640, 1280)
+IMAGE_RENDITION_FORMATS = ('avif', 'webp')
+IMAGE_RENDITION_QUALITY = {'avif': 50, 'webp': 75}
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', '2'))
+
+# Background jobs (DriveMate/jobs.py), run by `manage.py run_workers`: threads
+# per queue in each worker process. Failed jobs are retried after
+# base * 2**(attempt - 1) seconds (jittered, at most cap). A job locked longer
+# than JOB_LOCK_TIMEOUT is assumed lost and requeued. Finished jobs, and so
+# their idempotency keys, are kept for JOB_RETENTION seconds. JOBS_EAGER runs
+# jobs in-process right after commit instead of in workers.
+# 'sos' comes first and has its own threads, so alerts never wait behind
+# other work (rides/sos.py).
+JOB_QUEUES = {'sos': 2, 'default': 4, 'images': 2}
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BACKOFF = (5, 600)  # (base, cap) seconds
+JOB_POLL_INTERVAL = 1.0
+JOB_POLL_INTERVALS = {'sos': 0.1}  # queues polled more often than JOB_POLL_INTERVAL
+JOB_LOCK_TIMEOUT = 600
+JOB_RETENTION = 7 * 24 * 3600
+JOBS_EAGER = os.environ.get('JOBS_EAGER', '') == '1'
+# Recurring jobs: each worker process queues these every N seconds (one run
+# per interval across all workers).
+JOB_SCHEDULE = {
+    'rides.tasks.expire_ride_requests': 30,
+    'rides.tasks.check_sos_delivery': 5,
+}
+
+# Unanswered ride requests (rides/dispatch.py): PENDING requests older than
+# RIDE_REQUEST_TIMEOUT seconds are auto-cancelled, RIDE_REQUEST_SWEEP_BATCH
+# per UPDATE. With RIDE_REQUEST_REDISPATCH the ride then goes to the next
+# nearest eligible driver, up to RIDE_REQUEST_MAX_PER_RIDE requests per ride.
+RIDE_REQUEST_TIMEOUT = int(os.environ.get('RIDE_REQUEST_TIMEOUT', '300'))
+RIDE_REQUEST_SWEEP_BATCH = 500
+RIDE_REQUEST_REDISPATCH = os.environ.get('RIDE_REQUEST_REDISPATCH', '') == '1'
+RIDE_REQUEST_MAX_PER_RIDE = 10
+
+# Auto dispatch (rides/dispatch.py): the ride goes to the
+# AUTO_DISPATCH_WAVE_SIZE nearest eligible drivers at once, then to the next
+# ones every AUTO_DISPATCH_WAVE_TIMEOUT seconds until a driver accepts or
+# AUTO_DISPATCH_MAX_WAVES waves have gone out.
+AUTO_DISPATCH_WAVE_SIZE = 5
+AUTO_DISPATCH_WAVE_TIMEOUT = 20
+AUTO_DISPATCH_MAX_WAVES = 4
+
+# Push to open pages (DriveMate/pubsub.py, served over WebSocket by the ASGI
+# app): messages a socket has not taken yet, at most, and the local broker
+# (`manage.py run_pubsub_broker`) that joins several processes. Without a
+# broker, events only reach sockets held by the process that raised them.
+PUBSUB_QUEUE_SIZE = 100
+PUBSUB_BROKER_SOCKET = os.environ.get('PUBSUB_BROKER_SOCKET', '')
+
+# SOS alerts (rides/sos.py): the alert carries the ride's last
+# SOS_TRACKING_POINTS tracking points, and must reach an admin dashboard within
+# SOS_DELIVERY_SLO seconds of being triggered; slower or undelivered alerts
+# are logged as errors and counted in drivemate_sos_slo_breaches_total.
+SOS_TRACKING_POINTS = 20
+SOS_DELIVERY_SLO = 2.0
+
+# Streamed uploads (DriveMate/uploads.py, used by driver registration): files
+# are written in chunks to UPLOAD_STAGING_DIR and dropped as soon as they pass
+# their field's limit (UPLOAD_MAX_FILE_SIZE for fields not listed).
+UPLOAD_STAGING_DIR = os.environ.get('UPLOAD_STAGING_DIR', os.path.join(BASE_DIR, 'upload_staging'))
+UPLOAD_MAX_FILE_SIZE = 5 * 1024 * 1024
+UPLOAD_MAX_FILE_SIZES = {'id_proof': 10 * 1024 * 1024}
+UPLOAD_MAX_REQUEST_SIZE = 40 * 1024 * 1024
+
+# Routing server used for ride distance/duration. The public OSRM demo by
+# default; point it at benchmarks/osrm_stub.py for local load tests.
+OSRM_BASE_URL = os.environ.get('OSRM_BASE_URL', 'http://router.project-osrm.org').rstrip('/')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'DriveMate.metrics.InstrumentedLocMemCache',
+        'LOCATION': 'default',
+    },
+}
+
+# A cache every process shares, for state that must agree across workers
+# (sessions, login rate limits): SHARED_CACHE_URL=redis://host:6379/1 or
+# memcached://host:11211. 'default' above is per-process LocMem.
+SHARED_CACHE_URL = os.environ.get('SHARED_CACHE_URL', '')
+if SHARED_CACHE_URL.startswith(('redis://', 'rediss://')):
+    CACHES['shared'] = {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': SHARED_CACHE_URL}
+elif SHARED_CACHE_URL.startswith('memcached://'):
+    CACHES['shared'] = {'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+                        'LOCATION': SHARED_CACHE_URL.removeprefix('memcached://')}
+elif SHARED_CACHE_URL:
+    raise ImproperlyConfigured(f"SHARED_CACHE_URL must be redis://, rediss:// or memcached://, not {SHARED_CACHE_URL!r}")
+
+# Sessions are read on every request. With a shared cache they are served from
+# it, with the database as the durable copy (cached_db). A per-process cache
+# would not do: a logout or session change in one worker would leave the old
+# session cached, and still valid, in every other worker. Without one they
+# are read from the database.
+if 'shared' in CACHES:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+    SESSION_CACHE_ALIAS = 'shared'
+else:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+
+# Login token buckets (DriveMate/ratelimit.py) live in the shared cache. Without
+# one they are kept in each process, so every one of the WEB_WORKERS workers
+# allows the full burst: set SHARED_CACHE_URL to limit across workers.
+LOGIN_RATELIMIT_CACHE = 'shared' if 'shared' in CACHES else None
+
+# Metrics (DriveMate/metrics.py): /metrics is readable by admins, or by a
+# scraper sending "Authorization: Bearer $METRICS_TOKEN" when that is set.
+SERVER_TIMING = True
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+# A directory shared by the server's processes (web workers, run_workers), so
+# /metrics covers all of them; gunicorn.conf.py sets one. Empty = this process only.
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = 5  # seconds another process's numbers may lag on /metrics
+
+# Request profiling (DriveMate/profiling.py). Off unless sampled or the
+# request carries a signed X-DriveMate-Profile header (manage.py profile_token).
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_ENGINE = os.environ.get('PROFILING_ENGINE', 'cprofile')  # or 'pyinstrument' if installed
+PROFILING_DIR = BASE_DIR / 'profiles'
+PROFILING_MAX_PROFILES = 200
+
+# Production server (gunicorn.conf.py): a preloaded, warmed-up master forks
+# WEB_WORKERS workers; each is recycled after WEB_MAX_REQUESTS requests (+ a
+# random 0..WEB_MAX_REQUESTS_JITTER) to cap memory growth. 0 = never recycle.
+WEB_WORKERS = int(os.environ.get('WEB_WORKERS', '0')) or (os.cpu_count() or 1) * 2 + 1
+WEB_THREADS = int(os.environ.get('WEB_THREADS', '4'))  # gthread only
+# ASGI, so the workers also serve the WebSockets (/ws/driver/inbox/,
+# /ws/admin/sos/); a WSGI class such as gthread has no /ws/ at all.
+WEB_WORKER_CLASS = os.environ.get('WEB_WORKER_CLASS', 'uvicorn.workers.UvicornWorker')
+WEB_MAX_REQUESTS = int(os.environ.get('WEB_MAX_REQUESTS', '2000'))
+WEB_MAX_REQUESTS_JITTER = int(os.environ.get('WEB_MAX_REQUESTS_JITTER', '200'))
+# The master also starts, and restarts if they exit, the processes the site
+# cannot work without: `run_workers` (SOS alerts, fares, ride requests,
+# images) and `run_pubsub_broker`, which carries their pushes to the
+# WebSockets held by the web workers. Set WEB_SIDECARS=0 only where both run
+# under their own supervisor (systemd, another container).
+WEB_SIDECARS = os.environ.get('WEB_SIDECARS', '1') == '1'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
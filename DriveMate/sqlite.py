@@ -0,0 +1,60 @@
+"""
+SQLite connection tuning.
+
+Django opens SQLite in rollback-journal mode, where every write (an
+availability toggle, a RideRequest insert) takes a database-wide lock that
+blocks all readers. configure_connection runs on every new connection and
+applies settings.SQLITE_PRAGMAS, by default:
+
+- busy_timeout           wait for a lock instead of failing with "database is locked"
+- mmap_size / cache_size keep hot pages in memory
+- temp_store=MEMORY      sorts and temp tables off disk
+
+and, with settings.SQLITE_WAL (set by gunicorn.conf.py), WAL_PRAGMAS first:
+
+- journal_mode=WAL       readers no longer block on writers (and vice versa)
+- synchronous=NORMAL     fsync at checkpoints only; safe with WAL
+
+journal_mode=WAL is stored in the database file itself, so it is left to the
+server: a `manage.py check` or `makemigrations` must not rewrite the
+committed db.sqlite3.
+
+Connected from AccountsConfig.ready(). Other database engines are untouched.
+"""
+
+WAL_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+}
+
+DEFAULT_PRAGMAS = {
+    "busy_timeout": 5000,          # ms
+    "mmap_size": 134217728,        # 128 MB
+    "cache_size": -20000,          # negative = KiB, i.e. ~20 MB
+    "temp_store": "MEMORY",
+}
+
+
+def get_pragmas():
+    from django.conf import settings
+    pragmas = getattr(settings, "SQLITE_PRAGMAS", DEFAULT_PRAGMAS)
+    if getattr(settings, "SQLITE_WAL", False):
+        # journal_mode first so the rest see the final mode
+        pragmas = {**WAL_PRAGMAS, **pragmas}
+    return pragmas
+
+
+def apply_pragmas(cursor, pragmas):
+    """Run PRAGMA statements on a DB-API cursor (Django's or a raw sqlite3 one)."""
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+
+
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    pragmas = get_pragmas()
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, pragmas)
@@ -0,0 +1,189 @@
+"""
+Content-addressed, deduplicated media storage.
+
+Driver.profile_pic, Driver.id_proof and VehicleImage.image use
+ContentAddressedStorage: an upload is hashed (SHA-256) while it is saved and
+stored under its digest, inside the field's upload_to directory,
+
+    id_proofs/3f/3fa94c...e1.pdf
+
+so the same document uploaded three times is stored once, and a name can
+never point at different bytes. That is what lets the media view serve
+these files, identity documents aside, with far-future, immutable cache
+headers (DriveMate/media.py).
+Files under a "renditions/" directory are derived from a blob (see
+DriveMate/images.py) and are stored under the name they are given, which
+already starts with the blob's digest.
+
+References are counted in accounts.MediaBlob: saving a row that points a
+field at a blob adds one, pointing it elsewhere or deleting the row takes
+one away, and once the transaction commits a blob with no references left is
+deleted together with its renditions. Files no MediaBlob row knows about
+(bulk-created rows, uploads from before this storage) are never deleted;
+`manage.py dedupe_media` moves those into the store and rebuilds the counts.
+An upload that matches a blob in the instant that blob is released can lose
+the file; dedupe_media reports such dangling names.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import PurePosixPath
+
+from django.apps import apps
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+
+DERIVED_DIR = "renditions"
+BLOB_NAME = re.compile(r"(^|/)[0-9a-f]{2}/(renditions/)?(?P<digest>[0-9a-f]{64})[^/]*$")
+
+_UNKNOWN = object()
+
+
+def file_digest(content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def blob_name(name, digest):
+    """<upload dir>/<first two hex digits>/<digest><lowercased extension>"""
+    path = PurePosixPath(name)
+    return str(path.parent / digest[:2] / f"{digest}{path.suffix.lower()}")
+
+
+def blob_digest(name):
+    """The digest a content-addressed (or derived) name is keyed by, else None."""
+    match = BLOB_NAME.search(name)
+    return match.group("digest") if match else None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    content_addressed = True
+
+    def get_available_name(self, name, max_length=None):
+        # a name is either a digest (same name = same bytes) or a derived file
+        # that is meant to be replaced, so there is never a collision to avoid
+        return name
+
+    def _save(self, name, content):
+        if DERIVED_DIR not in PurePosixPath(name).parts:
+            name = blob_name(name, file_digest(content))
+            if self.exists(name):
+                return name  # already stored: deduplicated
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        # write next to the target and rename, so readers never see half a file
+        if hasattr(content, "temporary_file_path"):
+            file_move_safe(content.temporary_file_path(), full_path, allow_overwrite=True)
+        else:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".upload-")
+            try:
+                with os.fdopen(fd, "wb") as tmp:
+                    for chunk in content.chunks():
+                        tmp.write(chunk)
+                os.replace(tmp_path, full_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+        return name
+
+    def delete_blob(self, name):
+        """Delete a blob and everything derived from it."""
+        stem = PurePosixPath(name).stem
+        derived = str(PurePosixPath(name).parent / DERIVED_DIR)
+        if self.exists(derived):
+            for filename in self.listdir(derived)[1]:
+                if filename.startswith(f"{stem}-"):
+                    self.delete(f"{derived}/{filename}")
+        self.delete(name)
+
+
+media_storage = ContentAddressedStorage()
+
+
+def content_addressed_storage():
+    return media_storage
+
+
+class ContentAddressedFilesMixin:
+    """Remembers the stored names of content_addressed_fields as loaded, for reference counting."""
+
+    content_addressed_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_files = {
+            field: instance.__dict__.get(field) or None if field in instance.__dict__ else _UNKNOWN
+            for field in cls.content_addressed_fields
+        }
+        return instance
+
+
+def _blob_model():
+    return apps.get_model("accounts", "MediaBlob")
+
+
+def incref(name, using=None):
+    MediaBlob = _blob_model()
+    if MediaBlob.objects.using(using).filter(name=name).update(refcount=F("refcount") + 1):
+        return
+    try:
+        with transaction.atomic(using=using):
+            MediaBlob.objects.using(using).create(name=name, refcount=1)
+    except IntegrityError:
+        MediaBlob.objects.using(using).filter(name=name).update(refcount=F("refcount") + 1)
+
+
+def decref(name, using=None):
+    if _blob_model().objects.using(using).filter(name=name).update(refcount=F("refcount") - 1):
+        transaction.on_commit(lambda: release(name, using), using=using)
+
+
+def release(name, using=None):
+    """Delete the blob if nothing references it any more (after commit)."""
+    deleted, _ = _blob_model().objects.using(using).filter(name=name, refcount__lte=0).delete()
+    if deleted:
+        media_storage.delete_blob(name)
+
+
+def _on_save(sender, instance, created, update_fields=None, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    stored = instance.__dict__.setdefault("_stored_files", {})
+    for field in sender.content_addressed_fields:
+        if update_fields is not None and field not in update_fields:
+            continue
+        new = getattr(instance, field).name or None
+        old = None if created else stored.get(field, _UNKNOWN)
+        if new == old:
+            continue
+        if new:
+            incref(new, using)
+        if old and old is not _UNKNOWN:
+            decref(old, using)
+        stored[field] = new
+
+
+def _on_delete(sender, instance, using=None, **kwargs):
+    for field in sender.content_addressed_fields:
+        name = getattr(instance, field).name
+        if name:
+            decref(name, using)
+
+
+def connect_signals():
+    for label in ("accounts.Driver", "vehicles.VehicleImage"):
+        post_save.connect(_on_save, sender=label, dispatch_uid=f"drivemate_blobs_save_{label}")
+        post_delete.connect(_on_delete, sender=label, dispatch_uid=f"drivemate_blobs_delete_{label}")
@@ -0,0 +1,48 @@
+// Build-time Tailwind: runs the vendored Tailwind 3.4.17 Play CDN compiler
+// (tailwind-3.4.17.js, the same build the pages used to load) under Node with
+// just enough of a DOM for it to compile once.
+//
+//   node compile.js < {"candidates": ["px-4", ...], "css": "...", "config": {...}}  > compiled.css
+//
+// Called by `manage.py build_css`; see DriveMate/assets.py.
+const fs = require("fs");
+const path = require("path");
+const vm = require("vm");
+
+const input = JSON.parse(fs.readFileSync(0, "utf8"));
+let output = null;
+
+const classHolder = { classList: input.candidates };
+const styleHolder = { textContent: input.css || "" };
+const sandbox = {
+  console: { warn() {}, log: console.error, error: console.error },
+  document: {
+    documentElement: {},
+    body: {},
+    head: { append(el) { output = el; } },
+    createElement() { return { isConnected: true, textContent: "" }; },
+    querySelectorAll(selector) {
+      if (selector === "[class]") return [classHolder];
+      if (selector.startsWith("style[")) return [styleHolder];
+      return [];
+    },
+  },
+  MutationObserver: class { observe() {} },
+  setTimeout, clearTimeout, queueMicrotask, URL, TextEncoder, TextDecoder,
+};
+sandbox.window = sandbox.self = sandbox.globalThis = sandbox;
+
+vm.createContext(sandbox);
+vm.runInContext(fs.readFileSync(path.join(__dirname, "tailwind-3.4.17.js"), "utf8"), sandbox);
+// assigning the config starts the one build; it appends a <style> when done
+sandbox.tailwind.config = input.config || {};
+
+const started = Date.now();
+(function wait() {
+  if (output && output.textContent) return process.stdout.write(output.textContent);
+  if (Date.now() - started > 60000) {
+    console.error("tailwind produced no stylesheet");
+    process.exit(1);
+  }
+  setTimeout(wait, 10);
+})();
@@ -0,0 +1,87 @@
+"""
+Streamed, size-checked file uploads.
+
+Views decorated with @staged_uploads parse multipart bodies with
+StagingUploadHandler: each file is written chunk by chunk
+(FILE_UPLOAD_CHUNK_SIZE bytes at a time) to a temporary file in
+UPLOAD_STAGING_DIR, never held in memory. The size limit for its form field
+(UPLOAD_MAX_FILE_SIZES) is checked as the bytes arrive: once a file crosses
+it, what was staged is deleted and the rest of that file is read and
+dropped. A request whose Content-Length exceeds UPLOAD_MAX_REQUEST_SIZE
+skips every file up front. The form fields are still parsed either way, so
+the view can answer with a normal error message; the rejections are listed
+in request.rejected_uploads as (field, file name, limit in bytes).
+
+Staged files are deleted at the end of the request unless the view moved
+them into storage first, so a view can create its rows in a short
+transaction and attach the files with transaction.on_commit().
+"""
+import os
+import tempfile
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+
+class StagedUploadedFile(TemporaryUploadedFile):
+    """A TemporaryUploadedFile kept in UPLOAD_STAGING_DIR instead of FILE_UPLOAD_TEMP_DIR."""
+
+    def __init__(self, name, content_type, size, charset, content_type_extra=None):
+        _, ext = os.path.splitext(name)
+        file = tempfile.NamedTemporaryFile(suffix=".upload" + ext, dir=settings.UPLOAD_STAGING_DIR)
+        UploadedFile.__init__(self, file, name, content_type, size, charset, content_type_extra)
+
+
+class StagingUploadHandler(TemporaryFileUploadHandler):
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.limits = settings.UPLOAD_MAX_FILE_SIZES
+        self.default_limit = settings.UPLOAD_MAX_FILE_SIZE
+        self.request_too_large = False
+        os.makedirs(settings.UPLOAD_STAGING_DIR, exist_ok=True)
+        if request is not None:
+            request.rejected_uploads = []
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.request_too_large = content_length > settings.UPLOAD_MAX_REQUEST_SIZE
+        return None  # let the multipart parser go on; files are skipped in new_file
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super(TemporaryFileUploadHandler, self).new_file(
+            field_name, file_name, content_type, content_length, charset, content_type_extra)
+        # self.file must be the new file before rejecting: SkipFile closes (deletes) it
+        self.file = StagedUploadedFile(self.file_name, self.content_type, 0, self.charset, self.content_type_extra)
+        self.limit = self.limits.get(field_name, self.default_limit)
+        if self.request_too_large:
+            self.reject(field_name, self.file_name, settings.UPLOAD_MAX_REQUEST_SIZE)
+        if content_length is not None and content_length > self.limit:
+            self.reject(field_name, self.file_name, self.limit)  # the part declared its own size
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.limit:
+            self.reject(self.field_name, self.file_name, self.limit)
+        self.file.write(raw_data)
+
+    def reject(self, field_name, file_name, limit):
+        if self.request is not None:
+            self.request.rejected_uploads.append((field_name, file_name, limit))
+        raise SkipFile()
+
+
+def staged_uploads(view):
+    """Parse this view's uploads with StagingUploadHandler.
+
+    The upload handlers must be in place before anything reads request.POST,
+    so CSRF is checked here, after they are set, instead of in the middleware.
+    """
+    protected = csrf_protect(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers = [StagingUploadHandler(request)]
+        return protected(request, *args, **kwargs)
+
+    return csrf_exempt(wrapper)
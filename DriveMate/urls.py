@@ -2,62 +2,67 @@ from django.contrib import admin
 from django.conf import settings
 from django.conf.urls.static import static
 from django.urls import path
-from accounts.views import *
-from rides.views import *
-from payments.views import *
+
+from DriveMate.lazy import lazy_view as view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('health',health_check),
-    path('', index,name='index'),
-    path('model/', model,name='index'),
-    path("register/customer/", customer_register, name="customer_register"),
-    path("register/driver/", driver_register, name="driver_register"),
-    
-    path("login/", login_view, name="login"),
-    path("logout/", logout_view, name="logout"),
-    path("terms/", terms, name="terms"),
+    path('health',view("accounts.views.health_check")),
+    path('metrics', view("accounts.views.metrics_view"), name='metrics'),
+    path('', view("accounts.views.index"),name='index'),
+    path('model/', view("accounts.views.model"),name='index'),
+    path("register/customer/", view("accounts.views.customer_register"), name="customer_register"),
+    path("register/driver/", view("accounts.views.driver_register"), name="driver_register"),
+    
+    path("login/", view("accounts.views.login_view"), name="login"),
+    path("logout/", view("accounts.views.logout_view"), name="logout"),
+    path("terms/", view("accounts.views.terms"), name="terms"),
 
-    path("dashboard/customer/", customer_dashboard, name="customer_dashboard"),
-    path("dashboard/driver/", driver_dashboard, name="driver_dashboard"),
-    path("dashboard/admin/", admin_dashboard, name="admin_dashboard"),
+    path("dashboard/customer/", view("accounts.views.customer_dashboard"), name="customer_dashboard"),
+    path("dashboard/driver/", view("accounts.views.driver_dashboard"), name="driver_dashboard"),
+    path("dashboard/admin/", view("accounts.views.admin_dashboard"), name="admin_dashboard"),
+    path("dashboard/admin/profiles/", view("accounts.views.admin_profiles_list"), name="admin_profiles_list"),
+    path("dashboard/admin/profiles/<str:profile_id>/", view("accounts.views.admin_profile_detail"), name="admin_profile_detail"),
+    path("dashboard/admin/sos/<int:pk>/resolve/", view("accounts.views.resolve_sos"), name="resolve_sos"),
     
-    path("customer/profile/", customer_profile_view, name="customer_profile"),
-    path("customer/profile/edit/", customer_profile_edit, name="customer_profile_edit"),
+    path("customer/profile/", view("accounts.views.customer_profile_view"), name="customer_profile"),
+    path("customer/profile/edit/", view("accounts.views.customer_profile_edit"), name="customer_profile_edit"),
 
     # Driver profile routes
-    path("driver/profile/", driver_profile_view, name="driver_profile"),
-    path("driver/profile/edit/", driver_profile_edit, name="driver_profile_edit"),
-    path('create/', create_ride, name='create_ride'),
-    path('select-driver/<int:ride_id>/', select_driver, name='select_driver'),
-    path('driver/<int:driver_id>/', get_driver_details, name='get_driver_details'),
+    path("driver/profile/", view("accounts.views.driver_profile_view"), name="driver_profile"),
+    path("driver/profile/edit/", view("accounts.views.driver_profile_edit"), name="driver_profile_edit"),
+    path('create/', view("rides.views.create_ride"), name='create_ride'),
+    path('select-driver/<int:ride_id>/', view("rides.views.select_driver"), name='select_driver'),
+    path('driver/<int:driver_id>/', view("rides.views.get_driver_details"), name='get_driver_details'),
     
-    path('my-trips/', my_trips, name='my_trips'),
-    path('trip/<int:ride_id>/', trip_detail, name='trip_detail'),
+    path('my-trips/', view("rides.views.my_trips"), name='my_trips'),
+    path('trip/<int:ride_id>/', view("rides.views.trip_detail"), name='trip_detail'),
     
-    path("driver/requests/", driver_requests_list, name="driver_requests_list"),
-    path("driver/requests/<int:pk>/", driver_request_detail, name="driver_request_detail"),
-    path("driver/requests/<int:pk>/accept/", accept_ride_request, name="accept_ride_request"),
-    path("ride-request/<int:pk>/distance/", ride_request_distance, name="ride_request_distance"),
+    path("driver/requests/", view("accounts.views.driver_requests_list"), name="driver_requests_list"),
+    path("driver/requests/<int:pk>/", view("accounts.views.driver_request_detail"), name="driver_request_detail"),
+    path("driver/requests/<int:pk>/accept/", view("accounts.views.accept_ride_request"), name="accept_ride_request"),
+    path("ride-request/<int:pk>/distance/", view("accounts.views.ride_request_distance"), name="ride_request_distance"),
     
-    path('ride-requests/<int:pk>/set_ongoing/', set_ride_request_ongoing, name='set_ride_request_ongoing'),
-    path('ride-requests/<int:pk>/end_ride/', end_ride_request, name='end_ride_request'),
+    path('ride-requests/<int:pk>/set_ongoing/', view("accounts.views.set_ride_request_ongoing"), name='set_ride_request_ongoing'),
+    path('ride-requests/<int:pk>/end_ride/', view("accounts.views.end_ride_request"), name='end_ride_request'),
     
     
-    path('rides/<int:ride_id>/pay/', payment_page, name='ride_payment'),
-    path('payments/create/', create_transaction, name='create_transaction'),
-    path('payments/finalize/', finalize_transaction, name='finalize_transaction'),
+    path('rides/<int:ride_id>/pay/', view("payments.views.payment_page"), name='ride_payment'),
+    path('payments/create/', view("payments.views.create_transaction"), name='create_transaction'),
+    path('payments/finalize/', view("payments.views.finalize_transaction"), name='finalize_transaction'),
     
     
-    path('rate-ride/<int:ride_id>/', rate_ride, name='rate_ride'),
-    path('view-driver-rating/<int:driver_id>/', view_driver_rating, name='view_driver_rating'),
+    path('rate-ride/<int:ride_id>/', view("rides.views.rate_ride"), name='rate_ride'),
+    path('view-driver-rating/<int:driver_id>/', view("rides.views.view_driver_rating"), name='view_driver_rating'),
     
-    path('customer/payment-history/', customer_payment_history, name='customer_payment_history'),
-    path('driver/payment-history/', driver_payment_history, name='driver_payment_history'),
+    path('customer/payment-history/', view("payments.views.customer_payment_history"), name='customer_payment_history'),
+    path('driver/payment-history/', view("payments.views.driver_payment_history"), name='driver_payment_history'),
     
-    path("api/driver/toggle-availability/", api_toggle_driver_availability, name="api_toggle_availability"),
+    path("api/driver/toggle-availability/", view("accounts.views.api_toggle_driver_availability"), name="api_toggle_availability"),
+    path("api/sos/", view("rides.views.trigger_sos"), name="trigger_sos"),
 
 ]
 
-if settings.DEBUG: 
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+if settings.DEBUG:
+    # content-addressed uploads get immutable cache headers (DriveMate/media.py)
+    urlpatterns += static(settings.MEDIA_URL, view=view("DriveMate.media.serve_media"))
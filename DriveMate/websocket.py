@@ -0,0 +1,120 @@
+"""
+WebSocket endpoints next to Django's ASGI handler, without an extra framework.
+
+    application = websocket_router(get_asgi_application(), {
+        "/ws/driver/inbox/": "rides.inbox.driver_inbox",
+    })
+
+HTTP goes to Django as before. A websocket connection is handed to the
+coroutine registered for its path as a WebSocket; unknown paths are refused.
+Only ASGI servers speak WebSocket (uvicorn, with the websockets package), so
+under gunicorn's WSGI workers these endpoints do not exist and the pages
+fall back to reloading.
+"""
+import asyncio
+import json
+from http.cookies import SimpleCookie
+from urllib.parse import urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# close codes (4000-4999 are the application's)
+FORBIDDEN = 4403
+NOT_FOUND = 4404
+
+
+class WebSocketDisconnect(Exception):
+    pass
+
+
+class WebSocket:
+    def __init__(self, scope, receive, send):
+        self.scope = scope
+        self._receive = receive
+        self._send = send
+        self.headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope.get("headers", [])}
+
+    async def handshake(self):
+        """Wait for the client's connect event."""
+        message = await self._receive()
+        if message["type"] != "websocket.connect":
+            raise WebSocketDisconnect()
+
+    async def accept(self):
+        await self._send({"type": "websocket.accept"})
+
+    async def close(self, code=1000):
+        await self._send({"type": "websocket.close", "code": code})
+
+    async def send_json(self, data):
+        await self._send({"type": "websocket.send", "text": json.dumps(data, separators=(",", ":"))})
+
+    async def receive(self):
+        """The next text frame; raises WebSocketDisconnect when the client leaves."""
+        message = await self._receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect()
+        return message.get("text")
+
+    def same_origin(self):
+        """Browsers send Origin on WebSocket handshakes; refuse other sites (no CSRF token here)."""
+        origin = self.headers.get("origin")
+        return origin is not None and urlsplit(origin).netloc == self.headers.get("host")
+
+    async def session(self):
+        """The data of the Django session named by the request's cookie (empty if none)."""
+        cookie = SimpleCookie(self.headers.get("cookie", ""))
+        morsel = cookie.get(settings.SESSION_COOKIE_NAME)
+        store = import_string(settings.SESSION_ENGINE + ".SessionStore")(morsel.value if morsel else None)
+        # a cache hit on most connects when sessions are in the shared cache
+        return await sync_to_async(lambda: dict(store.items()))()
+
+
+async def _until_disconnect(socket):
+    try:
+        while True:
+            await socket.receive()  # these sockets only push; this notices the client leaving
+    except WebSocketDisconnect:
+        pass
+
+
+async def relay(socket, source, on_sent=None):
+    """Send each message `await source.get()` yields until the client disconnects."""
+    gone = asyncio.ensure_future(_until_disconnect(socket))
+    try:
+        while True:
+            message = asyncio.ensure_future(source.get())
+            await asyncio.wait({gone, message}, return_when=asyncio.FIRST_COMPLETED)
+            if not message.done():
+                message.cancel()
+                return
+            await socket.send_json(message.result())
+            if on_sent is not None:
+                await on_sent(message.result())
+    finally:
+        gone.cancel()
+
+
+def websocket_router(http_app, routes):
+    """An ASGI app sending websocket scopes to routes (path -> dotted coroutine path), the rest to http_app."""
+    handlers = {}
+
+    async def application(scope, receive, send):
+        if scope["type"] != "websocket":
+            return await http_app(scope, receive, send)
+        path = scope["path"]
+        if path not in routes:
+            await receive()  # websocket.connect
+            return await send({"type": "websocket.close", "code": NOT_FOUND})
+        if path not in handlers:
+            handlers[path] = import_string(routes[path])
+        socket = WebSocket(scope, receive, send)
+        try:
+            await socket.handshake()
+            await handlers[path](socket)
+        except WebSocketDisconnect:
+            pass
+
+    return application
@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        from DriveMate.sqlite import configure_connection
+        connection_created.connect(configure_connection, dispatch_uid="drivemate_sqlite_pragmas")
+
+        from DriveMate import images, storage
+        images.connect_signals()
+        storage.connect_signals()
@@ -0,0 +1,22 @@
+from functools import wraps
+
+from django.contrib import messages
+from django.shortcuts import redirect
+
+
+def login_required_role(allowed_roles=None):
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped(request, *args, **kwargs):
+            uid = request.session.get('user_id')
+            role = request.session.get('user_role')
+            if not uid:
+                return redirect('login')
+            if allowed_roles and role not in allowed_roles:
+                messages.error(request, "You don't have permission to view that page.")
+                return redirect('login')
+            return view_func(request, *args, **kwargs)
+        # exposed so tooling (e.g. the query budget tests) knows which role to log in as
+        _wrapped.allowed_roles = allowed_roles
+        return _wrapped
+    return decorator
@@ -0,0 +1,40 @@
+"""
+Compile the site stylesheet from the templates (DriveMate/assets.py).
+
+    python manage.py build_css            # write accounts/static/css/drivemate.css
+    python manage.py build_css --check    # exit 1 if it is out of date (CI)
+    python manage.py collectstatic        # then hash and compress it for deploys
+
+Needs Node.js on PATH.
+"""
+import gzip
+import tempfile
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from DriveMate.assets import CSS_OUTPUT, AssetBuildError, build_css
+
+
+class Command(BaseCommand):
+    help = "Build the purged, minified Tailwind stylesheet from the project templates."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true",
+                            help="only check that the committed stylesheet matches the templates")
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            target = Path(tmp) / CSS_OUTPUT.name if options["check"] else CSS_OUTPUT
+            try:
+                candidates, size = build_css(target)
+            except AssetBuildError as exc:
+                raise CommandError(str(exc))
+            built = target.read_bytes()
+        if options["check"]:
+            if not CSS_OUTPUT.exists() or CSS_OUTPUT.read_bytes() != built:
+                raise CommandError(f"{CSS_OUTPUT} is out of date; run `manage.py build_css`")
+            self.stdout.write(f"{CSS_OUTPUT.name} is up to date")
+            return
+        self.stdout.write(f"wrote {CSS_OUTPUT} from {len(candidates)} candidate classes: "
+                          f"{size / 1024:.1f} KB, {len(gzip.compress(built)) / 1024:.1f} KB gzipped")
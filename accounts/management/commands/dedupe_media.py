@@ -0,0 +1,131 @@
+"""
+Move existing uploads into the content-addressed store and recount references.
+
+    python manage.py dedupe_media --dry-run    # what would be merged and saved
+    python manage.py dedupe_media              # do it
+    python manage.py dedupe_media --delete-orphans
+
+Every file referenced by Driver.profile_pic, Driver.id_proof or
+VehicleImage.image under a legacy name (gopz_6mOzHs3.jpg, ...) is hashed and
+stored once under its digest (DriveMate/storage.py); the rows are repointed
+and the old file is deleted. Renditions made for the old names are dropped,
+so run `manage.py generate_renditions` afterwards. Finally accounts.MediaBlob
+is rebuilt from the rows, which also repairs drifted counts. Names that rows
+reference but that are missing on disk are listed and left alone.
+
+--delete-orphans also removes files in the upload directories that no row
+references, e.g. uploads written by registrations that were rolled back.
+"""
+from collections import Counter
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from DriveMate.images import RENDITION_FIELDS, rendition_names
+from DriveMate.storage import DERIVED_DIR, blob_digest, blob_name, file_digest, media_storage
+from accounts.models import MediaBlob
+
+FILE_FIELDS = (
+    ("accounts.Driver", "profile_pic"),
+    ("accounts.Driver", "id_proof"),
+    ("vehicles.VehicleImage", "image"),
+)
+
+
+def referenced_names(model, field):
+    return model.objects.exclude(**{field: ""}).exclude(**{f"{field}__isnull": True}).values_list(field, flat=True)
+
+
+class Command(BaseCommand):
+    help = "Deduplicate uploaded media into content-addressed storage and rebuild reference counts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="only report what would change")
+        parser.add_argument("--delete-orphans", action="store_true",
+                            help="delete files in the upload directories that no row references")
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        moved, missing, saved_bytes = {}, set(), 0
+        blobs_seen = set()
+        for label, field in FILE_FIELDS:
+            for name in set(referenced_names(apps.get_model(label), field)):
+                if name in moved:
+                    continue
+                if not media_storage.exists(name):
+                    missing.add(name)
+                    continue
+                if blob_digest(name) is not None:
+                    continue
+                with media_storage.open(name, "rb") as fh:
+                    target = blob_name(name, file_digest(fh))
+                    if target in blobs_seen or media_storage.exists(target):
+                        saved_bytes += media_storage.size(name)
+                    elif not dry_run:
+                        media_storage.save(name, fh)  # stored as target
+                blobs_seen.add(target)
+                moved[name] = target
+
+        if not dry_run:
+            self.repoint(moved)
+            self.rebuild_counts()
+
+        verb = "would move" if dry_run else "moved"
+        self.stdout.write(f"{verb} {len(moved)} files into {len(blobs_seen)} blobs, "
+                          f"{saved_bytes / 1024:.0f} KB of duplicates")
+        for name in sorted(missing):
+            self.stdout.write(f"missing on disk: {name}")
+
+        referenced = {moved.get(name, name) for label, field in FILE_FIELDS
+                      for name in referenced_names(apps.get_model(label), field)}
+        orphans = [name for name in self.stored_files() if name not in referenced and name not in moved]
+        orphan_bytes = sum(media_storage.size(name) for name in orphans)
+        if options["delete_orphans"] and not dry_run:
+            for name in orphans:
+                media_storage.delete_blob(name)
+            self.stdout.write(f"deleted {len(orphans)} unreferenced files, {orphan_bytes / 1024:.0f} KB")
+        else:
+            self.stdout.write(f"{len(orphans)} unreferenced files, {orphan_bytes / 1024:.0f} KB "
+                              "(--delete-orphans removes them)")
+
+    def stored_files(self):
+        """Every original in the upload directories (renditions excluded)."""
+        directories = {apps.get_model(label)._meta.get_field(field).upload_to.strip("/")
+                       for label, field in FILE_FIELDS}
+        pending = [d for d in directories if media_storage.exists(d)]
+        while pending:
+            directory = pending.pop()
+            subdirs, files = media_storage.listdir(directory)
+            pending += [f"{directory}/{d}" for d in subdirs if d != DERIVED_DIR]
+            yield from (f"{directory}/{f}" for f in files if not f.startswith("."))
+
+    def repoint(self, moved):
+        old_renditions = set()
+        with transaction.atomic():
+            for label, field in FILE_FIELDS:
+                model = apps.get_model(label)
+                file_field, meta_field = RENDITION_FIELDS[label]
+                meta_field = meta_field if file_field == field else None
+                for old, new in moved.items():
+                    rows = model.objects.filter(**{field: old})
+                    if meta_field:
+                        for meta in rows.values_list(meta_field, flat=True):
+                            old_renditions |= rendition_names(meta)
+                        rows.update(**{field: new, meta_field: {}})
+                    else:
+                        rows.update(**{field: new})
+        # the rows are committed; the legacy files and their renditions can go
+        for name in set(moved) | old_renditions:
+            media_storage.delete(name)
+
+    def rebuild_counts(self):
+        counts = Counter()
+        for label, field in FILE_FIELDS:
+            counts.update(referenced_names(apps.get_model(label), field))
+        with transaction.atomic():
+            MediaBlob.objects.all().delete()
+            MediaBlob.objects.bulk_create(
+                [MediaBlob(name=name, refcount=n) for name, n in counts.items() if blob_digest(name)],
+                batch_size=500,
+            )
@@ -0,0 +1,125 @@
+"""
+EXPLAIN every query each view runs and report full table scans.
+
+    python manage.py seed_scale --rides 100000
+    python manage.py explain_views [--fail-on-scan]
+
+Walks the URLconf like the query budget tests, GETs every view as a user of
+the right role picked from the current database (so run it against seeded
+data), captures the SELECTs and runs them through EXPLAIN (EXPLAIN QUERY PLAN
+on SQLite). Plan steps that read a whole table are printed per view:
+"SCAN <table>" on SQLite, "Seq Scan on <table>" on PostgreSQL. Note that
+PostgreSQL prefers sequential scans on small tables, so only trust its
+output on a realistically sized dataset.
+"""
+import logging
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from DriveMate.perf import routed_views, view_url
+from accounts.models import User
+from rides.models import Ride, RideRequest
+
+SQLITE_SCAN = re.compile(r"^SCAN (?!CONSTANT ROW)(?!\()")
+POSTGRES_SCAN = re.compile(r"Seq Scan on \w+")
+
+
+def full_scans(vendor, plan_rows):
+    """Return the plan steps of an EXPLAIN result that scan a whole table."""
+    if vendor == "sqlite":
+        # rows are (id, parent, notused, detail)
+        return [row[-1] for row in plan_rows if SQLITE_SCAN.match(row[-1])]
+    if vendor == "postgresql":
+        return [m.group(0) for row in plan_rows for m in POSTGRES_SCAN.finditer(row[0])]
+    raise CommandError(f"explain_views does not support the {vendor} backend")
+
+
+class Command(BaseCommand):
+    help = "Run EXPLAIN on the queries of every view and report full table scans."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fail-on-scan", action="store_true",
+                            help="exit with an error if any full scan is found (for CI)")
+
+    def sample_data(self):
+        ride_request = RideRequest.objects.select_related("driver", "ride").order_by("-id").first()
+        ride = Ride.objects.order_by("-id").first()
+        if ride_request is None or ride is None:
+            raise CommandError("No rides or ride requests found, seed some data first (manage.py seed_scale).")
+        users = {
+            "customer": ride.customer_id,
+            "driver": ride_request.driver.user_id,
+            "admin": User.objects.filter(role="admin").values_list("id", flat=True).first(),
+        }
+        values = {
+            "ride_id": ride.id,
+            "pk": ride_request.id,
+            "driver_id": ride_request.driver_id,
+            "profile_id": "missing",
+        }
+        return users, values
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}")
+            return cursor.fetchall()
+
+    def handle(self, *args, **opts):
+        users, values = self.sample_data()
+        client = Client()
+
+        # the 403/404/405s of views called without their real arguments are expected
+        request_logger = logging.getLogger("django.request")
+        log_level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            total = self.explain_views(client, users, values)
+        finally:
+            request_logger.setLevel(log_level)
+            client.logout()
+
+        self.stdout.write(f"{total} full scan(s) in total")
+        if total and opts["fail_on_scan"]:
+            raise CommandError(f"{total} full table scan(s) found")
+
+    def explain_views(self, client, users, values):
+        total = 0
+        with override_settings(ALLOWED_HOSTS=["testserver"]):
+            for pattern in routed_views():
+                name = pattern.name or str(pattern.pattern)
+                roles = getattr(pattern.callback, "allowed_roles", None)
+                client.logout()
+                if roles:
+                    user = User.objects.filter(pk=users.get(roles[0])).first()
+                    if user is None:
+                        self.stdout.write(f"{name}: skipped, no {roles[0]} user")
+                        continue
+                    session = client.session
+                    session["user_id"], session["user_role"], session["user_name"] = user.id, user.role, user.name
+                    session.save()
+
+                with CaptureQueriesContext(connection) as ctx:
+                    client.get(view_url(pattern, values))
+
+                seen = set()
+                scans = []
+                for query in ctx.captured_queries:
+                    sql = query["sql"]
+                    if not sql.lstrip().upper().startswith("SELECT") or sql in seen:
+                        continue
+                    seen.add(sql)
+                    for step in full_scans(connection.vendor, self.explain(sql)):
+                        scans.append((step, sql))
+
+                total += len(scans)
+                if not scans:
+                    self.stdout.write(f"{name}: ok ({len(seen)} queries)")
+                    continue
+                self.stdout.write(self.style.WARNING(f"{name}: {len(scans)} full scan(s)"))
+                for step, sql in scans:
+                    self.stdout.write(f"    {step}\n        {sql[:200]}")
+        return total
@@ -0,0 +1,37 @@
+"""
+Build responsive renditions for images uploaded before they existed.
+
+    python manage.py generate_renditions            # only images without current renditions
+    python manage.py generate_renditions --force    # re-render everything (e.g. new widths)
+
+Renders with IMAGE_WORKERS threads (0 = one at a time on this thread), through
+the same code path as uploads (DriveMate/images.py).
+"""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from DriveMate.images import RENDITION_FIELDS, needs_renditions, render_in_thread, render_instance
+
+
+class Command(BaseCommand):
+    help = "Generate AVIF/WebP renditions for vehicle images and driver profile pictures."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="re-render images that already have renditions")
+
+    def handle(self, *args, **options):
+        workers = settings.IMAGE_WORKERS
+        with ThreadPoolExecutor(max_workers=workers) if workers else nullcontext() as pool:
+            render = render_in_thread if pool else render_instance
+            run = pool.map if pool else map
+            for label, (file_field, meta_field) in RENDITION_FIELDS.items():
+                qs = apps.get_model(label).objects.exclude(**{file_field: ""}).exclude(**{f"{file_field}__isnull": True})
+                pks = [obj.pk for obj in qs.only(file_field, meta_field).iterator()
+                       if options["force"] or needs_renditions(obj, label)]
+                results = list(run(lambda pk: render(label, pk), pks))
+                done = sum(1 for meta in results if meta)
+                self.stdout.write(f"{label}: rendered {done} of {len(pks)} ({len(pks) - done} failed or skipped)")
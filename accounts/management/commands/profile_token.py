@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from DriveMate.profiling import TOKEN_MAX_AGE, make_profile_token
+
+
+class Command(BaseCommand):
+    help = "Print a signed X-DriveMate-Profile header value that forces profiling of a request."
+
+    def handle(self, *args, **opts):
+        token = make_profile_token()
+        self.stdout.write(token)
+        self.stderr.write(f"valid for {TOKEN_MAX_AGE // 60} minutes, e.g.\n"
+                          f"  curl -H 'X-DriveMate-Profile: {token}' http://127.0.0.1:8000/dashboard/customer/")
@@ -0,0 +1,32 @@
+"""
+Run the local pub/sub broker (DriveMate/pubsub.py).
+
+    PUBSUB_BROKER_SOCKET=/run/drivemate/pubsub.sock python manage.py run_pubsub_broker
+
+Start one per machine and give every web and worker process the same
+PUBSUB_BROKER_SOCKET, so an event raised in any of them reaches the
+WebSockets held by all of them.
+"""
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from DriveMate.pubsub import serve_broker
+
+
+class Command(BaseCommand):
+    help = "Forward push messages between the processes on this machine."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--socket", help="Unix socket path (default: PUBSUB_BROKER_SOCKET)")
+
+    def handle(self, *args, **options):
+        path = options["socket"] or settings.PUBSUB_BROKER_SOCKET
+        if not path:
+            raise CommandError("set PUBSUB_BROKER_SOCKET or pass --socket")
+        self.stdout.write(f"pubsub broker on {path}")
+        try:
+            asyncio.run(serve_broker(path))
+        except KeyboardInterrupt:
+            pass
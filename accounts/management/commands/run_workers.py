@@ -0,0 +1,46 @@
+"""
+Run background jobs (DriveMate/jobs.py).
+
+    python manage.py run_workers                      # every queue in JOB_QUEUES, until SIGTERM/Ctrl-C
+    python manage.py run_workers --queue images       # only some queues (repeatable)
+    python manage.py run_workers --concurrency images=4
+    python manage.py run_workers --burst              # run what is due, then exit (cron, deploy hooks)
+
+Start as many of these as needed, on one machine or several: jobs are claimed
+atomically, and --concurrency limits apply per process. On SIGTERM no new
+jobs are claimed and running ones finish before the process exits.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from DriveMate.jobs import Worker
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs with a thread pool per queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--queue", action="append", dest="queues", help="queue to work on (default: all)")
+        parser.add_argument("--concurrency", action="append", default=[], metavar="QUEUE=N",
+                            help="threads for a queue, overriding JOB_QUEUES")
+        parser.add_argument("--burst", action="store_true", help="exit once no job is due")
+
+    def handle(self, *args, **options):
+        limits = dict(settings.JOB_QUEUES)
+        for item in options["concurrency"]:
+            queue, _, n = item.partition("=")
+            if not n.isdigit() or int(n) < 1:
+                raise CommandError(f"--concurrency expects QUEUE=N, got {item!r}")
+            limits[queue] = int(n)
+        unknown = set(options["queues"] or ()) - set(limits)
+        if unknown:
+            raise CommandError(f"unknown queue(s): {', '.join(sorted(unknown))}")
+
+        if options["queues"]:
+            limits = {queue: limits[queue] for queue in options["queues"]}
+        worker = Worker(limits)
+        if not options["burst"]:
+            worker.install_signal_handlers()
+        self.stdout.write(f"worker {worker.name}: " + ", ".join(f"{q}={n}" for q, n in worker.limits.items()))
+        ran = worker.run(burst=options["burst"])
+        self.stdout.write(f"ran {ran} jobs")
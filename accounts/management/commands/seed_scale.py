@@ -0,0 +1,263 @@
+"""
+Generate a large synthetic dataset for load and scale testing.
+
+    python manage.py seed_scale --customers 20000 --drivers 2000 --rides 1000000 --seed 42
+
+Everything is inserted with bulk_create in batches, so a million rides load in
+minutes rather than hours. The same --seed always produces the same data.
+Seeded users are recognisable by their e-mail domain and can be removed again
+with --clear.
+"""
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import User, Driver
+from payments.models import Payment
+from rides.models import Ride, RideRequest, RidePurpose, Rating
+from vehicles.models import Vehicle, VehicleImage
+
+SEED_EMAIL_DOMAIN = "seed.drivemate.test"
+
+# (name, latitude, longitude) - drivers and rides cluster around these
+CITIES = [
+    ("Kochi", 9.9312, 76.2673),
+    ("Bengaluru", 12.9716, 77.5946),
+    ("Chennai", 13.0827, 80.2707),
+    ("Mumbai", 19.0760, 72.8777),
+    ("Delhi", 28.7041, 77.1025),
+    ("Hyderabad", 17.3850, 78.4867),
+]
+CITY_SPREAD_DEG = 0.08  # ~9 km standard deviation around the city centre
+
+VEHICLE_MODELS = [
+    ("Tata", "Nexon", Vehicle.VehicleType.SUV),
+    ("Maruti", "Swift", Vehicle.VehicleType.HATCHBACK),
+    ("Hyundai", "Verna", Vehicle.VehicleType.SEDAN),
+    ("Toyota", "Innova", Vehicle.VehicleType.MUV),
+    ("BMW", "M4", Vehicle.VehicleType.LUXURY),
+]
+# files already present under media/ so seeded pages render real images
+VEHICLE_IMAGES = [
+    "vehicle_images/nexon.avif", "vehicle_images/nexon_2.avif", "vehicle_images/tata.avif",
+    "vehicle_images/tata_2.avif", "vehicle_images/m4_1.png", "vehicle_images/m4_2.png",
+    "vehicle_images/bal_1.png", "vehicle_images/bal_2.png",
+]
+PROFILE_PICS = ["driver_profile/albinpr.png", "driver_profile/gopz.jpg", "driver_profile/mub.png"]
+PLACES = ["MG Road", "Railway Station", "Airport", "Tech Park", "City Mall", "Bus Stand", "Medical College"]
+
+
+class Command(BaseCommand):
+    help = "Bulk-generate users, drivers, vehicles, rides, ride requests, ratings and payments."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customers", type=int, default=10000)
+        parser.add_argument("--drivers", type=int, default=1000)
+        parser.add_argument("--rides", type=int, default=100000)
+        parser.add_argument("--requests-per-ride", type=int, default=3)
+        parser.add_argument("--seed", type=int, default=42, help="random seed, same seed -> same data")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--clear", action="store_true", help="delete previously seeded data first")
+
+    def handle(self, *args, **opts):
+        self.rng = random.Random(opts["seed"])
+        self.batch_size = opts["batch_size"]
+        self.now = timezone.now()
+
+        if opts["clear"]:
+            deleted, _ = User.objects.filter(email__endswith="@" + SEED_EMAIL_DOMAIN).delete()
+            self.stdout.write(f"Removed {deleted} previously seeded rows.")
+
+        # one hash for every seeded account: hashing per user would dominate the run time
+        self.password = make_password("drivemate123")
+
+        purposes = self.seed_purposes()
+        customer_ids = self.seed_customers(opts["customers"])
+        drivers = self.seed_drivers(opts["drivers"])
+        vehicles = self.seed_vehicles(drivers)
+        self.seed_rides(opts["rides"], opts["requests_per_ride"], customer_ids, drivers, vehicles, purposes)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(customer_ids)} customers, {len(drivers)} drivers, "
+            f"{len(vehicles)} vehicles and {opts['rides']} rides (seed={opts['seed']})."
+        ))
+
+    # ----------------------------
+    # helpers
+    # ----------------------------
+    def point_near(self, city):
+        _, lat, lon = city
+        return (
+            Decimal(str(round(self.rng.gauss(lat, CITY_SPREAD_DEG), 6))),
+            Decimal(str(round(self.rng.gauss(lon, CITY_SPREAD_DEG), 6))),
+        )
+
+    def bulk(self, model, objs):
+        return model.objects.bulk_create(objs, batch_size=self.batch_size)
+
+    def seed_purposes(self):
+        for slug, name in [("office", "Office"), ("airport", "Airport"), ("outstation", "Outstation")]:
+            RidePurpose.objects.get_or_create(slug=slug, defaults={"name": name})
+        return list(RidePurpose.objects.values_list("id", flat=True))
+
+    def seed_customers(self, n):
+        users = [
+            User(
+                name=f"Customer {i}", email=f"customer{i}@{SEED_EMAIL_DOMAIN}", phone=f"7{i:09d}",
+                password=self.password, gender=self.rng.choice(["male", "female", "other"]),
+                role="customer", created_at=self.now,
+            )
+            for i in range(n)
+        ]
+        with transaction.atomic():
+            return [u.pk for u in self.bulk(User, users)]
+
+    def seed_drivers(self, n):
+        users = [
+            User(
+                name=f"Driver {i}", email=f"driver{i}@{SEED_EMAIL_DOMAIN}", phone=f"8{i:09d}",
+                password=self.password, gender=self.rng.choice(["male", "male", "female"]),
+                role="driver", created_at=self.now,
+            )
+            for i in range(n)
+        ]
+        with transaction.atomic():
+            users = self.bulk(User, users)
+            drivers = []
+            for i, user in enumerate(users):
+                city = CITIES[i % len(CITIES)]
+                lat, lon = self.point_near(city)
+                drivers.append(Driver(
+                    user=user, license_number=f"SEED-DL-{i:08d}",
+                    experience_years=self.rng.randint(0, 25),
+                    verified=self.rng.random() < 0.9,
+                    background_check_passed=self.rng.random() < 0.9,
+                    rating=round(self.rng.uniform(3.0, 5.0), 2),
+                    is_available=self.rng.random() < 0.6,
+                    profile_pic=self.rng.choice(PROFILE_PICS),
+                    last_location=city[0], latitude=lat, longitude=lon,
+                    day_fixed_charge=Decimal(self.rng.randrange(600, 1200, 50)),
+                    night_fixed_charge=Decimal(self.rng.randrange(800, 1600, 50)),
+                ))
+            return self.bulk(Driver, drivers)
+
+    def seed_vehicles(self, drivers):
+        vehicles = []
+        for i, driver in enumerate(drivers):
+            # roughly two thirds of drivers register with their own car
+            if self.rng.random() > 0.66:
+                continue
+            make, model, vehicle_type = self.rng.choice(VEHICLE_MODELS)
+            vehicles.append(Vehicle(
+                owner_id=driver.user_id, current_driver=driver, vehicle_type=vehicle_type,
+                make=make, model=model, year=self.rng.randint(2012, 2025),
+                registration_number=f"SEED{i:08d}", seat_capacity=7 if vehicle_type == Vehicle.VehicleType.MUV else 4,
+                transmission=self.rng.choice(Vehicle.Transmission.values),
+                fuel_type=self.rng.choice(Vehicle.Fuel.values),
+                per_km_rate=Decimal(self.rng.randrange(10, 30)), per_min_rate=Decimal("1.00"),
+                verified=self.rng.random() < 0.9, active=True,
+            ))
+        with transaction.atomic():
+            vehicles = self.bulk(Vehicle, vehicles)
+            images = []
+            for vehicle in vehicles:
+                for j in range(self.rng.randint(1, 4)):
+                    images.append(VehicleImage(vehicle=vehicle, image=self.rng.choice(VEHICLE_IMAGES), is_primary=(j == 0)))
+            self.bulk(VehicleImage, images)
+        return vehicles
+
+    def seed_rides(self, n, requests_per_ride, customer_ids, drivers, vehicles, purposes):
+        if not (customer_ids and drivers):
+            return
+        vehicle_by_driver = {v.current_driver_id: v for v in vehicles}
+        drivers_by_city = {}
+        for driver in drivers:
+            drivers_by_city.setdefault(driver.last_location, []).append(driver)
+        city_by_name = {c[0]: c for c in CITIES}
+        statuses = Ride.Status.values
+        # most rides in a live system are finished, keep a realistic tail of open ones
+        status_weights = [5, 3, 2, 80, 10]
+
+        for start in range(0, n, self.batch_size):
+            count = min(self.batch_size, n - start)
+            rides, assigned = [], []
+            for _ in range(count):
+                city_name = self.rng.choice(list(drivers_by_city))
+                city = city_by_name[city_name]
+                driver = self.rng.choice(drivers_by_city[city_name])
+                vehicle = vehicle_by_driver.get(driver.id)
+                status = self.rng.choices(statuses, status_weights)[0]
+                created = self.now - timedelta(minutes=self.rng.randint(0, 60 * 24 * 365))
+                start_lat, start_lon = self.point_near(city)
+                end_lat, end_lon = self.point_near(city)
+                has_driver = status != Ride.Status.REQUESTED
+                distance = Decimal(self.rng.randint(200, 4000)) / 100
+                fare = (distance * (vehicle.per_km_rate if vehicle else Decimal("15"))).quantize(Decimal("0.01"))
+                tax = (fare * Decimal("0.05")).quantize(Decimal("0.01"))
+                finished = status == Ride.Status.COMPLETED
+                rides.append(Ride(
+                    customer_id=self.rng.choice(customer_ids),
+                    driver=driver if has_driver else None,
+                    vehicle=vehicle if has_driver else None,
+                    ride_mode=Ride.Mode.CAR_WITH_DRIVER if vehicle else Ride.Mode.DRIVER_ONLY,
+                    start_location=f"{self.rng.choice(PLACES)}, {city_name}",
+                    start_latitude=start_lat, start_longitude=start_lon,
+                    end_location=f"{self.rng.choice(PLACES)}, {city_name}",
+                    end_latitude=end_lat, end_longitude=end_lon,
+                    start_time=created, created_at=created,
+                    end_time=created + timedelta(minutes=int(distance * 3)) if finished else None,
+                    status=status, purpose_id=self.rng.choice(purposes),
+                    actual_distance_km=distance if finished else None,
+                    actual_duration_min=int(distance * 3) if finished else None,
+                    base_fare=fare if finished else None,
+                    tax_amount=tax if finished else None,
+                    total_amount=fare + tax if finished else None,
+                ))
+                assigned.append((driver, city_name))
+
+            with transaction.atomic():
+                rides = self.bulk(Ride, rides)
+                self.seed_ride_children(rides, assigned, requests_per_ride, drivers_by_city)
+            self.stdout.write(f"  rides {start + count}/{n}")
+
+    def seed_ride_children(self, rides, assigned, requests_per_ride, drivers_by_city):
+        request_status = {
+            Ride.Status.REQUESTED: RideRequest.Status.PENDING,
+            Ride.Status.ACCEPTED: RideRequest.Status.ACCEPTED,
+            Ride.Status.ONGOING: RideRequest.Status.COMPLETED,
+            Ride.Status.COMPLETED: RideRequest.Status.COMPLETED,
+            Ride.Status.CANCELLED: RideRequest.Status.AUTO_CANCELLED,
+        }
+        requests, ratings, payments = [], [], []
+        for ride, (driver, city_name) in zip(rides, assigned):
+            others = self.rng.sample(drivers_by_city[city_name], min(requests_per_ride, len(drivers_by_city[city_name])))
+            seen = {driver.id}
+            requests.append(RideRequest(ride=ride, driver=driver, status=request_status[ride.status], requested_at=ride.created_at))
+            for other in others:
+                if other.id in seen:
+                    continue
+                seen.add(other.id)
+                other_status = RideRequest.Status.PENDING if ride.status == Ride.Status.REQUESTED else RideRequest.Status.AUTO_CANCELLED
+                requests.append(RideRequest(ride=ride, driver=other, status=other_status, requested_at=ride.created_at))
+
+            if ride.status != Ride.Status.COMPLETED:
+                continue
+            if self.rng.random() < 0.7:
+                ratings.append(Rating(
+                    ride=ride, customer_id=ride.customer_id, driver=driver, vehicle=ride.vehicle,
+                    score=self.rng.choices([1, 2, 3, 4, 5], [2, 3, 10, 35, 50])[0], created_at=ride.end_time,
+                ))
+            payments.append(Payment(
+                customer_id=ride.customer_id, ride=ride, amount=ride.total_amount,
+                status=Payment.Status.SUCCESS if self.rng.random() < 0.95 else Payment.Status.FAILED,
+                method=self.rng.choice(Payment.Method.values), order_id=f"SEED-{ride.pk}",
+                paid_at=ride.end_time, created_at=ride.end_time,
+            ))
+        self.bulk(RideRequest, requests)
+        self.bulk(Rating, ratings)
+        self.bulk(Payment, payments)
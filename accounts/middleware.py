@@ -0,0 +1,72 @@
+"""
+Request-scoped access to the logged-in DriveMate user.
+
+CurrentUserMiddleware (after SessionMiddleware) gives every request two lazy
+attributes:
+
+- request.drivemate_user    the accounts.User of session["user_id"], or None
+- request.drivemate_driver  that user's Driver profile, or None
+
+Each is looked up at most once per request, on first use, and then shared by
+the views, templates and helpers that need it. Resolving the driver first
+joins its user, so driver views get both from a single query.
+login_required_role keeps checking the session only and never forces a lookup.
+"""
+from django.http import Http404
+from django.utils.functional import SimpleLazyObject
+
+from .models import Driver, User
+
+_UNSET = object()
+
+
+def get_current_user(request):
+    user = getattr(request, "_drivemate_user", _UNSET)
+    if user is _UNSET:
+        uid = request.session.get("user_id")
+        user = User.objects.filter(pk=uid).first() if uid else None
+        request._drivemate_user = user
+    return user
+
+
+def get_current_driver(request):
+    driver = getattr(request, "_drivemate_driver", _UNSET)
+    if driver is _UNSET:
+        uid = request.session.get("user_id")
+        user = getattr(request, "_drivemate_user", _UNSET)
+        if not uid or user is None:
+            driver = None
+        elif user is _UNSET:
+            driver = Driver.objects.select_related("user").filter(user_id=uid).first()
+            if driver is not None:
+                request._drivemate_user = driver.user
+        else:
+            driver = Driver.objects.filter(user=user).first()
+            if driver is not None:
+                driver.user = user
+        request._drivemate_driver = driver
+    return driver
+
+
+def current_user_or_404(request):
+    user = get_current_user(request)
+    if user is None:
+        raise Http404("User not found.")
+    return user
+
+
+def current_driver_or_404(request):
+    driver = get_current_driver(request)
+    if driver is None:
+        raise Http404("Driver profile not found.")
+    return driver
+
+
+class CurrentUserMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.drivemate_user = SimpleLazyObject(lambda: get_current_user(request))
+        request.drivemate_driver = SimpleLazyObject(lambda: get_current_driver(request))
+        return self.get_response(request)
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_auto_20250830_1045'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='driver',
+            index=models.Index(fields=['is_available', 'verified', 'background_check_passed', 'rating'], name='accounts_dr_is_avai_d24654_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_driver_accounts_dr_is_avai_d24654_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='driver',
+            name='profile_pic_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:17
+
+import DriveMate.storage
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_driver_profile_pic_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('refcount', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='driver',
+            name='id_proof',
+            field=models.FileField(blank=True, null=True, storage=DriveMate.storage.content_addressed_storage, upload_to='id_proofs/'),
+        ),
+        migrations.AlterField(
+            model_name='driver',
+            name='profile_pic',
+            field=models.FileField(blank=True, null=True, storage=DriveMate.storage.content_addressed_storage, upload_to='driver_profile/'),
+        ),
+    ]
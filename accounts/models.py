@@ -6,6 +6,8 @@ from decimal import Decimal
 from datetime import time as _time
 import datetime
 
+from DriveMate.storage import ContentAddressedFilesMixin, content_addressed_storage
+
 class User(models.Model):
     ROLE_CHOICES = (
         ("customer", "Customer"),
@@ -40,7 +42,9 @@ class User(models.Model):
         return f"{self.name} ({self.role})"
 
 
-class Driver(models.Model):
+class Driver(ContentAddressedFilesMixin, models.Model):
+    content_addressed_fields = ("profile_pic", "id_proof")
+
     user = models.OneToOneField("accounts.User", on_delete=models.CASCADE, related_name="driver_profile")
     license_number = models.CharField(max_length=50, unique=True)
     license_expiry = models.DateField(blank=True, null=True)
@@ -49,8 +53,9 @@ class Driver(models.Model):
     background_check_passed = models.BooleanField(default=False)
     rating = models.FloatField(default=0.0)
     is_available = models.BooleanField(default=True)
-    profile_pic = models.FileField(upload_to='driver_profile/', null=True, blank=True)
-    id_proof = models.FileField(upload_to='id_proofs/', null=True, blank=True)
+    profile_pic = models.FileField(upload_to='driver_profile/', storage=content_addressed_storage, null=True, blank=True)
+    profile_pic_renditions = models.JSONField(default=dict, blank=True, editable=False)
+    id_proof = models.FileField(upload_to='id_proofs/', storage=content_addressed_storage, null=True, blank=True)
     last_location = models.CharField(max_length=255,null=True, blank=True)
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
@@ -66,6 +71,12 @@ class Driver(models.Model):
     night_start = models.TimeField(default=_time(hour=18, minute=0))
     night_end = models.TimeField(default=_time(hour=6, minute=0))
 
+    class Meta:
+        indexes = [
+            # select_driver candidate filter, best rated first
+            models.Index(fields=["is_available", "verified", "background_check_passed", "rating"]),
+        ]
+
     def __str__(self):
         return f"Driver: {self.user.name} ({'Verified' if self.verified else 'Pending'})"
     def set_availability(self, value: bool):
@@ -73,4 +84,43 @@ class Driver(models.Model):
         self.save(update_fields=["is_available"])
 
 
+class MediaBlob(models.Model):
+    """A stored upload and how many file fields point at it (DriveMate/storage.py)."""
+    name = models.CharField(max_length=255, unique=True)
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount})"
+
+
+class Job(models.Model):
+    """Deferred work, run by `manage.py run_workers` (DriveMate/jobs.py)."""
+    class Status(models.TextChoices):
+        QUEUED = "queued", "Queued"
+        RUNNING = "running", "Running"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
 
+    task = models.CharField(max_length=200)  # dotted path of a @job function
+    queue = models.CharField(max_length=50, default="default")
+    kwargs = models.JSONField(default=dict, blank=True)
+    key = models.CharField(max_length=200, unique=True, null=True, blank=True)  # idempotency key
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["queue", "status", "run_at"]),  # claiming due jobs
+            models.Index(fields=["status", "locked_at"]),  # stale locks, pruning
+        ]
+
+    def __str__(self):
+        return f"Job #{self.pk} {self.task} ({self.status})"
@@ -1,3 +1,1107 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+import asyncio
+import hashlib
+import os
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.messages import WARNING, get_messages
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from DriveMate import hashing, jobs, metrics, pubsub, ratelimit
+from DriveMate.assets import class_candidates, minify_css, template_files
+from DriveMate.database import database_config
+from DriveMate.images import rendition_names
+from DriveMate.media import serve_media
+from DriveMate.storage import media_storage
+from DriveMate.perf import get_query_budget, routed_views, view_url
+from DriveMate.lazy import LazyView
+from DriveMate.ratelimit import TokenBucketLimiter
+from DriveMate.warmup import warm_up
+from DriveMate.profiling import list_profiles, load_profile, make_profile_token
+from DriveMate.routers import LAST_WRITE_SESSION_KEY, PrimaryReplicaRouter, use_replica
+from DriveMate.sqlite import get_pragmas
+from accounts.middleware import CurrentUserMiddleware, get_current_user
+from accounts.models import Job, MediaBlob, User, Driver
+from payments.models import Payment
+from rides.models import Ride, RideRequest, RidePurpose, Rating, SOSAlert
+from vehicles.models import Vehicle, VehicleImage
+
+
+def seed_dataset(n_drivers=30, n_rides=40):
+    """
+    Small but realistic dataset: every driver has a vehicle with images,
+    the customer has rides in every status, requests, ratings and payments.
+    Large enough that any per-row query in a template shows up in the counts.
+    """
+    now = timezone.now()
+    purpose = RidePurpose.objects.create(slug="office", name="Office")
+    customer = User.objects.create(name="Cust", email="cust@example.com", phone="900000000", role="customer")
+    admin = User.objects.create(name="Admin", email="admin@example.com", phone="900000001", role="admin")
+
+    drivers = []
+    for i in range(n_drivers):
+        user = User.objects.create(
+            name=f"Driver {i}", email=f"driver{i}@example.com", phone=f"91{i:08d}",
+            role="driver", gender="female" if i % 3 == 0 else "male",
+        )
+        driver = Driver.objects.create(
+            user=user, license_number=f"LIC{i:05d}", verified=True, background_check_passed=True,
+            is_available=True, rating=3 + (i % 3), profile_pic=f"driver_profile/d{i}.png",
+            latitude=Decimal("9.93") + Decimal(i) / 1000, longitude=Decimal("76.26") + Decimal(i) / 1000,
+            day_fixed_charge=Decimal("800.00"), night_fixed_charge=Decimal("1000.00"),
+        )
+        vehicle = Vehicle.objects.create(
+            owner=user, current_driver=driver, vehicle_type=Vehicle.VehicleType.SEDAN, make="Tata",
+            model="Nexon", year=2022, registration_number=f"KL07AB{i:04d}", verified=True,
+            per_km_rate=Decimal("12.00"), per_min_rate=Decimal("1.00"),
+        )
+        for j in range(3):
+            VehicleImage.objects.create(vehicle=vehicle, image=f"vehicle_images/v{i}_{j}.png", is_primary=(j == 0))
+        drivers.append(driver)
+
+    statuses = [s for s, _ in Ride.Status.choices]
+    rides = []
+    for i in range(n_rides):
+        driver = drivers[i % n_drivers]
+        ride = Ride.objects.create(
+            customer=customer, driver=driver, vehicle=driver.assigned_vehicles.first(),
+            ride_mode=Ride.Mode.CAR_WITH_DRIVER if i % 2 else Ride.Mode.DRIVER_ONLY,
+            start_location="MG Road, Kochi", start_latitude=Decimal("9.97"), start_longitude=Decimal("76.28"),
+            end_location="Airport, Kochi", end_latitude=Decimal("10.15"), end_longitude=Decimal("76.39"),
+            status=statuses[i % len(statuses)], purpose=purpose,
+            actual_distance_km=Decimal("12.50"), actual_duration_min=30,
+            end_time=now - timedelta(hours=i), created_at=now - timedelta(hours=i),
+        )
+        rides.append(ride)
+        for other in drivers[:5]:
+            RideRequest.objects.get_or_create(ride=ride, driver=other, defaults={"status": RideRequest.Status.PENDING})
+        if ride.status == Ride.Status.COMPLETED:
+            RideRequest.objects.filter(ride=ride, driver=driver).update(status=RideRequest.Status.COMPLETED)
+            if i % 2:
+                Rating.objects.create(ride=ride, customer=customer, driver=driver, vehicle=ride.vehicle, score=4)
+            Payment.objects.create(
+                customer=customer, ride=ride, amount=Decimal("500.00"), method=Payment.Method.UPI,
+                status=Payment.Status.SUCCESS,
+            )
+
+    # completed, unrated and unpaid: exercises rate_ride and payment_page
+    target = Ride.objects.create(
+        customer=customer, driver=drivers[0], ride_mode=Ride.Mode.DRIVER_ONLY,
+        start_location="MG Road, Kochi", start_latitude=Decimal("9.97"), start_longitude=Decimal("76.28"),
+        end_location="Airport, Kochi", end_latitude=Decimal("10.15"), end_longitude=Decimal("76.39"),
+        status=Ride.Status.COMPLETED, end_time=now,
+        base_fare=Decimal("500.00"), tax_amount=Decimal("25.00"), total_amount=Decimal("525.00"),
+    )
+    target_request = RideRequest.objects.create(ride=target, driver=drivers[0], status=RideRequest.Status.COMPLETED)
+
+    return {
+        "customer": customer,
+        "driver": drivers[0],
+        "admin": admin,
+        "ride": target,
+        "ride_request": target_request,
+    }
+
+
+class QueryBudgetTests(TestCase):
+    """Every routed view must declare a query budget and stay within it, on GET and on a valid POST."""
+
+    # the session store (a DB table here, a shared cache in production) and the
+    # savepoints this test's own transaction turns every atomic() into are not
+    # the view's queries
+    not_the_views = re.compile(r'"django_session"|^(RELEASE )?SAVEPOINT ')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_dataset()
+
+    def login_as(self, role):
+        user = {"customer": self.data["customer"], "driver": self.data["driver"].user, "admin": self.data["admin"]}[role]
+        session = self.client.session
+        session["user_id"] = user.id
+        session["user_role"] = user.role
+        session["user_name"] = user.name
+        session.save()
+
+    def url_values(self):
+        return {
+            "ride_id": self.data["ride"].id,
+            "pk": self.data["ride_request"].id,
+            "driver_id": self.data["driver"].id,
+            "profile_id": "missing",
+        }
+
+    def new_ride(self, status, request_status=None, **fields):
+        """A ride of the seeded customer with the seeded driver, and that driver's request for it."""
+        ride = Ride.objects.create(
+            customer=self.data["customer"], ride_mode=Ride.Mode.DRIVER_ONLY, status=status,
+            start_location="MG Road, Kochi", start_latitude=Decimal("9.97"), start_longitude=Decimal("76.28"),
+            end_location="Airport, Kochi", end_latitude=Decimal("10.15"), end_longitude=Decimal("76.39"), **fields,
+        )
+        ride_request = None
+        if request_status:
+            ride_request = RideRequest.objects.create(ride=ride, driver=self.data["driver"], status=request_status)
+        return ride, ride_request
+
+    def post_cases(self):
+        """
+        A valid POST for every view that handles one, by URL name. Each case
+        sets up what it needs (outside the measurement) and returns the URL
+        values and the POST data; a str is sent as a JSON body.
+        """
+        customer, driver, target = self.data["customer"], self.data["driver"], self.data["ride"]
+
+        def login():
+            User.objects.filter(pk=customer.pk).update(password=make_password("secret-pass"))
+            return {}, {"email": customer.email, "password": "secret-pass"}
+
+        def resolve_sos():
+            return {"pk": SOSAlert.objects.create(user=customer).pk}, {}
+
+        def select_driver():
+            ride, _ = self.new_ride(Ride.Status.REQUESTED)
+            return {"ride_id": ride.pk}, {"driver_id": driver.pk}
+
+        def trip_detail():
+            ride, _ = self.new_ride(Ride.Status.REQUESTED, RideRequest.Status.PENDING)
+            return {"ride_id": ride.pk}, {"action": "cancel_ride"}
+
+        def accept_ride_request():
+            _, ride_request = self.new_ride(Ride.Status.REQUESTED, RideRequest.Status.PENDING)
+            return {"pk": ride_request.pk}, {}
+
+        def set_ride_request_ongoing():
+            _, ride_request = self.new_ride(Ride.Status.ACCEPTED, RideRequest.Status.ACCEPTED, driver=driver)
+            return {"pk": ride_request.pk}, {}
+
+        def end_ride_request():
+            _, ride_request = self.new_ride(Ride.Status.ONGOING, RideRequest.Status.COMPLETED, driver=driver)
+            return {"pk": ride_request.pk}, {"additional_charges": "50", "return_trip": "false"}
+
+        def finalize_transaction():
+            payment = Payment.objects.create(customer=customer, ride=target, amount=Decimal("525.00"),
+                                             method=Payment.Method.UPI, status=Payment.Status.PENDING)
+            return {}, {"tx_id": payment.pk}
+
+        return {
+            "login": login,
+            "customer_register": lambda: ({}, {"name": "New", "email": "new@example.com", "phone": "900000099",
+                                               "password": "secret-pass"}),
+            "driver_register": lambda: ({}, {"name": "New", "email": "new@example.com", "phone": "900000099",
+                                             "password": "secret-pass", "license_number": "LIC99999"}),
+            "customer_profile_edit": lambda: ({}, {"name": "Cust Renamed", "email": customer.email, "phone": customer.phone}),
+            "driver_profile_edit": lambda: ({}, {"name": "Driver Renamed", "email": driver.user.email,
+                                                 "phone": driver.user.phone, "experience_years": "6"}),
+            "resolve_sos": resolve_sos,
+            "create_ride": lambda: ({}, {"ride_mode": Ride.Mode.DRIVER_ONLY, "start_location": "MG Road, Kochi",
+                                         "start_latitude": "9.97", "start_longitude": "76.28",
+                                         "end_location": "Airport, Kochi", "end_latitude": "10.15",
+                                         "end_longitude": "76.39", "notes": ""}),
+            "select_driver": select_driver,
+            "trip_detail": trip_detail,
+            "accept_ride_request": accept_ride_request,
+            "set_ride_request_ongoing": set_ride_request_ongoing,
+            "end_ride_request": end_ride_request,
+            "create_transaction": lambda: ({}, {"ride_id": target.pk, "method": "upi", "amount": "525.00"}),
+            "finalize_transaction": finalize_transaction,
+            "rate_ride": lambda: ({"ride_id": target.pk}, {"score": 4, "feedback": "Smooth ride"}),
+            "api_toggle_availability": lambda: ({}, '{"is_available": false}'),
+            "trigger_sos": lambda: ({}, {"latitude": "9.97", "longitude": "76.28"}),
+        }
+
+    def measure(self, pattern, data=None, url_values=None):
+        """Queries and DB time of a GET to the view, or of a POST when data is given."""
+        view = pattern.callback
+        roles = getattr(view, "allowed_roles", None)
+        self.client.logout()
+        if roles:
+            self.login_as(roles[0])
+        url = view_url(pattern, {**self.url_values(), **(url_values or {})})
+        with CaptureQueriesContext(connection) as ctx:
+            if data is None:
+                response = self.client.get(url)
+            elif isinstance(data, str):
+                response = self.client.post(url, data, content_type="application/json")
+            else:
+                response = self.client.post(url, data)
+        queries = [q for q in ctx.captured_queries if not self.not_the_views.search(q["sql"])]
+        db_ms = sum(float(q["time"]) for q in queries) * 1000
+        return len(queries), db_ms, response
+
+    def failed_post(self, response):
+        """Why a POST did not go through, or None: an error status, an "error" in JSON or an error message."""
+        if response.status_code >= 400:
+            return f"status {response.status_code}"
+        if response.get("Content-Type") == "application/json" and "error" in response.json():
+            return response.json()["error"]
+        errors = [str(m) for m in get_messages(response.wsgi_request) if m.level >= WARNING]
+        return "; ".join(errors) or None
+
+    def over_budget(self, pattern, label, count, db_ms):
+        budget = get_query_budget(pattern.callback)
+        over = []
+        if count > budget.max_queries:
+            over.append(f"{label} {pattern.pattern}: {count} queries (budget {budget.max_queries})")
+        if budget.max_db_ms is not None and db_ms > budget.max_db_ms:
+            over.append(f"{label} {pattern.pattern}: {db_ms:.1f}ms DB time (budget {budget.max_db_ms}ms)")
+        return over
+
+    def test_every_view_declares_a_budget(self):
+        missing = [str(p.pattern) for p in routed_views() if get_query_budget(p.callback) is None]
+        self.assertEqual(missing, [], "views without @query_budget")
+
+    def test_views_within_query_budget(self):
+        over = []
+        for pattern in routed_views():
+            if get_query_budget(pattern.callback) is None:
+                continue
+            count, db_ms, _ = self.measure(pattern)
+            over += self.over_budget(pattern, "GET", count, db_ms)
+        self.assertEqual(over, [], "views over their query budget")
+
+    @override_settings(PASSWORD_HASH_WORKERS=0, PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+    @mock.patch("accounts.views.calculate_distance_osrm", return_value=(18.4, 32, None))
+    def test_posts_within_query_budget(self, _osrm):
+        cases = self.post_cases()
+        patterns = {p.name: p for p in routed_views() if p.name in cases}
+        self.assertEqual(sorted(patterns), sorted(cases), "POST cases for views that are not routed")
+        over, failed = [], []
+        for name, setup in cases.items():
+            pattern = patterns[name]
+            with transaction.atomic():
+                url_values, data = setup()
+                count, db_ms, response = self.measure(pattern, data, url_values)
+                transaction.set_rollback(True)  # every case starts from the seeded data
+            reason = self.failed_post(response)
+            if reason:
+                failed.append(f"POST {pattern.pattern}: {reason}")
+            over += self.over_budget(pattern, "POST", count, db_ms)
+        self.assertEqual(failed, [], "POST cases that did not go through")
+        self.assertEqual(over, [], "views over their query budget")
+
+
+class ExplainViewsCommandTests(TestCase):
+    def test_hot_queries_use_indexes(self):
+        seed_dataset(n_drivers=5, n_rides=10)
+        out = StringIO()
+        call_command("explain_views", stdout=out)
+        report = out.getvalue()
+        for view in ("driver_dashboard", "driver_requests_list", "my_trips", "customer_payment_history"):
+            self.assertRegex(report, rf"\n{view}: ok ")
+
+    def test_full_scan_detection(self):
+        from accounts.management.commands.explain_views import full_scans
+
+        plan = [(2, 0, 0, "SCAN rides_ride"), (3, 0, 0, "SEARCH rides_riderequest USING INDEX x (driver_id=?)"),
+                (4, 0, 0, "SCAN CONSTANT ROW")]
+        self.assertEqual(full_scans("sqlite", plan), ["SCAN rides_ride"])
+        plan = [("Sort  (cost=1.0..2.0)",), ("  ->  Seq Scan on payments_payment  (cost=0.00..1.00)",)]
+        self.assertEqual(full_scans("postgresql", plan), ["Seq Scan on payments_payment"])
+
+
+class CurrentUserTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(name="Drv", email="drv@example.com", phone="910000000", role="driver")
+        cls.driver = Driver.objects.create(user=cls.user, license_number="LIC1", profile_pic="driver_profile/d.png")
+
+    def request(self, uid):
+        request = RequestFactory().get("/")
+        request.session = {"user_id": uid} if uid else {}
+        CurrentUserMiddleware(lambda r: None)(request)
+        return request
+
+    def test_driver_and_user_resolved_once(self):
+        request = self.request(self.user.id)
+        with self.assertNumQueries(1):
+            self.assertEqual(request.drivemate_driver.pk, self.driver.pk)
+            self.assertEqual(request.drivemate_driver.license_number, "LIC1")
+            self.assertEqual(request.drivemate_user.pk, self.user.pk)
+            self.assertIs(request.drivemate_driver.user, get_current_user(request))
+
+    def test_anonymous(self):
+        request = self.request(None)
+        with self.assertNumQueries(0):
+            self.assertFalse(request.drivemate_user)
+            self.assertFalse(request.drivemate_driver)
+
+    @override_settings(
+        CACHES={**settings.CACHES, "shared": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "shared"}},
+        SESSION_ENGINE="django.contrib.sessions.backends.cached_db", SESSION_CACHE_ALIAS="shared",
+    )
+    def test_session_served_from_shared_cache(self):
+        session = self.client.session
+        session["user_id"], session["user_role"] = self.user.id, "driver"
+        session.save()
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("driver_profile"))
+        self.assertFalse([q for q in ctx.captured_queries if "django_session" in q["sql"]])
+
+
+class PasswordHashingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create(name="Cust", email="cust@example.com", phone="900000000", role="customer",
+                            password=make_password("secret-pass"))
+
+    def tearDown(self):
+        hashing.shutdown()
+
+    @override_settings(PASSWORD_HASH_WORKERS=1)
+    def test_pool_round_trip(self):
+        encoded = hashing.hash_password("secret-pass")
+        self.assertTrue(hashing.verify_password("secret-pass", encoded))
+        self.assertFalse(hashing.verify_password("wrong", encoded))
+
+    @override_settings(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_MAX_PENDING=1)
+    def test_saturated_pool_returns_503(self):
+        _, slots = hashing._get_executor()
+        slots.acquire()  # one hash already in flight
+        try:
+            response = self.client.post(reverse("login"), {"email": "cust@example.com", "password": "secret-pass"})
+        finally:
+            slots.release()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "2")
+        self.assertNotIn("user_id", self.client.session)
+
+    @override_settings(PASSWORD_HASH_WORKERS=0)
+    def test_invalid_registrations_are_not_hashed(self):
+        with mock.patch("accounts.views.hash_password") as hash_password:
+            self.client.post(reverse("customer_register"), {"name": "X", "email": "", "password": "p"})
+            self.client.post(reverse("customer_register"), {"name": "X", "email": "cust@example.com",
+                                                            "phone": "1", "password": "p"})
+            self.client.post(reverse("driver_register"), {"name": "X", "email": "d@example.com", "phone": "1",
+                                                          "password": "p", "with_car": "on", "make": "Tata"})
+        hash_password.assert_not_called()
+        self.assertFalse(User.objects.filter(email="d@example.com").exists())
+
+
+class LoginRateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        ratelimit._local_buckets.clear()
+
+    def test_token_bucket_refills(self):
+        limiter = TokenBucketLimiter("test", capacity=2, per_second=0.5)
+        self.assertEqual(limiter.hit("k", now=100), 0)
+        self.assertEqual(limiter.hit("k", now=100), 0)
+        self.assertAlmostEqual(limiter.hit("k", now=100), 2.0)
+        self.assertEqual(limiter.hit("other", now=100), 0)
+        self.assertEqual(limiter.hit("k", now=102), 0)
+
+    def test_falls_back_to_local_buckets(self):
+        limiter = TokenBucketLimiter("test", capacity=1, per_second=0.1)
+        with mock.patch.object(metrics.InstrumentedLocMemCache, "get", side_effect=ConnectionError("cache down")):
+            self.assertEqual(limiter.hit("k", now=100), 0)
+            self.assertGreater(limiter.hit("k", now=100), 0)
+
+    def test_without_a_shared_cache_buckets_are_per_process(self):
+        self.assertIsNone(settings.LOGIN_RATELIMIT_CACHE)
+        limiter = TokenBucketLimiter("test", capacity=1, per_second=0.1, cache_alias=None)
+        with self.assertNumQueries(0):
+            self.assertEqual(limiter.hit("k", now=100), 0)
+            self.assertGreater(limiter.hit("k", now=100), 0)
+        self.assertIsNone(cache.get(limiter.cache_key("k")))
+
+    def test_refund_gives_tokens_back_up_to_a_full_bucket(self):
+        limiter = TokenBucketLimiter("test", capacity=2, per_second=0.01)
+        limiter.hit("k", now=100)
+        limiter.hit("k", now=100)
+        limiter.refund("k", now=100, tokens=5)
+        self.assertEqual(limiter.hit("k", now=100), 0)
+        self.assertEqual(limiter.hit("k", now=100), 0)
+        self.assertGreater(limiter.hit("k", now=100), 0)
+
+    @override_settings(LOGIN_RATELIMIT_IP=(3, 0.01), LOGIN_RATELIMIT_EMAIL=(2, 0.01), LOGIN_RATELIMIT_CACHE="default",
+                       PASSWORD_HASH_WORKERS=0, PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+    def test_successful_logins_are_not_counted(self):
+        User.objects.create(name="Cust", email="cust@example.com", phone="900000000", role="customer",
+                            password=make_password("secret-pass"))
+        self.client.post(reverse("login"), {"email": "cust@example.com", "password": "typo"})
+        for _ in range(5):
+            response = self.client.post(reverse("login"), {"email": "cust@example.com", "password": "secret-pass"})
+            self.assertEqual(response.status_code, 302)
+        for _ in range(2):
+            self.client.post(reverse("login"), {"email": "cust@example.com", "password": "typo"})
+        response = self.client.post(reverse("login"), {"email": "cust@example.com", "password": "secret-pass"})
+        self.assertEqual(response.status_code, 429)  # failures still do
+
+    # LocMem stands in for a shared Redis/Memcached here
+    @override_settings(LOGIN_RATELIMIT_IP=(100, 1), LOGIN_RATELIMIT_EMAIL=(2, 0.01), LOGIN_RATELIMIT_CACHE="default")
+    def test_login_rejected_without_db_or_hashing(self):
+        data = {"email": "victim@example.com", "password": "guess"}
+        for _ in range(2):
+            self.client.post(reverse("login"), data)
+        with self.assertNumQueries(0), mock.patch("accounts.views.verify_password") as verify:
+            response = self.client.post(reverse("login"), data)
+        verify.assert_not_called()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "100")
+
+    @override_settings(LOGIN_RATELIMIT_IP=(2, 0.01), LOGIN_RATELIMIT_EMAIL=(100, 1),
+                       LOGIN_RATELIMIT_PROXY_COUNT=1)
+    def test_ip_bucket_spans_emails(self):
+        for i in range(2):
+            self.client.post(reverse("login"), {"email": f"u{i}@example.com", "password": "x"},
+                             HTTP_X_FORWARDED_FOR="203.0.113.7")
+        response = self.client.post(reverse("login"), {"email": "u9@example.com", "password": "x"},
+                                    HTTP_X_FORWARDED_FOR="203.0.113.7")
+        self.assertEqual(response.status_code, 429)
+        response = self.client.post(reverse("login"), {"email": "u9@example.com", "password": "x"},
+                                    HTTP_X_FORWARDED_FOR="198.51.100.1")
+        self.assertNotEqual(response.status_code, 429)
+
+
+class LazyUrlconfTests(SimpleTestCase):
+    def test_loading_urlconf_imports_no_views(self):
+        script = (
+            "import sys, django; django.setup();"
+            "from django.urls import get_resolver, reverse; get_resolver().url_patterns; reverse('my_trips');"
+            "print(sorted(m for m in ('accounts.views', 'rides.views', 'payments.views', 'requests')"
+            " if m in sys.modules))"
+        )
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE="DriveMate.settings")
+        out = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, env=env,
+                             cwd=settings.BASE_DIR, check=True).stdout
+        self.assertEqual(out.strip(), "[]")
+
+    def test_lazy_view_exposes_view_attributes(self):
+        view = LazyView("rides.views.my_trips")
+        self.assertEqual((view.__module__, view.__name__), ("rides.views", "my_trips"))
+        self.assertEqual(view.allowed_roles, ["customer"])
+        self.assertIsNotNone(get_query_budget(view))
+
+
+class WarmUpTests(SimpleTestCase):
+    def test_warm_up_loads_views_and_templates(self):
+        stats = warm_up()
+        lazy = [p.callback for p in routed_views() if isinstance(p.callback, LazyView)]
+        self.assertEqual(stats["views"], len(lazy))
+        self.assertTrue(all(view._view is not None for view in lazy))
+        self.assertGreater(stats["templates"], 10)
+
+
+def png_upload(name, size=(1600, 900)):
+    from PIL import Image
+    buf = BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(buf, "PNG")
+    return SimpleUploadedFile(name, buf.getvalue(), content_type="image/png")
+
+
+class ImageRenditionTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        overrides = override_settings(MEDIA_ROOT=media.name, JOBS_EAGER=True, IMAGE_WORKERS=0,
+                                      IMAGE_RENDITION_WIDTHS=(320, 640, 3000), IMAGE_RENDITION_FORMATS=("webp",))
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        owner = User.objects.create(name="Owner", email="owner@example.com", phone="900000000", role="driver")
+        self.vehicle = Vehicle.objects.create(owner=owner, vehicle_type="sedan", make="Maruti", model="Dzire",
+                                              year=2022, registration_number="KL07AB1234")
+
+    def upload(self, name="car.png", size=(1600, 900)):
+        with self.captureOnCommitCallbacks(execute=True):
+            image = VehicleImage.objects.create(vehicle=self.vehicle, image=png_upload(name, size))
+        image.refresh_from_db()
+        return image
+
+    def test_upload_is_rendered_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            image = VehicleImage.objects.create(vehicle=self.vehicle, image=png_upload("car.png"))
+        self.assertEqual(VehicleImage.objects.get(pk=image.pk).renditions, {})
+        for callback in callbacks:
+            callback()
+        meta = VehicleImage.objects.get(pk=image.pk).renditions
+        self.assertEqual((meta["source"], meta["width"], meta["height"]), (image.image.name, 1600, 900))
+        # no upscaling past the original width
+        self.assertEqual([w for w, _ in meta["sources"]["webp"]], [320, 640])
+        storage = image.image.storage
+        stem = Path(image.image.name).stem
+        for width, name in meta["sources"]["webp"]:
+            self.assertEqual(Path(name).name, f"{stem}-{width}w.webp")
+            self.assertLess(storage.size(name), storage.size(image.image.name))
+
+    def test_picture_tag_emits_srcset_and_falls_back_to_original(self):
+        image = self.upload()
+        html = Template('{% load responsive_images %}{% picture img.image img.renditions sizes="50vw" class="w-full" %}'
+                        ).render(Context({"img": image}))
+        (_, small), (_, large) = image.renditions["sources"]["webp"]
+        self.assertIn(f'<source type="image/webp" srcset="/media/{small} 320w, /media/{large} 640w" sizes="50vw">', html)
+        self.assertIn(f'<img src="{image.image.url}" class="w-full">', html)
+
+        image.image = png_upload("new.png", size=(800, 600))
+        image.save()  # renditions still describe car.png until the worker catches up
+        html = Template("{% load responsive_images %}{% picture img.image img.renditions %}").render(
+            Context({"img": image}))
+        self.assertEqual(html, f'<img src="{image.image.url}">')
+
+    def test_replacing_the_image_removes_old_renditions(self):
+        image = self.upload()
+        old = [name for _, name in image.renditions["sources"]["webp"]]
+        with self.captureOnCommitCallbacks(execute=True):
+            image.image = png_upload("other.png", size=(500, 300))
+            image.save()
+        image.refresh_from_db()
+        self.assertEqual([w for w, _ in image.renditions["sources"]["webp"]], [320])
+        self.assertFalse(any(image.image.storage.exists(name) for name in old))
+
+    def test_unreadable_profile_pic_is_skipped(self):
+        user = User.objects.create(name="D", email="d@example.com", phone="900000001", role="driver")
+        with self.assertLogs("DriveMate.images", "WARNING"), self.captureOnCommitCallbacks(execute=True):
+            driver = Driver.objects.create(user=user, license_number="LIC1", profile_pic=SimpleUploadedFile(
+                "pic.png", b"not an image", content_type="image/png"))
+        driver.refresh_from_db()
+        self.assertEqual(driver.profile_pic_renditions, {"source": driver.profile_pic.name, "error": "UnidentifiedImageError"})
+        with self.captureOnCommitCallbacks(execute=True):
+            driver.save()  # a failure is recorded, not retried on every save
+        self.assertEqual(Job.objects.filter(task__endswith="render_instance").count(), 1)
+
+    def test_saves_queue_one_render_per_file(self):
+        overrides = override_settings(JOBS_EAGER=False)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        image = VehicleImage.objects.create(vehicle=self.vehicle, image=png_upload("car.png"))
+        image.save()
+        image.save(update_fields=["vehicle"])
+        self.assertEqual(list(Job.objects.values_list("key", flat=True)),
+                         [f"render:vehicles.VehicleImage:{image.pk}:{image.image.name}"])
+
+    def test_backfill_command_renders_missing_renditions(self):
+        image = VehicleImage.objects.create(vehicle=self.vehicle, image=png_upload("old.png"))
+        out = StringIO()
+        call_command("generate_renditions", stdout=out)
+        image.refresh_from_db()
+        self.assertEqual(image.renditions["source"], image.image.name)
+        self.assertIn("vehicles.VehicleImage: rendered 1 of 1", out.getvalue())
+
+
+@override_settings(PASSWORD_HASH_WORKERS=0, JOBS_EAGER=True, IMAGE_RENDITION_FORMATS=("webp",),
+                   UPLOAD_MAX_FILE_SIZE=64 * 1024, UPLOAD_MAX_REQUEST_SIZE=1024 * 1024)
+class StagedUploadTests(TransactionTestCase):
+    def setUp(self):
+        for name in ("MEDIA_ROOT", "UPLOAD_STAGING_DIR"):
+            directory = tempfile.TemporaryDirectory()
+            self.addCleanup(directory.cleanup)
+            overrides = override_settings(**{name: directory.name})
+            overrides.enable()
+            self.addCleanup(overrides.disable)
+
+    def register(self, **files):
+        data = {"name": "New Driver", "email": "new@example.com", "phone": "1", "password": "p",
+                "license_number": "LIC9", "with_car": "on", "vehicle_type": "sedan", "make": "Tata",
+                "model": "Nexon", "year": "2023", "registration_number": "kl07xy0001", "primary_image_index": "1"}
+        return self.client.post(reverse("driver_register"), {**data, **files})
+
+    def test_files_are_attached_after_commit(self):
+        from accounts import views
+        attach = views._attach_registration_files
+
+        def attach_after_commit(driver, *args):
+            # the rows are committed and no transaction is open while files move
+            self.assertFalse(connection.in_atomic_block)
+            self.assertFalse(Driver.objects.get(pk=driver.pk).profile_pic)
+            attach(driver, *args)
+
+        with mock.patch("accounts.views._attach_registration_files", side_effect=attach_after_commit) as spy:
+            self.register(profile_pic=png_upload("me.png", (200, 200)), id_proof=SimpleUploadedFile(
+                "id.pdf", b"%PDF-1.4", content_type="application/pdf"),
+                vehicle_images=[png_upload("a.png", (400, 200)), png_upload("b.png", (400, 200))])
+        spy.assert_called_once()
+        driver = Driver.objects.get(user__email="new@example.com")
+        self.assertTrue(driver.profile_pic.name.startswith("driver_profile/"))
+        self.assertTrue(driver.id_proof.storage.exists(driver.id_proof.name))
+        images = list(VehicleImage.objects.order_by("id"))
+        self.assertEqual([img.is_primary for img in images], [False, True])
+        self.assertEqual(images[1].renditions["source"], images[1].image.name)
+        self.assertEqual(os.listdir(settings.UPLOAD_STAGING_DIR), [])
+
+    def test_oversize_file_is_rejected_while_streaming(self):
+        big = SimpleUploadedFile("huge.png", b"x" * (65 * 1024), content_type="image/png")
+        with mock.patch("accounts.views.hash_password") as hash_password:
+            response = self.register(profile_pic=big)
+        hash_password.assert_not_called()
+        self.assertRedirects(response, reverse("driver_register"), fetch_redirect_response=False)
+        self.assertEqual([str(m) for m in get_messages(response.wsgi_request)],
+                         ["huge.png is too large (the limit is 64.0\xa0KB)."])
+        self.assertEqual(response.wsgi_request.rejected_uploads, [("profile_pic", "huge.png", 64 * 1024)])
+        self.assertFalse(User.objects.filter(email="new@example.com").exists())
+        self.assertEqual(os.listdir(settings.UPLOAD_STAGING_DIR), [])
+
+    def test_registration_still_checks_csrf(self):
+        client = self.client_class(enforce_csrf_checks=True)
+        response = client.post(reverse("driver_register"), {"name": "X"})
+        self.assertEqual(response.status_code, 403)
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        overrides = override_settings(MEDIA_ROOT=media.name, JOBS_EAGER=True, IMAGE_RENDITION_FORMATS=("webp",))
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        owner = User.objects.create(name="Owner", email="owner@example.com", phone="900000000", role="driver")
+        self.vehicle = Vehicle.objects.create(owner=owner, vehicle_type="sedan", make="Maruti", model="Dzire",
+                                              year=2022, registration_number="KL07AB1234")
+
+    def upload(self, name, size=(400, 300)):
+        with self.captureOnCommitCallbacks(execute=True):
+            return VehicleImage.objects.create(vehicle=self.vehicle, image=png_upload(name, size))
+
+    def test_identical_uploads_share_one_counted_blob(self):
+        first, second = self.upload("a.png"), self.upload("copy of a.PNG")
+        self.assertEqual(first.image.name, second.image.name)
+        digest = hashlib.sha256(Path(first.image.path).read_bytes()).hexdigest()
+        self.assertEqual(first.image.name, f"vehicle_images/{digest[:2]}/{digest}.png")
+        self.assertEqual(MediaBlob.objects.get(name=first.image.name).refcount, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(second.image.storage.exists(second.image.name))
+
+        renditions = rendition_names(VehicleImage.objects.get(pk=second.pk).renditions)
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(MediaBlob.objects.exists())
+        self.assertFalse(any(media_storage.exists(name) for name in {second.image.name, *renditions}))
+
+    def test_replacing_a_file_releases_the_old_blob(self):
+        user = User.objects.create(name="D", email="d@example.com", phone="900000001", role="driver")
+        driver = Driver.objects.create(user=user, license_number="LIC1",
+                                       id_proof=SimpleUploadedFile("id.pdf", b"%PDF-1 one"))
+        old = driver.id_proof.name
+        driver = Driver.objects.get(pk=driver.pk)
+        driver.is_available = False
+        driver.save()  # unrelated save: no reference change
+        self.assertEqual(MediaBlob.objects.get(name=old).refcount, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            driver.id_proof = SimpleUploadedFile("id.pdf", b"%PDF-1 two")
+            driver.save()
+        self.assertFalse(media_storage.exists(old))
+        self.assertEqual(list(MediaBlob.objects.values_list("name", "refcount")), [(driver.id_proof.name, 1)])
+
+    def test_blobs_are_served_immutable(self):
+        image = self.upload("a.png")
+        request = RequestFactory().get(f"/media/{image.image.name}")
+        response = serve_media(request, image.image.name)
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+        self.assertEqual(response["ETag"], f'"{Path(image.image.name).name}"')
+
+        request = RequestFactory().get("/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(serve_media(request, image.image.name).status_code, 304)
+
+        Path(settings.MEDIA_ROOT, "legacy.png").write_bytes(b"x")
+        response = serve_media(RequestFactory().get("/media/legacy.png"), "legacy.png")
+        self.assertNotIn("Cache-Control", response)
+
+    def test_id_proofs_are_never_cached(self):
+        user = User.objects.create(name="D", email="d@example.com", phone="900000001", role="driver")
+        with self.captureOnCommitCallbacks(execute=True):
+            driver = Driver.objects.create(user=user, license_number="LIC1",
+                                           id_proof=SimpleUploadedFile("id.pdf", b"%PDF-1 licence"))
+        name = driver.id_proof.name
+        request = RequestFactory().get(f"/media/{name}", HTTP_IF_NONE_MATCH=f'"{Path(name).name}"')
+        response = serve_media(request, name)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Cache-Control"], "private, no-store")
+        self.assertNotIn("ETag", response)
+
+    def test_dedupe_media_moves_legacy_files(self):
+        Path(settings.MEDIA_ROOT, "vehicle_images").mkdir()
+        for name in ("m4_1.png", "m4_1_AbCdEf1.png", "orphan.png"):
+            Path(settings.MEDIA_ROOT, "vehicle_images", name).write_bytes(b"same bytes")
+        VehicleImage.objects.bulk_create([VehicleImage(vehicle=self.vehicle, image="vehicle_images/m4_1.png"),
+                                          VehicleImage(vehicle=self.vehicle, image="vehicle_images/m4_1_AbCdEf1.png")])
+        out = StringIO()
+        call_command("dedupe_media", "--delete-orphans", stdout=out)
+
+        names = set(VehicleImage.objects.values_list("image", flat=True))
+        self.assertEqual(len(names), 1)
+        blob = names.pop()
+        self.assertEqual(MediaBlob.objects.get().refcount, 2)
+        self.assertEqual(sorted(p.name for p in Path(settings.MEDIA_ROOT).rglob("*") if p.is_file()),
+                         [Path(blob).name])
+        self.assertIn("moved 2 files into 1 blobs", out.getvalue())
+        self.assertIn("deleted 1 unreferenced files", out.getvalue())
+
+
+recorded_jobs = []
+
+
+@jobs.job()
+def record_job(value):
+    recorded_jobs.append(value)
+
+
+@jobs.job(max_attempts=2, backoff=(60, 60))
+def failing_job():
+    raise RuntimeError("boom")
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        recorded_jobs.clear()
+
+    def test_enqueue_is_transactional_and_idempotent(self):
+        with transaction.atomic():
+            jobs.enqueue(record_job, value="rolled back")
+            transaction.set_rollback(True)
+        first = jobs.enqueue(record_job, key="once", value=1)
+        again = jobs.enqueue(record_job, key="once", value=2)
+        self.assertEqual((first.pk, Job.objects.count()), (again.pk, 1))
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(recorded_jobs, [1])
+        self.assertEqual(Job.objects.get().status, Job.Status.DONE)
+
+    def test_failing_job_is_retried_with_backoff_then_failed(self):
+        job = jobs.enqueue(failing_job)
+        with self.assertLogs("DriveMate.jobs", "WARNING"):
+            jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.QUEUED, 1))
+        self.assertIn("RuntimeError: boom", job.last_error)
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=25))
+        self.assertEqual(jobs.run_pending(), 0)  # not due yet
+
+        Job.objects.update(run_at=timezone.now())
+        with self.assertLogs("DriveMate.jobs", "ERROR"):
+            jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.FAILED, 2))
+
+    def test_claims_respect_the_limit_and_never_overlap(self):
+        for i in range(3):
+            jobs.enqueue(record_job, value=i)
+        first = jobs.claim("default", 2, "worker-1")
+        second = jobs.claim("default", 2, "worker-2")
+        self.assertEqual((len(first), len(second)), (2, 1))
+        self.assertFalse(set(first) & set(second))
+        self.assertFalse(jobs.run_job(first[0], "worker-2"))  # held by worker-1
+        self.assertTrue(jobs.run_job(first[0], "worker-1"))
+
+        # a worker that died: its job goes back to the queue after JOB_LOCK_TIMEOUT
+        Job.objects.filter(pk=second[0]).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(sorted(recorded_jobs), [0, 2])
+
+    @override_settings(JOB_SCHEDULE={"accounts.tests.record_job": 30})
+    def test_scheduled_jobs_are_queued_once_per_interval(self):
+        seen = {}
+        self.assertEqual(len(jobs.enqueue_scheduled(seen, now=90)), 1)
+        self.assertEqual(jobs.enqueue_scheduled(seen, now=100), [])
+        jobs.enqueue_scheduled({}, now=100)  # another worker, same interval
+        jobs.enqueue_scheduled(seen, now=120)
+        self.assertEqual(Job.objects.filter(task="accounts.tests.record_job").count(), 2)
+
+
+class PubSubTests(SimpleTestCase):
+    def test_broker_fans_out_between_processes(self):
+        path = os.path.join(tempfile.mkdtemp(), "pubsub.sock")
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+
+        async def scenario():
+            broker = asyncio.ensure_future(pubsub.serve_broker(path))
+            while not os.path.exists(path):
+                await asyncio.sleep(0.01)
+            here, there = pubsub.Hub(), pubsub.Hub()  # two processes' hubs
+            links = [pubsub.BrokerLink(here, path), pubsub.BrokerLink(there, path)]
+            try:
+                for link in links:
+                    await sync_to_async(link.wait_connected, thread_sensitive=False)(2)
+                inbox = there.subscribe("driver:1")
+                self.assertTrue(links[0].send("driver:1", {"type": "request.new", "id": 5}))
+                self.assertEqual(await asyncio.wait_for(inbox.get(), 2), {"type": "request.new", "id": 5})
+            finally:
+                for link in links:
+                    link.close()
+                await asyncio.sleep(0.05)  # the broker sees them leave
+                broker.cancel()
+                await asyncio.gather(broker, return_exceptions=True)
+
+        async_to_sync(scenario)()
+
+    def test_waiting_for_the_broker_does_not_block_the_event_loop(self):
+        missing = os.path.join(tempfile.mkdtemp(), "pubsub.sock")
+        self.addCleanup(shutil.rmtree, os.path.dirname(missing))
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        async def scenario():
+            running = asyncio.ensure_future(ticker())
+            async with pubsub.subscribe("driver:1") as inbox:
+                self.assertFalse(inbox.link.connected)
+            running.cancel()
+            inbox.link.close()
+
+        with override_settings(PUBSUB_BROKER_SOCKET=missing), mock.patch.object(pubsub, "_link", None), \
+                mock.patch.object(pubsub.BrokerLink, "CONNECT_TIMEOUT", 0.5), self.assertLogs("DriveMate.pubsub", "WARNING"):
+            async_to_sync(scenario)()
+        self.assertGreater(ticks, 10)  # the loop kept running through the half-second wait
+
+    def test_broker_that_stops_reading_costs_a_publisher_one_send_timeout(self):
+        path = os.path.join(tempfile.mkdtemp(), "pubsub.sock")
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        server.listen()
+        self.addCleanup(server.close)
+
+        with mock.patch.object(pubsub.BrokerLink, "SEND_TIMEOUT", 0.2):
+            link = pubsub.BrokerLink(pubsub.Hub(), path)
+            self.addCleanup(link.close)
+            self.assertTrue(link.wait_connected(2))
+            stuck, _ = server.accept()  # and never reads
+            self.addCleanup(stuck.close)
+            started = time.monotonic()
+            for _ in range(1000):
+                if not link.send("driver:1", {"pad": "x" * 65536}):
+                    break
+            self.assertLess(time.monotonic() - started, 2)
+            self.assertFalse(link.connected)  # publish() falls back to in-process delivery
+
+    def test_slow_subscriber_drops_instead_of_blocking(self):
+        metrics.reset()
+
+        async def scenario():
+            hub = pubsub.Hub()
+            inbox = hub.subscribe("driver:1", maxsize=2)
+            await asyncio.get_running_loop().run_in_executor(
+                None, lambda: [hub.deliver("driver:1", {"n": n}) for n in range(3)])
+            await asyncio.sleep(0.01)
+            self.assertEqual([await inbox.get(), await inbox.get()], [{"n": 0}, {"n": 1}])
+            inbox.close()
+            self.assertEqual(hub.deliver("driver:1", {"n": 3}), 0)
+
+        async_to_sync(scenario)()
+        counters, _ = metrics.snapshot()
+        self.assertEqual(counters[("drivemate_pubsub_dropped_total", ())], 1)
+
+
+class AssetTests(SimpleTestCase):
+    def test_pages_link_the_compiled_stylesheet(self):
+        response = self.client.get(reverse("login"))
+        self.assertContains(response, 'href="/static/css/drivemate.css"')
+        for path in template_files():
+            self.assertNotIn("tailwind.js", path.read_text(), path)
+            self.assertNotIn("text/tailwindcss", path.read_text(), path)
+
+    def test_class_candidates(self):
+        found = class_candidates(
+            """<div class="md:flex px-4 {% if x %}bg-[#0a4a8c]{% endif %}"></div>"""
+            """<script>el.classList.add('hidden'); el.className = "hover:text-white/70";</script>"""
+        )
+        self.assertTrue({"md:flex", "px-4", "bg-[#0a4a8c]", "hidden", "hover:text-white/70"} <= found)
+
+    def test_minify_css_keeps_strings_and_empty_properties(self):
+        css = '/* x */\n.a > .b :is(.c) {\n  --tw-pan-x:  ;\n  content: "a ,  b";\n  margin: 0 ;\n}\n'
+        self.assertEqual(minify_css(css), '.a>.b :is(.c){--tw-pan-x: ;content:"a ,  b";margin:0}')
+
+    @skipUnless(shutil.which("node"), "building the CSS needs Node.js")
+    def test_stylesheet_is_up_to_date(self):
+        call_command("build_css", "--check", stdout=StringIO())
+
+
+class SeedScaleCommandTests(TestCase):
+    def test_seed_is_reproducible(self):
+        out = StringIO()
+        call_command("seed_scale", customers=20, drivers=10, rides=50, batch_size=16, seed=7, stdout=out)
+        first = list(Ride.objects.order_by("id").values_list("status", "start_latitude", "customer__email"))
+        self.assertEqual(len(first), 50)
+        self.assertTrue(RideRequest.objects.exists())
+        self.assertEqual(
+            Payment.objects.count(), Ride.objects.filter(status=Ride.Status.COMPLETED).count()
+        )
+
+        call_command("seed_scale", customers=20, drivers=10, rides=50, batch_size=16, seed=7, clear=True, stdout=out)
+        second = list(Ride.objects.order_by("id").values_list("status", "start_latitude", "customer__email"))
+        self.assertEqual(first, second)
+
+
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        override = override_settings(PROFILING_DIR=self.dir, PROFILING_MAX_PROFILES=2)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_unsigned_requests_are_not_profiled(self):
+        self.client.get("/terms/")
+        self.client.get("/terms/", HTTP_X_DRIVEMATE_PROFILE="forged")
+        self.assertEqual(list(self.dir.glob("*")), [])
+
+    def test_signed_header_captures_profile_with_retention(self):
+        token = make_profile_token()
+        for _ in range(3):
+            self.client.get("/terms/", HTTP_X_DRIVEMATE_PROFILE=token)
+        profiles = list_profiles()
+        self.assertEqual(len(profiles), 2)
+        data = load_profile(profiles[0]["id"])
+        self.assertEqual(data["path"], "/terms/")
+        self.assertEqual(data["templates"][0]["name"], "terms.html")
+        self.assertTrue((self.dir / data["raw_file"]).exists())
+
+    def test_profiles_page_is_admin_only(self):
+        admin = User.objects.create(name="Admin", email="a@example.com", phone="1", role="admin")
+        self.client.get("/terms/", HTTP_X_DRIVEMATE_PROFILE=make_profile_token())
+        self.assertEqual(self.client.get("/dashboard/admin/profiles/").status_code, 302)
+        session = self.client.session
+        session["user_id"], session["user_role"] = admin.id, "admin"
+        session.save()
+        response = self.client.get("/dashboard/admin/profiles/")
+        self.assertContains(response, "/terms/")
+        detail = self.client.get(f"/dashboard/admin/profiles/{list_profiles()[0]['id']}/")
+        self.assertContains(detail, "terms.html")
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+
+    def test_server_timing_header(self):
+        response = self.client.get("/terms/")
+        self.assertIn("db;dur=", response["Server-Timing"])
+        self.assertIn("total;dur=", response["Server-Timing"])
+
+    def test_metrics_endpoint_requires_admin_or_token(self):
+        self.client.get("/terms/")
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        with override_settings(METRICS_TOKEN="s3cret"):
+            response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('drivemate_view_latency_seconds_count{view="terms"} 1', response.content.decode())
+
+    def test_cache_hit_ratio(self):
+        cache.set("k", 1)
+        cache.get("k")
+        cache.get("missing")
+        self.assertIn('drivemate_cache_hit_ratio{cache="default"} 0.5000', metrics.render_prometheus())
+
+    def test_other_processes_show_up_once(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        worker = (
+            "import django; django.setup()\n"
+            "from DriveMate import metrics\n"
+            "metrics.inc('drivemate_jobs_total', (('queue', 'default'), ('outcome', 'done')), 3)\n"
+            "metrics.flush()\n"
+        )
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": "DriveMate.settings", "METRICS_DIR": directory}
+        subprocess.run([sys.executable, "-c", worker], check=True, env=env, cwd=settings.BASE_DIR)
+        metrics.inc("drivemate_jobs_total", (("queue", "default"), ("outcome", "done")))
+
+        with override_settings(METRICS_DIR=directory):
+            for _ in range(2):  # the exited process is folded into the archive, not counted twice
+                self.assertIn('drivemate_jobs_total{queue="default",outcome="done"} 4', metrics.render_prometheus())
+        self.assertEqual(sorted(os.listdir(directory)), [".lock", "archive.json"])
+
+
+class SqlitePragmaTests(SimpleTestCase):
+    @override_settings(SQLITE_WAL=False)
+    def test_management_commands_leave_the_journal_mode_alone(self):
+        self.assertNotIn("journal_mode", get_pragmas())
+
+    @override_settings(SQLITE_WAL=True)
+    def test_server_switches_to_wal_first(self):
+        self.assertEqual(list(get_pragmas())[:2], ["journal_mode", "synchronous"])
+        self.assertEqual(get_pragmas()["busy_timeout"], settings.SQLITE_PRAGMAS["busy_timeout"])
+
+
+class DatabaseConfigTests(SimpleTestCase):
+    def test_sqlite_without_database_url(self):
+        config = database_config({}, sqlite_path="/tmp/x.sqlite3")
+        self.assertEqual(config["ENGINE"], "django.db.backends.sqlite3")
+        self.assertEqual(config["CONN_MAX_AGE"], 0)
+        self.assertEqual(database_config({"DATABASE_URL": "sqlite:////tmp/x.sqlite3"}, sqlite_path=None)["CONN_MAX_AGE"], 0)
+        self.assertEqual(database_config({"DB_CONN_MAX_AGE": "60"}, sqlite_path="/tmp/x.sqlite3")["CONN_MAX_AGE"], 60)
+
+    def test_postgres_persistent_connections_and_statement_timeout(self):
+        config = database_config({
+            "DATABASE_URL": "postgres://dm:pw@127.0.0.1:5432/drivemate",
+            "DB_STATEMENT_TIMEOUT_MS": "2500",
+        }, sqlite_path="unused")
+        self.assertEqual(config["ENGINE"], "django.db.backends.postgresql")
+        self.assertEqual(config["CONN_MAX_AGE"], 600)
+        self.assertTrue(config["CONN_HEALTH_CHECKS"])
+        self.assertEqual(config["OPTIONS"]["options"], "-c statement_timeout=2500")
+
+    def test_native_pool_disables_persistent_connections(self):
+        config = database_config({
+            "DATABASE_URL": "postgres://dm:pw@127.0.0.1:5432/drivemate",
+            "DB_POOL": "native", "DB_POOL_MAX_SIZE": "20",
+        }, sqlite_path="unused")
+        self.assertEqual(config["OPTIONS"]["pool"]["max_size"], 20)
+        self.assertEqual(config["CONN_MAX_AGE"], 0)
+
+    def test_pgbouncer_disables_server_side_cursors(self):
+        config = database_config({
+            "DATABASE_URL": "postgres://dm:pw@127.0.0.1:6432/drivemate", "DB_POOL": "pgbouncer",
+        }, sqlite_path="unused")
+        self.assertTrue(config["DISABLE_SERVER_SIDE_CURSORS"])
+
+
+@override_settings(DATABASE_REPLICA_ALIAS="replica", REPLICA_STICKY_SECONDS=5)
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def routed_read(self, request, model=Ride):
+        view = use_replica(lambda request: self.router.db_for_read(model))
+        return view(request)
+
+    def request(self, method="get", session=None):
+        request = getattr(self.factory, method)("/my-trips/")
+        request.session = session or {}
+        return request
+
+    def test_safe_requests_read_from_replica(self):
+        self.assertEqual(self.routed_read(self.request()), "replica")
+        self.assertEqual(self.router.db_for_read(Ride), "default")
+        self.assertEqual(self.router.db_for_write(Ride), "default")
+
+    def test_posts_and_contrib_models_use_primary(self):
+        from django.contrib.sessions.models import Session
+        self.assertEqual(self.routed_read(self.request("post")), "default")
+        self.assertEqual(self.routed_read(self.request(), model=Session), "default")
+
+    def test_reads_stick_to_primary_after_own_write(self):
+        recent = self.request(session={LAST_WRITE_SESSION_KEY: time.time()})
+        self.assertEqual(self.routed_read(recent), "default")
+        stale = self.request(session={LAST_WRITE_SESSION_KEY: time.time() - 60})
+        self.assertEqual(self.routed_read(stale), "replica")
+
+    @override_settings(DATABASE_REPLICA_ALIAS=None)
+    def test_no_replica_configured(self):
+        self.assertEqual(self.routed_read(self.request()), "default")
@@ -1,26 +1,52 @@
 from datetime import datetime
 import json
-from django.http import HttpResponseForbidden, JsonResponse,HttpResponseBadRequest
+import math
+import time
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse,HttpResponseBadRequest, Http404, FileResponse
 from django.shortcuts import render, redirect
+from django.template.defaultfilters import filesizeformat
 from django.contrib import messages
+from django.conf import settings
 from django.utils import timezone
 from decimal import Decimal
 from django.views.decorators.http import require_GET,require_POST
-import requests
 from django.views.decorators.http import require_http_methods
-from rides.models import Ride, RideRequest
+from rides.models import Ride, RideRequest, SOSAlert
+from rides.tasks import store_fare
 from .models import User, Driver as DriverModel
+from .decorators import login_required_role
+from .middleware import current_driver_or_404, current_user_or_404
 from vehicles.models import Vehicle, VehicleImage
 from django.db import IntegrityError, transaction
 from django.core.files.storage import FileSystemStorage
-from django.contrib.auth.hashers import check_password,make_password
 from rides.utils import haversine_distance
 from django.db.models import Q
 from django.db.models import Avg, Count, Prefetch
-
+from DriveMate import metrics
+from DriveMate.jobs import enqueue
+from DriveMate.hashing import HashingSaturated, hash_password, verify_password
+from DriveMate.ratelimit import check_login_rate, login_succeeded
+from DriveMate.perf import query_budget
+from DriveMate.routers import use_replica
+from DriveMate.uploads import staged_uploads
+from django.utils.crypto import constant_time_compare
+from DriveMate.profiling import list_profiles, load_profile, raw_profile_path
+
+@query_budget(0)
 def health_check(request):
     return JsonResponse({"status": "ok"})
 
+@query_budget(1)
+def metrics_view(request):
+    """Prometheus text exposition of DriveMate.metrics (admins or METRICS_TOKEN bearer)."""
+    token = settings.METRICS_TOKEN
+    auth = request.META.get("HTTP_AUTHORIZATION", "")
+    if not (token and constant_time_compare(auth, f"Bearer {token}")):
+        if not request.session.get("user_id") or request.session.get("user_role") != "admin":
+            return HttpResponseForbidden("Forbidden")
+    return HttpResponse(metrics.render_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+@query_budget(1)
 def index(request):
     uid = request.session.get("user_id")
     role = request.session.get("user_role")
@@ -38,27 +64,23 @@ def index(request):
 
     return render(request, "index.html")
 
+@query_budget(0)
 def terms(request):
     return render(request, "terms.html")
 
+@query_budget(0)
 def model(request):
     return render(request, "model.html")
 
-def login_required_role(allowed_roles=None):
-    def decorator(view_func):
-        def _wrapped(request, *args, **kwargs):
-            uid = request.session.get('user_id')
-            role = request.session.get('user_role')
-            if not uid:
-                return redirect('login')
-            if allowed_roles and role not in allowed_roles:
-                messages.error(request, "You don't have permission to view that page.")
-                return redirect('login')
-            return view_func(request, *args, **kwargs)
-        return _wrapped
-    return decorator
+def password_hashing_busy(request, template, context=None):
+    """503 for when the password hashing pool is saturated (DriveMate/hashing.py)."""
+    messages.error(request, "We're handling a lot of sign-ins right now. Please try again in a moment.")
+    response = render(request, template, context or {}, status=503)
+    response["Retry-After"] = "2"
+    return response
 
 
+@query_budget(1)
 def login_view(request):
     """
     Manual login view:
@@ -71,20 +93,35 @@ def login_view(request):
 
         if not email or not password:
             messages.error(request, "Please provide both email and password.")
-            return render(request, "accounts/login.html", {"email": email})
+            return render(request, "login.html", {"email": email})
+
+        # throttle before touching the database or the hasher
+        retry_after = check_login_rate(request, email)
+        if retry_after:
+            response = HttpResponse("Too many login attempts. Please try again later.", status=429,
+                                    content_type="text/plain")
+            response["Retry-After"] = str(math.ceil(retry_after))
+            return response
 
         try:
             user = User.objects.get(email=email)
         except User.DoesNotExist:
             messages.error(request, "Invalid email or password.")
-            return render(request, "accounts/login.html", {"email": email})
+            return render(request, "login.html", {"email": email})
 
         if not user.is_active:
             messages.error(request, "This account is inactive. Contact support.")
-            return render(request, "accounts/login.html", {"email": email})
+            return render(request, "login.html", {"email": email})
+
+        # check password using Django's hashers (user.password should be a hashed string),
+        # in the hashing pool so a login burst cannot pin every request worker
+        try:
+            password_ok = verify_password(password, user.password)
+        except HashingSaturated:
+            return password_hashing_busy(request, "login.html", {"email": email})
 
-        # check password using Django's hashers (user.password should be a hashed string)
-        if check_password(password, user.password):
+        if password_ok:
+            login_succeeded(request, email)  # only failed attempts count towards the limits
             # set session values
             request.session['user_id'] = user.id
             request.session['user_role'] = user.role
@@ -107,6 +144,7 @@ def login_view(request):
     return render(request, "login.html")
 
 
+@query_budget(1)
 def logout_view(request):
     request.session.flush()  # clears the session completely
     messages.success(request, "You have been logged out.")
@@ -114,9 +152,11 @@ def logout_view(request):
 
 
 
+@query_budget(7, max_db_ms=100)
+@use_replica
 @login_required_role(allowed_roles=["customer"])
 def customer_dashboard(request):
-    user = User.objects.get(id=request.session['user_id'])
+    user = current_user_or_404(request)
 
     # --- (existing recent_ride / top_vehicles logic kept as before) ---
     recent_ride = (
@@ -180,12 +220,11 @@ def customer_dashboard(request):
 
     return render(request, "customer_home.html", context)
 
+@query_budget(4, max_db_ms=100)
 @login_required_role(allowed_roles=["driver"])
 def driver_dashboard(request):
-    # get user/driver (keeps your session usage)
-    uid = request.session.get("user_id")
-    user = get_object_or_404(User, id=uid)
-    driver = get_object_or_404(DriverModel, user__pk=uid)
+    driver = current_driver_or_404(request)
+    user = driver.user
 
     # --- only pending requests (most recent first) ---
     pending_requests = (
@@ -219,13 +258,47 @@ def driver_dashboard(request):
         },
     )
 
+@query_budget(2)
 @login_required_role(allowed_roles=["admin"])
 def admin_dashboard(request):
-    user = User.objects.get(id=request.session['user_id'])
-    return render(request, "admin_dashboard.html", {"user": user})
+    user = current_user_or_404(request)
+    # open SOS alerts; new ones arrive over /ws/admin/sos/ (rides/sos.py)
+    alerts = SOSAlert.objects.filter(resolved=False).select_related("user").order_by("-triggered_at")[:50]
+    return render(request, "admin_dashboard.html", {"user": user, "sos_alerts": alerts})
+
+
+@query_budget(1)
+@login_required_role(allowed_roles=["admin"])
+@require_POST
+def resolve_sos(request, pk):
+    if SOSAlert.objects.filter(pk=pk, resolved=False).update(resolved=True, resolved_at=timezone.now()):
+        messages.success(request, f"SOS #{pk} marked resolved.")
+    return redirect("admin_dashboard")
+
+
+@query_budget(1)
+@login_required_role(allowed_roles=["admin"])
+def admin_profiles_list(request):
+    """Browse request profiles captured by DriveMate.profiling.ProfilingMiddleware."""
+    return render(request, "admin_profiles.html", {"profiles": list_profiles()})
+
+
+@query_budget(1)
+@login_required_role(allowed_roles=["admin"])
+def admin_profile_detail(request, profile_id):
+    data = load_profile(profile_id)
+    if data is None:
+        raise Http404("Profile not found")
+    if request.GET.get("download"):
+        path = raw_profile_path(data)
+        if not path or not path.exists():
+            raise Http404("Raw profile not found")
+        return FileResponse(open(path, "rb"), as_attachment=True, filename=path.name)
+    return render(request, "admin_profile_detail.html", {"profile": data})
 
 
 
+@query_budget(2)
 def customer_register(request):
     if request.method == "POST":
         name = request.POST.get("name")
@@ -234,13 +307,20 @@ def customer_register(request):
         password = request.POST.get("password") 
         gender = request.POST.get("gender")
 
+        if not (name and email and phone and password):
+            messages.error(request, "Please fill all required fields.")
+            return redirect("customer_register")
+
         # check duplicate email
         if User.objects.filter(email=email).exists():
             messages.error(request, "Email already registered")
             return redirect("customer_register")
 
-        # hash the password before saving
-        hashed_password = make_password(password)
+        # hash the password before saving (only once the form is known to be valid)
+        try:
+            hashed_password = hash_password(password)
+        except HashingSaturated:
+            return password_hashing_busy(request, "customer_register.html")
 
         user = User.objects.create(
             name=name,
@@ -257,12 +337,34 @@ def customer_register(request):
 
     return render(request, "customer_register.html")
 
-from django.core.files.uploadedfile import UploadedFile
-
-
-MAX_IMAGE_SIZE = 5 * 1024 * 1024  # 5MB - adjust if you want
+def _attach_registration_files(driver, vehicle, profile_pic, id_proof, vehicle_images, primary_index):
+    """Move the staged uploads into storage and onto the committed rows.
 
-@transaction.atomic
+    Runs from transaction.on_commit, so no transaction is open while files are
+    copied; each row is then saved on its own.
+    """
+    driver_fields = []
+    if profile_pic:
+        driver.profile_pic.save(profile_pic.name, profile_pic, save=False)
+        driver_fields.append("profile_pic")
+    if id_proof:
+        driver.id_proof.save(id_proof.name, id_proof, save=False)
+        driver_fields.append("id_proof")
+    if driver_fields:
+        driver.save(update_fields=driver_fields)
+
+    if vehicle is None or not vehicle_images:
+        return
+    if primary_index is None or not 0 <= primary_index < len(vehicle_images):
+        primary_index = 0  # the first image is primary unless another was picked
+    for idx, uploaded in enumerate(vehicle_images):
+        image = VehicleImage(vehicle=vehicle, is_primary=(idx == primary_index))
+        image.image.save(uploaded.name, uploaded, save=False)
+        image.save()
+
+
+@query_budget(3)
+@staged_uploads
 def driver_register(request):
     if request.method == "POST":
         # --- Personal / user fields ---
@@ -271,30 +373,11 @@ def driver_register(request):
         phone = request.POST.get("phone", "").strip()
         password = request.POST.get("password", "")
         gender = request.POST.get("gender", "")
-        
-        hashed_password = make_password(password)
 
         if not (name and email and phone and password):
             messages.error(request, "Please fill required personal fields.")
             return redirect("driver_register")
 
-        if User.objects.filter(email=email).exists():
-            messages.error(request, "Email already registered")
-            return redirect("driver_register")
-
-        # create user instance and set password if supported
-        user = User(
-            name=name,
-            email=email,
-            phone=phone,
-            password=hashed_password,
-            gender=gender,
-            role="driver",
-            created_at=timezone.now()
-        )
-        
-        user.save()
-
         # --- Driver fields ---
         license_number = request.POST.get("license_number", "").strip()
         try:
@@ -302,21 +385,17 @@ def driver_register(request):
         except (ValueError, TypeError):
             experience_years = 0
 
+        # uploads were streamed to the staging area; oversize ones never got there
+        if request.rejected_uploads:
+            field, file_name, limit = request.rejected_uploads[0]
+            messages.error(request, f"{file_name} is too large (the limit is {filesizeformat(limit)}).")
+            return redirect("driver_register")
         profile_pic = request.FILES.get("profile_pic")
         id_proof = request.FILES.get("id_proof")
 
-        driver = Driver.objects.create(
-            user=user,
-            license_number=license_number,
-            experience_years=experience_years,
-            profile_pic=profile_pic,
-            id_proof=id_proof,
-            verified=False,
-            is_available=True
-        )
-
         # --- Optional vehicle registration ---
-        if request.POST.get("with_car"):
+        with_car = bool(request.POST.get("with_car"))
+        if with_car:
             vehicle_type = (request.POST.get("vehicle_type") or "").strip()
             make = (request.POST.get("make") or "").strip()
             model_name = (request.POST.get("model") or "").strip()
@@ -365,61 +444,78 @@ def driver_register(request):
             # required vehicle checks
             if not (vehicle_type and make and model_name and year_val and reg_no):
                 messages.error(request, "Please fill required vehicle fields or uncheck 'Register with Car'.")
-                # transaction will rollback due to exception or return
                 return redirect("driver_register")
 
-            # create Vehicle, catch duplicate registration_number
-            try:
-                vehicle = Vehicle.objects.create(
-                    owner=user,
-                    current_driver=driver,
-                    vehicle_type=vehicle_type,
-                    make=make,
-                    model=model_name,
-                    year=year_val,
-                    color=color,
-                    registration_number=reg_no,
-                    seat_capacity=seat_capacity,
-                    ac=ac,
-                    transmission=transmission,
-                    fuel_type=fuel_type,
-                    per_km_rate=per_km_rate,
-                    per_min_rate=per_min_rate,
-                    fitness_cert_expiry=fitness_expiry,
-                    insurance_expiry=insurance_expiry,
-                    permit_expiry=permit_expiry,
-                    verified=False
-                )
-            except IntegrityError:
-                messages.error(request, "A vehicle with this registration number already exists.")
-                return redirect("driver_register")
+        if User.objects.filter(email=email).exists():
+            messages.error(request, "Email already registered")
+            return redirect("driver_register")
+
+        # the form is valid: only now pay for the hash, and outside the
+        # transaction so no database lock is held while hashing
+        try:
+            hashed_password = hash_password(password)
+        except HashingSaturated:
+            return password_hashing_busy(request, "driver_register.html")
+
+        with transaction.atomic():
+            # create user instance and set password if supported
+            user = User(
+                name=name,
+                email=email,
+                phone=phone,
+                password=hashed_password,
+                gender=gender,
+                role="driver",
+                created_at=timezone.now()
+            )
+
+            user.save()
+
+            driver = Driver.objects.create(
+                user=user,
+                license_number=license_number,
+                experience_years=experience_years,
+                verified=False,
+                is_available=True
+            )
+
+            vehicle = None
+            if with_car:
+                # create Vehicle, catch duplicate registration_number
+                try:
+                    vehicle = Vehicle.objects.create(
+                        owner=user,
+                        current_driver=driver,
+                        vehicle_type=vehicle_type,
+                        make=make,
+                        model=model_name,
+                        year=year_val,
+                        color=color,
+                        registration_number=reg_no,
+                        seat_capacity=seat_capacity,
+                        ac=ac,
+                        transmission=transmission,
+                        fuel_type=fuel_type,
+                        per_km_rate=per_km_rate,
+                        per_min_rate=per_min_rate,
+                        fitness_cert_expiry=fitness_expiry,
+                        insurance_expiry=insurance_expiry,
+                        permit_expiry=permit_expiry,
+                        verified=False
+                    )
+                except IntegrityError:
+                    # the failed insert marks the transaction for rollback, so the user and driver go too
+                    messages.error(request, "A vehicle with this registration number already exists.")
+                    return redirect("driver_register")
 
-            # save multiple vehicle images
-            uploaded_images = request.FILES.getlist("vehicle_images")
-            primary_index = None
+            # files go onto the rows only once they are committed
+            vehicle_images = request.FILES.getlist("vehicle_images") if with_car else []
             try:
-                primary_index = int(request.POST.get("primary_image_index")) if request.POST.get("primary_image_index") is not None else None
+                primary_index = int(request.POST.get("primary_image_index"))
             except (ValueError, TypeError):
                 primary_index = None
-
-            saved_images = []
-            for idx, uploaded in enumerate(uploaded_images):
-                # basic validation: ensure UploadedFile and size limit
-                if not isinstance(uploaded, UploadedFile):
-                    continue
-                if uploaded.size > MAX_IMAGE_SIZE:
-                    # skip too-large files (or you might want to reject whole form)
-                    continue
-                # create image record
-                is_primary = (primary_index is not None and idx == primary_index)
-                vi = VehicleImage.objects.create(vehicle=vehicle, image=uploaded, is_primary=is_primary)
-                saved_images.append(vi)
-
-            # if none marked primary and at least one image exists, set first as primary
-            if saved_images and not VehicleImage.objects.filter(vehicle=vehicle, is_primary=True).exists():
-                first = saved_images[0]
-                first.is_primary = True
-                first.save()
+            transaction.on_commit(lambda: _attach_registration_files(
+                driver, vehicle, profile_pic, id_proof, vehicle_images, primary_index))
 
         # success
         messages.success(request, "Driver registered successfully. Please wait for verification.")
@@ -437,15 +533,14 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
 from django.contrib import messages
 from django.utils import timezone
-from django.contrib.auth.hashers import make_password
 
 from .models import User, Driver
 
 
+@query_budget(1)
 @login_required_role(allowed_roles=['customer'])
 def customer_profile_view(request):
-    uid = request.session.get('user_id')
-    user = get_object_or_404(User, id=uid)
+    user = current_user_or_404(request)
 
     # double-check session role vs DB role (extra safety)
     session_role = request.session.get('user_role')
@@ -456,10 +551,10 @@ def customer_profile_view(request):
     return render(request, "customer_profile.html", {"user": user})
 
 
+@query_budget(4)
 @login_required_role(allowed_roles=['customer'])
 def customer_profile_edit(request):
-    uid = request.session.get('user_id')
-    user = get_object_or_404(User, id=uid)
+    user = current_user_or_404(request)
 
     session_role = request.session.get('user_role')
     if user.role != session_role or user.role != "customer":
@@ -491,7 +586,10 @@ def customer_profile_edit(request):
         user.language_preference = language_preference or user.language_preference
 
         if password:
-            user.password = make_password(password)
+            try:
+                user.password = hash_password(password)
+            except HashingSaturated:
+                return password_hashing_busy(request, "customer_profile_edit.html", {"user": user})
 
         user.updated_at = timezone.now()
         user.save()
@@ -505,38 +603,38 @@ def customer_profile_edit(request):
 # ----------------------------
 # DRIVER
 # ----------------------------
+@query_budget(1)
 @login_required_role(allowed_roles=['driver'])
 def driver_profile_view(request):
-    uid = request.session.get('user_id')
-    user = get_object_or_404(User, id=uid)
+    # one query for both: the driver comes with its user
+    driver = request.drivemate_driver
+    user = driver.user if driver else current_user_or_404(request)
 
     session_role = request.session.get('user_role')
     if user.role != session_role or user.role != "driver":
         messages.error(request, "Access denied.")
         return redirect("login")
 
-    try:
-        driver = user.driver_profile
-    except Driver.DoesNotExist:
+    if not driver:
         messages.error(request, "Driver profile missing. Complete registration first.")
         return redirect("/")  # change as needed
 
     return render(request, "driver_profile.html", {"user": user, "driver": driver})
 
 
+@query_budget(6)
 @login_required_role(allowed_roles=['driver'])
 def driver_profile_edit(request):
-    uid = request.session.get('user_id')
-    user = get_object_or_404(User, id=uid)
+    # one query for both: the driver comes with its user
+    driver = request.drivemate_driver
+    user = driver.user if driver else current_user_or_404(request)
 
     session_role = request.session.get('user_role')
     if user.role != session_role or user.role != "driver":
         messages.error(request, "Access denied.")
         return redirect("login")
 
-    try:
-        driver = user.driver_profile
-    except Driver.DoesNotExist:
+    if not driver:
         messages.error(request, "Driver profile missing.")
         return redirect("/")
 
@@ -571,16 +669,6 @@ def driver_profile_edit(request):
             messages.error(request, "License number already used by another driver.")
             return redirect(reverse("driver_profile_edit"))
 
-        # Update user
-        user.name = name or user.name
-        user.email = email or user.email
-        user.phone = phone or user.phone
-        user.gender = gender or user.gender
-        user.language_preference = language_preference or user.language_preference
-        if password:
-            user.password = make_password(password)
-        user.save()
-
         # Update driver fields (safe parsing)
         if license_number:
             driver.license_number = license_number
@@ -626,7 +714,24 @@ def driver_profile_edit(request):
         if id_proof:
             driver.id_proof = id_proof
 
-        driver.save()
+        # Update user (after validating everything, so a bad form costs no hash)
+        if password:
+            try:
+                user.password = hash_password(password)
+            except HashingSaturated:
+                return password_hashing_busy(request, "driver_profile_edit.html", {"user": user, "driver": driver})
+        user.name = name or user.name
+        user.email = email or user.email
+        user.phone = phone or user.phone
+        user.gender = gender or user.gender
+        user.language_preference = language_preference or user.language_preference
+        user.save()
+
+        # files only when uploaded, so an unchanged picture is not queued for rendering again
+        driver.save(update_fields=[
+            "license_number", "license_expiry", "experience_years", "day_fixed_charge", "night_fixed_charge",
+            "night_start", "night_end", *(["profile_pic"] if profile_pic else []), *(["id_proof"] if id_proof else []),
+        ])
         messages.success(request, "Driver profile updated.")
         return redirect(reverse("driver_profile"))
 
@@ -634,10 +739,10 @@ def driver_profile_edit(request):
 
 
 
+@query_budget(3, max_db_ms=100)
 @login_required_role(allowed_roles=["driver"])
 def driver_requests_list(request):
-    uid = request.session.get("user_id")
-    driver = get_object_or_404(DriverModel, user__pk=uid)
+    driver = current_driver_or_404(request)
 
     # pending requests only (most recent first)
     requests_qs = RideRequest.objects.filter(driver=driver).select_related(
@@ -659,10 +764,10 @@ def driver_requests_list(request):
     return render(request, "ride_requests_list.html", context)
 
 from payments.models import Payment
+@query_budget(3)
 @login_required_role(allowed_roles=["driver"])
 def driver_request_detail(request, pk):
-    uid = request.session.get("user_id")
-    driver = get_object_or_404(DriverModel, user__pk=uid)
+    driver = current_driver_or_404(request)
 
     ride_request = get_object_or_404(RideRequest.objects.select_related(
         "ride", "ride__customer", "ride__purpose", "ride__vehicle"
@@ -685,119 +790,93 @@ def driver_request_detail(request, pk):
     return render(request, "ride_request_detail.html", context)
 
 
+@query_budget(12)
 @login_required_role(allowed_roles=["driver"])
 def accept_ride_request(request, pk):
     if request.method != "POST":
         messages.error(request, "Invalid method.")
         return redirect("driver_requests_list")
 
-    uid = request.session.get("user_id")
-    driver = get_object_or_404(DriverModel, user__pk=uid)
+    driver = current_driver_or_404(request)
 
     ride_request = get_object_or_404(RideRequest.objects.select_related("ride"), pk=pk)
     if ride_request.driver_id != driver.id:
         return HttpResponseForbidden("You are not allowed to accept this request.")
+    ride = ride_request.ride
 
-    with transaction.atomic():
-        # lock the ride row
-        ride = Ride.objects.select_for_update().get(pk=ride_request.ride.pk)
-        # re-lock the ride_request row
-        ride_request = (
-            RideRequest.objects.select_for_update()
-            .select_related("driver", "ride")
-            .get(pk=pk)
-        )
+    # fast path: most losers of the race arrive after it is settled
+    if ride.status != Ride.Status.REQUESTED:
+        messages.error(request, "This ride is no longer available (already accepted/cancelled).")
+        return redirect("driver_requests_list")
 
-        # ✅ extra check: prevent driver from having multiple active rides
-        active_exists = RideRequest.objects.filter(
-            driver=driver,
-            status=RideRequest.Status.ACCEPTED,
-            ride__status__in=[Ride.Status.REQUESTED, Ride.Status.ACCEPTED, Ride.Status.ONGOING],
-        ).exclude(pk=ride_request.pk).exists()
-
-        if active_exists:
-            messages.error(request, "You already have an active ride. Complete it before accepting another.")
-            return redirect("driver_requests_list")
-
-        # check ride status
-        if ride.status != Ride.Status.REQUESTED:
-            messages.error(request, "This ride is no longer available (already accepted/cancelled).")
-            return redirect("driver_requests_list")
-
-        if ride_request.status != RideRequest.Status.PENDING:
-            messages.error(request, "This request is no longer pending.")
-            return redirect("driver_requests_list")
-
-        # --- VEHICLE handling for CAR_WITH_DRIVER mode ---
-        vehicle = None
-        if ride.ride_mode == Ride.Mode.CAR_WITH_DRIVER:
-            vehicle_id = request.POST.get("vehicle_id")
-            if vehicle_id:
-                # lock the vehicle row to avoid race conditions
-                try:
-                    vehicle = Vehicle.objects.select_for_update().get(pk=vehicle_id)
-                except Vehicle.DoesNotExist:
-                    messages.error(request, "Selected vehicle not found.")
-                    return redirect("driver_requests_list")
-
-                # ensure this vehicle is actually assigned to this driver
-                if vehicle.current_driver_id != driver.id:
-                    messages.error(request, "Selected vehicle is not assigned to you.")
-                    return redirect("driver_requests_list")
-
-                # optional checks: active/verified
-                if not vehicle.active:
-                    messages.error(request, "Selected vehicle is not active.")
-                    return redirect("driver_requests_list")
-                if not vehicle.verified:
-                    messages.error(request, "Selected vehicle is not verified.")
-                    return redirect("driver_requests_list")
-            else:
-                # try to auto-select the driver's currently assigned active & verified vehicle
-                vehicle = (
-                    Vehicle.objects.select_for_update()
-                    .filter(current_driver=driver, active=True, verified=True)
-                    .first()
-                )
-                if not vehicle:
-                    messages.error(
-                        request,
-                        "No active/verified vehicle assigned to you. Please select a vehicle to accept this ride."
-                    )
-                    return redirect("driver_requests_list")
+    if ride_request.status != RideRequest.Status.PENDING:
+        messages.error(request, "This request is no longer pending.")
+        return redirect("driver_requests_list")
 
-        ride_request.status = RideRequest.Status.ACCEPTED
-        ride_request.responded_at = timezone.now()
-        ride_request.save()
+    # ✅ extra check: prevent driver from having multiple active rides
+    active_exists = RideRequest.objects.filter(
+        driver=driver,
+        status=RideRequest.Status.ACCEPTED,
+        ride__status__in=[Ride.Status.REQUESTED, Ride.Status.ACCEPTED, Ride.Status.ONGOING],
+    ).exclude(pk=ride_request.pk).exists()
+
+    if active_exists:
+        messages.error(request, "You already have an active ride. Complete it before accepting another.")
+        return redirect("driver_requests_list")
 
-        # assign driver to ride (and vehicle if needed)
-        ride.driver = driver
-        if vehicle:
-            ride.vehicle = vehicle
+    # --- VEHICLE handling for CAR_WITH_DRIVER mode ---
+    vehicle = None
+    if ride.ride_mode == Ride.Mode.CAR_WITH_DRIVER:
+        vehicle_id = request.POST.get("vehicle_id")
+        if vehicle_id:
+            try:
+                vehicle = Vehicle.objects.get(pk=vehicle_id)
+            except Vehicle.DoesNotExist:
+                messages.error(request, "Selected vehicle not found.")
+                return redirect("driver_requests_list")
+
+            # ensure this vehicle is actually assigned to this driver
+            if vehicle.current_driver_id != driver.id:
+                messages.error(request, "Selected vehicle is not assigned to you.")
+                return redirect("driver_requests_list")
+
+            # optional checks: active/verified
+            if not vehicle.active:
+                messages.error(request, "Selected vehicle is not active.")
+                return redirect("driver_requests_list")
+            if not vehicle.verified:
+                messages.error(request, "Selected vehicle is not verified.")
+                return redirect("driver_requests_list")
         else:
-            # ensure we don't accidentally keep some old vehicle if this is DRIVER_ONLY
-            if ride.ride_mode == Ride.Mode.DRIVER_ONLY:
-                ride.vehicle = None
-        ride.status = Ride.Status.ACCEPTED
-        ride.save()
+            # try to auto-select the driver's currently assigned active & verified vehicle
+            vehicle = Vehicle.objects.filter(current_driver=driver, active=True, verified=True).first()
+            if not vehicle:
+                messages.error(
+                    request,
+                    "No active/verified vehicle assigned to you. Please select a vehicle to accept this ride."
+                )
+                return redirect("driver_requests_list")
 
-        # cancel other pending requests for same ride
-        now = timezone.now()
-        RideRequest.objects.filter(ride=ride).exclude(pk=ride_request.pk).filter(
-            status=RideRequest.Status.PENDING
-        ).update(status=RideRequest.Status.AUTO_CANCELLED, responded_at=now)
+    # the race itself is settled by one conditional UPDATE, see RideRequest.accept
+    if not ride_request.accept(vehicle=vehicle):
+        messages.error(request, "Sorry, another driver has already taken this ride.")
+        return redirect("driver_requests_list")
 
-    messages.success(request, "Ride accepted. Other driver requests have been cancelled.")
+    messages.success(request, "Ride accepted. The other drivers' requests will be closed shortly.")
     return redirect(reverse("driver_request_detail", args=[ride_request.pk]))
 
 
 def calculate_distance_osrm(lat1: float, lon1: float, lat2: float, lon2: float, timeout=5):
     """
-    Query the OSRM demo server for driving distance & duration.
+    Query the OSRM server (settings.OSRM_BASE_URL) for driving distance & duration.
     Returns (distance_km, duration_min, source) or (None, None, None) on failure.
     """
+    import requests  # only needed here; keeps it out of worker boot
+
+    started = time.perf_counter()
+    outcome = "error"
     try:
-        url = f"http://router.project-osrm.org/route/v1/driving/{lon1},{lat1};{lon2},{lat2}"
+        url = f"{settings.OSRM_BASE_URL}/route/v1/driving/{lon1},{lat1};{lon2},{lat2}"
         params = {"overview": "false", "alternatives": "false", "steps": "false"}
         r = requests.get(url, params=params, timeout=timeout)
         r.raise_for_status()
@@ -806,12 +885,17 @@ def calculate_distance_osrm(lat1: float, lon1: float, lat2: float, lon2: float,
             route = data["routes"][0]
             distance_km = float(route["distance"]) / 1000.0
             duration_min = float(route["duration"]) / 60.0  # seconds → minutes
+            outcome = "ok"
             return distance_km, duration_min, "osrm"
+        outcome = "no_route"
         return None, None, None
     except Exception:
         return None, None, None
+    finally:
+        metrics.observe_routing(time.perf_counter() - started, outcome)
 
 
+@query_budget(2)
 @require_GET
 @login_required_role(allowed_roles=["driver"])
 def ride_request_distance(request, pk):
@@ -862,6 +946,7 @@ from django.core.exceptions import ValidationError
 
 
 
+@query_budget(6)
 @login_required_role(allowed_roles=["driver"])
 def set_ride_request_ongoing(request, pk):
     if request.method != 'POST':
@@ -873,8 +958,8 @@ def set_ride_request_ongoing(request, pk):
         if not uid:
             return JsonResponse({'error': 'User not authenticated'}, status=401)
 
-        driver = get_object_or_404(DriverModel, user__pk=uid)
-        ride_request = get_object_or_404(RideRequest, pk=pk, driver=driver)
+        driver = current_driver_or_404(request)
+        ride_request = get_object_or_404(RideRequest.objects.select_related("ride"), pk=pk, driver=driver)
 
         # Check statuses
         if not hasattr(ride_request, 'status') or not hasattr(ride_request.ride, 'status'):
@@ -896,8 +981,12 @@ def set_ride_request_ongoing(request, pk):
         if not ride.start_time:
             ride.start_time = timezone.now()
 
-        ride_request.save()
-        ride.save()
+        with transaction.atomic():
+            ride_request.save()
+            ride.save()
+            # payment opens now; the fare is stored in the background until
+            # end_ride_request replaces it with the actual one
+            enqueue(store_fare, key=f"fare:{ride.pk}", ride_id=ride.pk)
 
         return JsonResponse({
             'success': True,
@@ -914,6 +1003,7 @@ def set_ride_request_ongoing(request, pk):
     except Exception as e:
         return JsonResponse({'error': 'An unexpected error occurred.'}, status=500)
 
+@query_budget(6)
 @login_required_role(allowed_roles=["driver"])
 def end_ride_request(request, pk):
     if request.method != 'POST':
@@ -924,8 +1014,8 @@ def end_ride_request(request, pk):
         if not uid:
             return JsonResponse({'error': 'User not authenticated'}, status=401)
 
-        driver = get_object_or_404(DriverModel, user__pk=uid)
-        ride_request = get_object_or_404(RideRequest, pk=pk, driver=driver)
+        driver = current_driver_or_404(request)
+        ride_request = get_object_or_404(RideRequest.objects.select_related("ride__driver", "ride__vehicle"), pk=pk, driver=driver)
 
         ride = ride_request.ride
         if not ride:
@@ -995,6 +1085,7 @@ def end_ride_request(request, pk):
     except Exception as e:
         return JsonResponse({'error': 'An unexpected error occurred.'}, status=500)
     
+@query_budget(3)
 @login_required_role(allowed_roles=["driver"])
 @require_http_methods(["POST"])
 def api_toggle_driver_availability(request):
@@ -1010,12 +1101,9 @@ def api_toggle_driver_availability(request):
     if not user_id:
         return HttpResponseForbidden(json.dumps({"error": "Not authenticated"}), content_type="application/json")
 
-    user = get_object_or_404(User, id=user_id)
-
-    # ensure user has a driver profile
-    try:
-        driver = user.driver_profile
-    except Driver.DoesNotExist:
+    driver = request.drivemate_driver
+    if not driver:
+        current_user_or_404(request)
         return JsonResponse({"error": "Driver profile not found"}, status=404)
 
     # parse JSON body (if any)
@@ -0,0 +1,301 @@
+"""
+HTTP load test for the core ride lifecycle.
+
+Every virtual user is a customer/driver pair that logs in once and then
+repeatedly walks the whole lifecycle over HTTP:
+
+    create_ride -> select_driver -> driver_requests_list ->
+    accept_ride_request -> set_ride_request_ongoing -> end_ride_request ->
+    create_transaction -> finalize_transaction -> rate_ride
+
+Logging in once keeps the pairs, which all come from one IP, well inside
+the login rate limits (DriveMate/ratelimit.py); a 429 is reported as such.
+
+Per step it reports p50/p95/p99 latency and throughput, and writes everything
+to JSON so runs can be compared across commits.
+
+Typical local run (three terminals, or use --start-osrm-stub):
+
+    python -m benchmarks.osrm_stub --port 5005
+    OSRM_BASE_URL=http://127.0.0.1:5005 python manage.py runserver --noreload
+    python -m benchmarks.load_lifecycle --concurrency 8 --iterations 20 --out bench/lifecycle.json
+
+    python -m benchmarks.load_lifecycle --compare bench/before.json bench/after.json
+
+The fixture users are created straight through the ORM, so this script must
+use the same settings/database as the server under test. To benchmark on
+PostgreSQL, export the same DATABASE_URL (and DB_POOL, ...) for both the server
+and this script; see DriveMate/database.py.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from pathlib import Path
+
+import requests
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+STEPS = [
+    "login",
+    "create_ride",
+    "select_driver",
+    "driver_requests_list",
+    "accept_ride_request",
+    "set_ride_request_ongoing",
+    "end_ride_request",
+    "create_transaction",
+    "finalize_transaction",
+    "rate_ride",
+]
+BENCH_PASSWORD = "bench-password-123"
+BENCH_EMAIL_DOMAIN = "bench.drivemate.test"
+
+
+class StepFailed(Exception):
+    pass
+
+
+def setup_django():
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "DriveMate.settings")
+    import django
+    django.setup()
+
+
+def create_pairs(n, run_id):
+    """Create n customer/driver pairs for this run and return their credentials."""
+    from django.contrib.auth.hashers import make_password
+    from accounts.models import User, Driver
+
+    password = make_password(BENCH_PASSWORD)
+    pairs = []
+    for i in range(n):
+        customer = User.objects.create(
+            name=f"Bench Customer {i}", email=f"c{i}-{run_id}@{BENCH_EMAIL_DOMAIN}",
+            phone=f"c{run_id[:8]}{i}", password=password, role="customer",
+        )
+        driver_user = User.objects.create(
+            name=f"Bench Driver {i}", email=f"d{i}-{run_id}@{BENCH_EMAIL_DOMAIN}",
+            phone=f"d{run_id[:8]}{i}", password=password, role="driver",
+        )
+        driver = Driver.objects.create(
+            user=driver_user, license_number=f"BENCH-{run_id}-{i}", verified=True,
+            background_check_passed=True, is_available=True, profile_pic="driver_profile/mub.png",
+            latitude=Decimal("9.9312"), longitude=Decimal("76.2673"),
+            day_fixed_charge=Decimal("800.00"), night_fixed_charge=Decimal("1000.00"),
+        )
+        pairs.append({"customer": customer.email, "driver": driver_user.email, "driver_id": driver.id})
+    return pairs
+
+
+def cleanup_pairs(run_id):
+    from accounts.models import User
+    User.objects.filter(email__endswith=f"-{run_id}@{BENCH_EMAIL_DOMAIN}").delete()
+
+
+class LifecycleClient:
+    def __init__(self, base_url, pair, timings):
+        self.base_url = base_url.rstrip("/")
+        self.pair = pair
+        self.timings = timings
+        self.customer = requests.Session()
+        self.driver = requests.Session()
+
+    def call(self, step, session, method, path, expect=(200, 302), **kwargs):
+        headers = kwargs.pop("headers", {})
+        if method == "POST":
+            headers["X-CSRFToken"] = session.cookies.get("csrftoken", "")
+        started = time.perf_counter()
+        response = session.request(method, self.base_url + path, headers=headers, allow_redirects=False, **kwargs)
+        elapsed = time.perf_counter() - started
+        self.timings[step].append(elapsed)
+        if response.status_code not in expect:
+            raise StepFailed(f"{step}: HTTP {response.status_code}")
+        return response
+
+    def login(self, session, email):
+        session.get(self.base_url + "/login/")  # csrftoken cookie, not timed
+        response = self.call("login", session, "POST", "/login/", expect=(200, 302, 429),
+                             data={"email": email, "password": BENCH_PASSWORD})
+        if response.status_code == 429:
+            raise StepFailed(f"login: rate limited (Retry-After {response.headers.get('Retry-After')}s)")
+        if response.status_code != 302:
+            raise StepFailed("login: credentials rejected")
+
+    def run_once(self):
+        self.customer.get(self.base_url + "/create/")  # csrftoken for the form, not timed
+        response = self.call("create_ride", self.customer, "POST", "/create/", data={
+            "ride_mode": "driver_only",
+            "start_location": "MG Road, Kochi", "start_latitude": "9.9750", "start_longitude": "76.2800",
+            "end_location": "Airport, Kochi", "end_latitude": "10.1520", "end_longitude": "76.3910",
+            "notes": "",
+        })
+        match = re.search(r"/select-driver/(\d+)/", response.headers.get("Location", ""))
+        if not match:
+            raise StepFailed("create_ride: no ride created")
+        ride_id = match.group(1)
+
+        self.call("select_driver", self.customer, "GET", f"/select-driver/{ride_id}/")
+        self.call("select_driver", self.customer, "POST", f"/select-driver/{ride_id}/",
+                  data={"driver_id": self.pair["driver_id"]})
+
+        response = self.call("driver_requests_list", self.driver, "GET", "/driver/requests/")
+        match = re.search(r"/driver/requests/(\d+)/accept/", response.text)
+        if not match:
+            raise StepFailed("driver_requests_list: request not visible to driver")
+        request_id = match.group(1)
+
+        response = self.call("accept_ride_request", self.driver, "POST", f"/driver/requests/{request_id}/accept/")
+        if "/driver/requests/%s/" % request_id not in response.headers.get("Location", ""):
+            raise StepFailed("accept_ride_request: not accepted")
+        self.call("set_ride_request_ongoing", self.driver, "POST", f"/ride-requests/{request_id}/set_ongoing/")
+        response = self.call("end_ride_request", self.driver, "POST", f"/ride-requests/{request_id}/end_ride/",
+                             data={"additional_charges": "0"})
+        amount = response.json().get("total_amount")
+        if not amount:
+            raise StepFailed(f"end_ride_request: {response.json().get('error')}")
+
+        response = self.call("create_transaction", self.customer, "POST", "/payments/create/",
+                             data={"ride_id": ride_id, "method": "upi", "amount": amount})
+        tx_id = response.json().get("tx_id")
+        if not tx_id:
+            raise StepFailed(f"create_transaction: {response.json().get('error')}")
+        self.call("finalize_transaction", self.customer, "POST", "/payments/finalize/", data={"tx_id": tx_id})
+
+        self.customer.get(self.base_url + f"/rate-ride/{ride_id}/")  # csrftoken, not timed
+        self.call("rate_ride", self.customer, "POST", f"/rate-ride/{ride_id}/", data={"score": 5, "feedback": "bench"})
+
+    def run(self, iterations, errors):
+        try:
+            self.login(self.customer, self.pair["customer"])
+            self.login(self.driver, self.pair["driver"])
+        except (StepFailed, requests.RequestException) as exc:
+            errors.append(str(exc))
+            return
+        for _ in range(iterations):
+            try:
+                self.run_once()
+            except (StepFailed, requests.RequestException, ValueError) as exc:
+                errors.append(str(exc))
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(timings, wall_seconds):
+    steps = {}
+    for step in STEPS:
+        values = sorted(timings.get(step, []))
+        if not values:
+            continue
+        steps[step] = {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+            "mean_ms": round(sum(values) / len(values) * 1000, 2),
+            "throughput_rps": round(len(values) / wall_seconds, 2),
+        }
+    return steps
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(result):
+    print(f"commit={result['meta']['commit']} concurrency={result['meta']['concurrency']} "
+          f"lifecycles={result['meta']['lifecycles']} errors={len(result['errors'])}")
+    print(f"{'step':28} {'count':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'rps':>8}")
+    for step, row in result["steps"].items():
+        print(f"{step:28} {row['count']:>6} {row['p50_ms']:>8.1f}ms {row['p95_ms']:>8.1f}ms "
+              f"{row['p99_ms']:>8.1f}ms {row['throughput_rps']:>8.1f}")
+
+
+def compare(old_path, new_path):
+    old = json.loads(Path(old_path).read_text())
+    new = json.loads(Path(new_path).read_text())
+    print(f"{old['meta']['commit']} -> {new['meta']['commit']}")
+    print(f"{'step':28} {'p50 old':>9} {'p50 new':>9} {'p95 old':>9} {'p95 new':>9} {'change p95':>11}")
+    for step in STEPS:
+        a, b = old["steps"].get(step), new["steps"].get(step)
+        if not (a and b):
+            continue
+        change = (b["p95_ms"] - a["p95_ms"]) / a["p95_ms"] * 100 if a["p95_ms"] else 0.0
+        print(f"{step:28} {a['p50_ms']:>8.1f}ms {b['p50_ms']:>8.1f}ms {a['p95_ms']:>8.1f}ms "
+              f"{b['p95_ms']:>8.1f}ms {change:>+10.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=4, help="parallel customer/driver pairs")
+    parser.add_argument("--iterations", type=int, default=10, help="lifecycles per pair")
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--start-osrm-stub", type=int, metavar="PORT",
+                        help="also start the OSRM stand-in on this port (server needs OSRM_BASE_URL pointed at it)")
+    parser.add_argument("--keep-data", action="store_true", help="do not delete the bench users afterwards")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files and exit")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    if args.start_osrm_stub:
+        from benchmarks.osrm_stub import start_stub
+        start_stub(port=args.start_osrm_stub)
+
+    setup_django()
+    run_id = uuid.uuid4().hex[:10]
+    pairs = create_pairs(args.concurrency, run_id)
+
+    timings = defaultdict(list)
+    errors = []
+    clients = [LifecycleClient(args.base_url, pair, timings) for pair in pairs]
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for client in clients:
+                pool.submit(client.run, args.iterations, errors)
+    finally:
+        wall = time.perf_counter() - started
+        if not args.keep_data:
+            cleanup_pairs(run_id)
+
+    result = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "base_url": args.base_url,
+            "concurrency": args.concurrency,
+            "iterations": args.iterations,
+            "lifecycles": args.concurrency * args.iterations,
+            "wall_seconds": round(wall, 3),
+        },
+        "steps": summarize(timings, wall),
+        "errors": errors[:50],
+    }
+    print_report(result)
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Logins per second per core: inline hashing vs the hashing pool.
+
+    python -m benchmarks.login_throughput --clients 16 --seconds 10
+    python -m benchmarks.login_throughput --url http://127.0.0.1:8000 --clients 16   # a running server
+
+In-process mode verifies the same password with --clients threads for
+--seconds, first inline (check_password on the calling thread, as login_view
+used to) and then through DriveMate.hashing with --workers processes and
+--max-pending slots. It reports logins/s, logins/s per core, p50/p95 latency
+and how many attempts were refused as saturated (503 in the real view).
+Meanwhile one more thread stands in for the rest of the site: it renders a
+page-sized chunk of Python work (--page-ms on an idle core) in a loop, and
+its p50/p95 latency is reported as "page". That is what the pool is for:
+inline, every login thread competes for the CPUs; pooled, hashing is capped
+at --workers processes and the pages keep their latency.
+
+HTTP mode POSTs /login/ with users created by `manage.py seed_scale`
+(customer<N>@seed.drivemate.test / drivemate123) and counts 302 (logged in),
+503 (hashing pool saturated) and anything else. "Per core" there divides by
+the CPU count of this machine, so run client and server on the same host.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+SEED_PASSWORD = "drivemate123"
+
+
+def setup_django(workers, max_pending):
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "DriveMate.settings")
+    import django
+    django.setup()
+    from django.conf import settings
+    settings.PASSWORD_HASH_WORKERS = workers
+    settings.PASSWORD_HASH_MAX_PENDING = max_pending
+
+
+def hammer(clients, seconds, attempt, busy_backoff):
+    """Run attempt() from `clients` threads; it returns "ok", "busy" or "error"."""
+    stop = threading.Event()
+    results = [[] for _ in range(clients)]
+
+    def loop(out, i):
+        n = 0
+        while not stop.is_set():
+            started = time.perf_counter()
+            outcome = attempt(i, n)
+            out.append((outcome, time.perf_counter() - started))
+            n += 1
+            if outcome == "busy":
+                time.sleep(busy_backoff)  # a real client backs off on 503 / Retry-After
+
+    threads = [threading.Thread(target=loop, args=(results[i], i)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return [r for per_thread in results for r in per_thread]
+
+
+def page_work(iterations):
+    total = 0
+    for i in range(iterations):
+        total += i * i % 7
+    return total
+
+
+def calibrate_page(ms):
+    """Iterations of page_work that take about `ms` milliseconds on an idle core."""
+    iterations = 10000
+    started = time.perf_counter()
+    page_work(iterations)
+    return max(1, int(iterations * ms / 1000 / (time.perf_counter() - started)))
+
+
+def probe_pages(stop, iterations, out):
+    while not stop.is_set():
+        started = time.perf_counter()
+        page_work(iterations)
+        out.append(time.perf_counter() - started)
+        time.sleep(0.005)  # think time between page views
+
+
+def with_pages(iterations, run):
+    """run() while probe_pages measures page latency; returns (run's result, page latencies)."""
+    stop, pages = threading.Event(), []
+    probe = threading.Thread(target=probe_pages, args=(stop, iterations, pages))
+    probe.start()
+    try:
+        return run(), pages
+    finally:
+        stop.set()
+        probe.join()
+
+
+def percentile_ms(values, fraction):
+    values = sorted(values)
+    return round(values[max(0, int(len(values) * fraction) - 1)] * 1000, 1) if values else None
+
+
+def summarize(results, seconds, cores, pages=None):
+    ok = sorted(elapsed for outcome, elapsed in results if outcome == "ok")
+    per_s = len(ok) / seconds
+    summary = {
+        "logins_per_s": round(per_s, 1),
+        "logins_per_s_per_core": round(per_s / cores, 1),
+        "p50_ms": round(statistics.median(ok) * 1000, 1) if ok else None,
+        "p95_ms": percentile_ms(ok, 0.95),
+        "busy": sum(1 for outcome, _ in results if outcome == "busy"),
+        "errors": sum(1 for outcome, _ in results if outcome == "error"),
+    }
+    if pages is not None:
+        summary["page_p50_ms"] = percentile_ms(pages, 0.5)
+        summary["page_p95_ms"] = percentile_ms(pages, 0.95)
+    return summary
+
+
+def run_in_process(args):
+    setup_django(args.workers, args.max_pending)
+    from django.contrib.auth.hashers import check_password, make_password
+    from DriveMate import hashing
+
+    encoded = make_password(SEED_PASSWORD)
+
+    def inline(i, n):
+        return "ok" if check_password(SEED_PASSWORD, encoded) else "error"
+
+    def pooled(i, n):
+        try:
+            return "ok" if hashing.verify_password(SEED_PASSWORD, encoded) else "error"
+        except hashing.HashingSaturated:
+            return "busy"
+
+    hashing.verify_password(SEED_PASSWORD, encoded)  # start the pool outside the timed run
+    cores = os.cpu_count() or 1
+    iterations = calibrate_page(args.page_ms)
+    _, idle = with_pages(iterations, lambda: time.sleep(min(args.seconds, 2)))
+    results = {"idle": {"page_p50_ms": percentile_ms(idle, 0.5), "page_p95_ms": percentile_ms(idle, 0.95)}}
+    for name, attempt in (("inline", inline), ("pool", pooled)):
+        logins, pages = with_pages(iterations, lambda: hammer(args.clients, args.seconds, attempt, args.busy_backoff))
+        results[name] = summarize(logins, args.seconds, cores, pages)
+    hashing.shutdown()
+    return results
+
+
+def run_http(args):
+    import requests
+
+    sessions = [requests.Session() for _ in range(args.clients)]
+    for session in sessions:
+        session.get(args.url.rstrip("/") + "/login/")  # csrftoken cookie
+
+    def attempt(i, n):
+        session = sessions[i]
+        email = f"customer{(i * 1000 + n) % args.users}@seed.drivemate.test"
+        try:
+            response = session.post(
+                args.url.rstrip("/") + "/login/", data={"email": email, "password": SEED_PASSWORD},
+                headers={"X-CSRFToken": session.cookies.get("csrftoken", "")}, allow_redirects=False, timeout=30,
+            )
+        except requests.RequestException:
+            return "error"
+        return {302: "ok", 503: "busy"}.get(response.status_code, "error")
+
+    results = hammer(args.clients, args.seconds, attempt, args.busy_backoff)
+    return {"http": summarize(results, args.seconds, os.cpu_count() or 1)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--workers", type=int, default=1, help="hashing pool processes (PASSWORD_HASH_WORKERS)")
+    parser.add_argument("--page-ms", type=float, default=5.0, help="CPU time of one probe page on an idle core")
+    parser.add_argument("--max-pending", type=int, default=None, help="hashing pool queue limit")
+    parser.add_argument("--busy-backoff", type=float, default=0.1, help="seconds a client waits after a 503")
+    parser.add_argument("--url", help="benchmark a running server instead")
+    parser.add_argument("--users", type=int, default=1000, help="seeded customers to log in as (HTTP mode)")
+    parser.add_argument("--out", help="write results JSON here")
+    args = parser.parse_args(argv)
+
+    results = run_http(args) if args.url else run_in_process(args)
+    print(f"{'mode':8} {'logins/s':>9} {'per core':>9} {'p50 ms':>8} {'p95 ms':>8} {'busy':>6} {'errors':>7}"
+          f" {'page p50':>9} {'page p95':>9}")
+    for name, r in results.items():
+        print(f"{name:8} {r.get('logins_per_s', '-')!s:>9} {r.get('logins_per_s_per_core', '-')!s:>9} "
+              f"{r.get('p50_ms', '-')!s:>8} {r.get('p95_ms', '-')!s:>8} {r.get('busy', '-')!s:>6} "
+              f"{r.get('errors', '-')!s:>7} {r.get('page_p50_ms', '-')!s:>9} {r.get('page_p95_ms', '-')!s:>9}")
+    if args.out:
+        Path(args.out).write_text(json.dumps({"config": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
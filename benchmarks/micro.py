@@ -0,0 +1,169 @@
+"""
+Microbenchmarks for the CPU-bound hot paths.
+
+    python -m benchmarks.micro                      # run and compare against the stored baseline
+    python -m benchmarks.micro --save-baseline      # record a new baseline
+    python -m benchmarks.micro --threshold 0.25 -k haversine
+
+Each case is timed with timeit (best of --repeat runs) and reported in
+microseconds per call. A case is flagged as a regression when it is slower than
+its baseline by more than --threshold (fraction, default 0.30) and the process
+exits with status 1, so this can gate CI. Baselines are machine specific:
+record them on the machine that runs the comparison.
+
+Nothing here touches the database; model instances are built unsaved.
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines" / "micro.json"
+
+
+def setup_django():
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "DriveMate.settings")
+    import django
+    django.setup()
+
+
+# ----------------------------
+# cases: each returns a zero-argument callable to be timed
+# ----------------------------
+def case_haversine_distance():
+    from rides.utils import haversine_distance
+    return lambda: haversine_distance(Decimal("9.931233"), Decimal("76.267303"), Decimal("10.152000"), Decimal("76.391000"))
+
+
+def case_calculate_fare_driver_only():
+    from accounts.models import Driver
+    from rides.models import Ride
+    driver = Driver(day_fixed_charge=Decimal("800.00"), night_fixed_charge=Decimal("1000.00"))
+    ride = Ride(ride_mode=Ride.Mode.DRIVER_ONLY, driver=driver, start_time=datetime(2025, 9, 1, 10, tzinfo=dt_timezone.utc))
+    return ride.calculate_fare
+
+
+def case_calculate_fare_car_with_driver():
+    from rides.models import Ride
+    from vehicles.models import Vehicle
+    vehicle = Vehicle(per_km_rate=Decimal("14.00"), per_min_rate=Decimal("1.50"))
+    ride = Ride(ride_mode=Ride.Mode.CAR_WITH_DRIVER, vehicle=vehicle,
+                actual_distance_km=Decimal("23.40"), actual_duration_min=48)
+    return ride.calculate_fare
+
+
+def case_before_comma():
+    from rides.templatetags.address_filters import before_comma
+    address = "Infopark Phase 2, Kakkanad, Kochi, Kerala 682042, India"
+    return lambda: before_comma(address)
+
+
+def case_login_required_role_dispatch():
+    from django.test import RequestFactory
+    from accounts.views import login_required_role
+
+    view = login_required_role(allowed_roles=["customer"])(lambda request: None)
+    request = RequestFactory().get("/dashboard/customer/")
+    request.session = {"user_id": 1, "user_role": "customer"}
+    return lambda: view(request)
+
+
+def case_render_select_driver_20():
+    from django.template.loader import render_to_string
+    from django.test import RequestFactory
+    from accounts.models import User, Driver
+    from rides.models import Ride
+    from vehicles.models import Vehicle
+
+    drivers = []
+    for i in range(20):
+        user = User(id=i + 1, name=f"Driver {i}", email=f"d{i}@example.com")
+        driver = Driver(id=i + 1, user=user, rating=4.5, experience_years=i % 10,
+                        profile_pic=f"driver_profile/d{i}.png", latitude=Decimal("9.93"), longitude=Decimal("76.26"))
+        driver.distance = i * 0.7
+        driver.already_requested = i % 4 == 0
+        drivers.append(driver)
+    ride = Ride(id=1, ride_mode=Ride.Mode.DRIVER_ONLY, start_location="MG Road, Kochi", end_location="Airport, Kochi")
+    request = RequestFactory().get("/select-driver/1/")
+    request.session = {"user_id": 1, "user_role": "customer"}
+    context = {
+        "ride": ride,
+        "drivers": drivers,
+        "ride_mode": "driver_only",
+        "vehicle_types": Vehicle.VehicleType.choices,
+        "transmissions": Vehicle.Transmission.choices,
+        "fuel_types": Vehicle.Fuel.choices,
+        "filters": request.GET,
+    }
+    render_to_string("select_driver.html", context, request=request)  # warm the template cache
+    return lambda: render_to_string("select_driver.html", context, request=request)
+
+
+CASES = {
+    "haversine_distance": case_haversine_distance,
+    "calculate_fare_driver_only": case_calculate_fare_driver_only,
+    "calculate_fare_car_with_driver": case_calculate_fare_car_with_driver,
+    "before_comma": case_before_comma,
+    "login_required_role_dispatch": case_login_required_role_dispatch,
+    "render_select_driver_20": case_render_select_driver_20,
+}
+
+
+def measure(func, repeat):
+    """Best-of-`repeat` time per call in microseconds."""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", dest="select", help="only run cases whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.30, help="allowed slowdown vs baseline (0.30 = 30%%)")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH))
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    baseline_path = Path(args.baseline)
+    baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+
+    results, regressions = {}, []
+    print(f"{'case':34} {'us/call':>10} {'baseline':>10} {'change':>8}")
+    for name, factory in CASES.items():
+        if args.select and args.select not in name:
+            continue
+        us = measure(factory(), args.repeat)
+        results[name] = round(us, 3)
+        base = baseline.get(name)
+        if base:
+            change = (us - base) / base
+            flag = "  REGRESSION" if change > args.threshold else ""
+            if flag:
+                regressions.append(name)
+            print(f"{name:34} {us:>10.2f} {base:>10.2f} {change:>+7.1%}{flag}")
+        else:
+            print(f"{name:34} {us:>10.2f} {'-':>10} {'-':>8}")
+
+    if args.save_baseline:
+        baseline.update(results)
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print(f"baseline saved to {baseline_path}")
+        return 0
+
+    if regressions:
+        print(f"{len(regressions)} case(s) regressed more than {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
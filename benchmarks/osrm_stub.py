@@ -0,0 +1,78 @@
+"""
+Local stand-in for the OSRM routing server.
+
+Answers /route/v1/driving/<lon1>,<lat1>;<lon2>,<lat2> with a haversine based
+route so the ride lifecycle can be load tested without hitting the public demo
+server (which rate limits and adds 100s of ms of network noise).
+
+    python -m benchmarks.osrm_stub --port 5005
+    OSRM_BASE_URL=http://127.0.0.1:5005 python manage.py runserver
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from rides.utils import haversine_distance
+
+ROAD_FACTOR = 1.3     # roads are longer than the straight line
+AVG_SPEED_KMPH = 30.0
+
+ROUTE_RE = re.compile(r"^/route/v1/driving/([-\d.]+),([-\d.]+);([-\d.]+),([-\d.]+)")
+
+
+class OSRMStubHandler(BaseHTTPRequestHandler):
+    latency_ms = 0.0
+
+    def do_GET(self):
+        match = ROUTE_RE.match(self.path)
+        if not match:
+            self.send_json(404, {"code": "InvalidUrl"})
+            return
+        lon1, lat1, lon2, lat2 = map(float, match.groups())
+        distance_km = haversine_distance(lat1, lon1, lat2, lon2) * ROAD_FACTOR
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+        self.send_json(200, {
+            "code": "Ok",
+            "routes": [{
+                "distance": distance_km * 1000.0,
+                "duration": distance_km / AVG_SPEED_KMPH * 3600.0,
+            }],
+        })
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub(host="127.0.0.1", port=5005, latency_ms=0.0):
+    """Start the stub in a daemon thread and return the server (call .shutdown() to stop)."""
+    handler = type("Handler", (OSRMStubHandler,), {"latency_ms": latency_ms})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5005)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="artificial delay per route call")
+    args = parser.parse_args()
+    handler = type("Handler", (OSRMStubHandler,), {"latency_ms": args.latency_ms})
+    print(f"OSRM stub listening on http://{args.host}:{args.port}")
+    ThreadingHTTPServer((args.host, args.port), handler).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
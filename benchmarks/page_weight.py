@@ -0,0 +1,125 @@
+"""
+Page weight: the Tailwind runtime script vs the compiled stylesheet.
+
+    python -m benchmarks.page_weight
+    python -m benchmarks.page_weight --json bench/page_weight.json
+    python -m benchmarks.page_weight --max-css-kb 12     # exit 1 above this (brotli), for CI
+
+Lighthouse-style numbers for every page that links css/drivemate.css, before
+(the Tailwind 3.4.17 Play CDN script in DriveMate/tailwind/, which the pages
+used to load from /static and which then generated the CSS in the browser)
+and after (the stylesheet built by `manage.py build_css`):
+
+  * transfer size of the render-blocking styling resource, raw, gzip and
+    brotli (before this change static files were served uncompressed);
+  * total byte weight of the page: the template (gzip, a lower bound for the
+    rendered HTML) plus that resource as served;
+  * an estimated fetch time on Lighthouse's simulated mobile network
+    (slow 4G: 150 ms RTT, 1.6 Mbps down), as in its "render-blocking
+    resources" audit.
+
+Nothing is served or rendered; run `manage.py build_css` first.
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+RUNTIME = BASE_DIR / "DriveMate" / "tailwind" / "tailwind-3.4.17.js"
+RTT_S = 0.150
+THROUGHPUT_BPS = 1.6 * 1024 * 1024  # Lighthouse mobile throttling: 1.6 Mbps down
+
+
+def setup_django():
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "DriveMate.settings")
+    import django
+    django.setup()
+
+
+def sizes(data):
+    result = {"raw": len(data), "gzip": len(gzip.compress(data, 9))}
+    try:
+        import brotli
+    except ImportError:
+        result["brotli"] = None
+    else:
+        result["brotli"] = len(brotli.compress(data))
+    return result
+
+
+def served(size):
+    """What a browser downloads: brotli when the server has it, else gzip."""
+    return size["brotli"] if size["brotli"] is not None else size["gzip"]
+
+
+def fetch_ms(nbytes):
+    return round((RTT_S + nbytes * 8 / THROUGHPUT_BPS) * 1000)
+
+
+def measure():
+    from DriveMate.assets import CSS_OUTPUT, template_files
+
+    runtime, css = sizes(RUNTIME.read_bytes()), sizes(CSS_OUTPUT.read_bytes())
+    pages = []
+    for path in template_files():
+        text = path.read_bytes()
+        if b"css/drivemate.css" not in text:
+            continue
+        html = len(gzip.compress(text, 9))
+        pages.append({
+            "page": str(path.relative_to(BASE_DIR)),
+            "html_gzip": html,
+            # before: the script was served as-is; after: the .br copy
+            "before": html + runtime["raw"],
+            "after": html + served(css),
+        })
+    return {
+        "resources": {"before": {"name": "tailwind.js", **runtime}, "after": {"name": CSS_OUTPUT.name, **css}},
+        "fetch_ms": {"before": fetch_ms(runtime["raw"]), "after": fetch_ms(served(css))},
+        "pages": pages,
+    }
+
+
+def kb(n):
+    return "-" if n is None else f"{n / 1024:.1f}"
+
+
+def report(result):
+    print(f"{'resource':<32}{'raw KB':>10}{'gzip KB':>10}{'brotli KB':>11}{'fetch ms':>10}")
+    for when in ("before", "after"):
+        res = result["resources"][when]
+        print(f"{when + ': ' + res['name']:<32}{kb(res['raw']):>10}{kb(res['gzip']):>10}"
+              f"{kb(res['brotli']):>11}{result['fetch_ms'][when]:>10}")
+    print()
+    print(f"{'page (total byte weight)':<44}{'before KB':>11}{'after KB':>10}{'saved':>8}")
+    for page in result["pages"]:
+        saved = 1 - page["after"] / page["before"]
+        print(f"{page['page']:<44}{kb(page['before']):>11}{kb(page['after']):>10}{saved:>8.0%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--max-css-kb", type=float,
+                        help="exit with status 1 if the compressed stylesheet is larger than this")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    result = measure()
+    report(result)
+    if args.json:
+        Path(args.json).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.json).write_text(json.dumps(result, indent=2))
+    css = served(result["resources"]["after"])
+    if args.max_css_kb is not None and css > args.max_css_kb * 1024:
+        print(f"\ncss/drivemate.css is {kb(css)} KB compressed, over the {args.max_css_kb} KB budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+SQLite reader/writer throughput: Django defaults vs settings.SQLITE_PRAGMAS.
+
+    python -m benchmarks.sqlite_concurrency --readers 8 --writers 2 --seconds 5
+
+Runs the same mixed workload twice against a scratch database file shaped like
+the ride_request table: readers run driver_dashboard style "pending requests
+for a driver" queries, writers insert requests and flip statuses in short
+transactions (like select_driver and accept_ride_request). The first run uses
+Django's defaults (rollback journal, deferred transactions), the second applies
+the same PRAGMAs as DriveMate/sqlite.py under gunicorn (SQLITE_WAL) plus
+BEGIN IMMEDIATE.
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from DriveMate.sqlite import DEFAULT_PRAGMAS, WAL_PRAGMAS, apply_pragmas  # noqa: E402
+
+N_DRIVERS = 500
+SCHEMA = """
+CREATE TABLE ride_request (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ride_id INTEGER NOT NULL,
+    driver_id INTEGER NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    requested_at REAL NOT NULL
+);
+CREATE INDEX rr_driver ON ride_request (driver_id);
+"""
+
+
+def prepare(path, rows):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    rng = random.Random(1)
+    conn.executemany(
+        "INSERT INTO ride_request (ride_id, driver_id, status, requested_at) VALUES (?, ?, ?, ?)",
+        [(i, rng.randrange(N_DRIVERS), rng.choice(["pending", "accepted", "auto_cancelled"]), time.time())
+         for i in range(rows)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def connect(path, tuned):
+    # isolation_level=None: we issue BEGIN ourselves, like Django's atomic()
+    conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+    if tuned:
+        apply_pragmas(conn.cursor(), {**WAL_PRAGMAS, **DEFAULT_PRAGMAS})
+    return conn
+
+
+def reader(path, tuned, stop, stats):
+    conn = connect(path, tuned)
+    rng = random.Random()
+    while not stop.is_set():
+        try:
+            conn.execute(
+                "SELECT id, ride_id, status FROM ride_request WHERE driver_id = ? AND status = 'pending' "
+                "ORDER BY requested_at DESC", (rng.randrange(N_DRIVERS),),
+            ).fetchall()
+            stats["reads"] += 1
+        except sqlite3.OperationalError:
+            stats["read_errors"] += 1
+    conn.close()
+
+
+def writer(path, tuned, stop, stats):
+    conn = connect(path, tuned)
+    rng = random.Random()
+    begin = "BEGIN IMMEDIATE" if tuned else "BEGIN"
+    while not stop.is_set():
+        try:
+            conn.execute(begin)
+            # read-then-write, like accept_ride_request
+            conn.execute("SELECT status FROM ride_request WHERE driver_id = ? LIMIT 1", (rng.randrange(N_DRIVERS),))
+            conn.execute(
+                "INSERT INTO ride_request (ride_id, driver_id, status, requested_at) VALUES (?, ?, 'pending', ?)",
+                (rng.randrange(10**6), rng.randrange(N_DRIVERS), time.time()),
+            )
+            conn.execute("UPDATE ride_request SET status = 'accepted' WHERE id = ?", (rng.randrange(1, 10000),))
+            conn.execute("COMMIT")
+            stats["writes"] += 1
+        except sqlite3.OperationalError:
+            stats["write_errors"] += 1
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+    conn.close()
+
+
+def run(tuned, readers, writers, seconds, rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.sqlite3")
+        prepare(path, rows)
+        stop = threading.Event()
+        per_thread = [dict(reads=0, writes=0, read_errors=0, write_errors=0) for _ in range(readers + writers)]
+        threads = [threading.Thread(target=reader, args=(path, tuned, stop, per_thread[i])) for i in range(readers)]
+        threads += [threading.Thread(target=writer, args=(path, tuned, stop, per_thread[readers + i])) for i in range(writers)]
+        for t in threads:
+            t.start()
+        time.sleep(seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+    totals = {k: sum(s[k] for s in per_thread) for k in per_thread[0]}
+    return {
+        "reads_per_s": round(totals["reads"] / seconds, 1),
+        "writes_per_s": round(totals["writes"] / seconds, 1),
+        "read_errors": totals["read_errors"],
+        "write_errors": totals["write_errors"],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--out", help="write results JSON here")
+    args = parser.parse_args(argv)
+
+    results = {
+        "default": run(False, args.readers, args.writers, args.seconds, args.rows),
+        "tuned": run(True, args.readers, args.writers, args.seconds, args.rows),
+    }
+    print(f"{'profile':10} {'reads/s':>10} {'writes/s':>10} {'read err':>9} {'write err':>10}")
+    for name, r in results.items():
+        print(f"{name:10} {r['reads_per_s']:>10} {r['writes_per_s']:>10} {r['read_errors']:>9} {r['write_errors']:>10}")
+    if args.out:
+        Path(args.out).write_text(json.dumps({"config": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
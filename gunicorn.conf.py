@@ -0,0 +1,121 @@
+"""
+Production entry point:
+
+    gunicorn -c gunicorn.conf.py
+
+Django, the URLconf, every view and every project template are loaded once in
+the master (preload_app + DriveMate.warmup), which then forks WEB_WORKERS
+workers. The workers share that memory copy-on-write and can serve as soon as
+they are forked. They are uvicorn workers, serving DriveMate.asgi with its
+WebSocket endpoints (WEB_WORKER_CLASS). Each worker is recycled after WEB_MAX_REQUESTS requests
+(plus up to WEB_MAX_REQUESTS_JITTER, so they do not all restart at once).
+Worker settings live in DriveMate/settings.py.
+
+Unless WEB_SIDECARS=0, the master also runs `manage.py run_pubsub_broker` and
+`manage.py run_workers` next to the web workers and restarts either if it
+exits: SOS alerts, fares and ride request expiry are jobs, and their pushes
+reach the WebSockets in the web workers through the broker, so the site is
+not complete without them. PUBSUB_BROKER_SOCKET defaults to a path under
+/tmp for this.
+"""
+import gc
+import os
+import subprocess
+import sys
+import threading
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "DriveMate.settings")
+os.environ.setdefault("SQLITE_WAL", "1")  # serving: readers must not wait on writers (DriveMate/sqlite.py)
+# every worker and sidecar adds its metrics there, so any worker's /metrics shows the whole server
+os.environ.setdefault("METRICS_DIR", f"/tmp/drivemate-metrics-{os.environ.get('PORT', '8000')}")
+if os.environ.get("WEB_SIDECARS", "1") == "1":
+    # job workers are separate processes: their pushes must go through the broker
+    os.environ.setdefault("PUBSUB_BROKER_SOCKET", f"/tmp/drivemate-pubsub-{os.environ.get('PORT', '8000')}.sock")
+
+from django.conf import settings  # noqa: E402
+
+bind = os.environ.get("BIND", f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+preload_app = True
+workers = settings.WEB_WORKERS
+worker_class = settings.WEB_WORKER_CLASS
+threads = settings.WEB_THREADS
+max_requests = settings.WEB_MAX_REQUESTS
+max_requests_jitter = settings.WEB_MAX_REQUESTS_JITTER
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+accesslog = "-"
+
+# uvicorn's gunicorn worker class serves the ASGI app, the built-in ones WSGI
+wsgi_app = "DriveMate.asgi:application" if worker_class.startswith("uvicorn") else "DriveMate.wsgi:application"
+if settings.WEB_SIDECARS and wsgi_app == "DriveMate.wsgi:application":
+    # the jobs would push SOS alerts and ride requests to WebSockets nobody can open
+    raise RuntimeError(
+        f"WEB_WORKER_CLASS={worker_class} serves WSGI only, so /ws/admin/sos/ and /ws/driver/inbox/ do not exist "
+        "and every SOS alert would miss its delivery SLO. Use an ASGI worker class "
+        "(uvicorn.workers.UvicornWorker), or set WEB_SIDECARS=0 and serve DriveMate.asgi elsewhere."
+    )
+
+
+def when_ready(server):
+    from django.db import connections
+    from DriveMate import metrics
+    from DriveMate.warmup import warm_up
+
+    metrics.clear_directory()  # counts from a previous run of the server
+    stats = warm_up()
+    server.log.info("Warm-up: %(views)d views, %(templates)d templates in %(ms).0f ms", stats)
+    # never share a database socket across fork
+    connections.close_all()
+    # keep the collector from touching (and so copying) the preloaded objects in every worker
+    gc.freeze()
+    if settings.WEB_SIDECARS:
+        _sidecars.start(server)
+
+
+def on_exit(server):
+    _sidecars.stop()
+
+
+class Sidecars:
+    """run_pubsub_broker and run_workers, restarted by the master if they exit."""
+
+    COMMANDS = (["run_pubsub_broker"], ["run_workers"])
+    RESTART_DELAY = 1.0
+
+    def __init__(self):
+        self.processes = {}
+        self.stopping = threading.Event()
+
+    def start(self, server):
+        self.log = server.log
+        for command in self.COMMANDS:
+            self.spawn(command)
+        threading.Thread(target=self.watch, name="sidecars", daemon=True).start()
+
+    def spawn(self, command):
+        manage = os.path.join(os.path.dirname(os.path.abspath(__file__)), "manage.py")
+        self.processes[command[0]] = subprocess.Popen([sys.executable, manage, *command])
+        self.log.info("Started %s (pid: %s)", command[0], self.processes[command[0]].pid)
+
+    def watch(self):
+        while not self.stopping.wait(self.RESTART_DELAY):
+            for command in self.COMMANDS:
+                process = self.processes[command[0]]
+                # the arbiter reaps every child, so an exit shows up here as returncode 0
+                if process.poll() is not None and not self.stopping.is_set():
+                    self.log.error("%s exited (%s); restarting", command[0], process.returncode)
+                    self.spawn(command)
+
+    def stop(self):
+        self.stopping.set()
+        for process in self.processes.values():
+            process.terminate()  # run_workers lets running jobs finish
+        for process in self.processes.values():
+            try:
+                process.wait(30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+_sidecars = Sidecars()
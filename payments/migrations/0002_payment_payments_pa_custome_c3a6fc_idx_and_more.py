@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_driver_accounts_dr_is_avai_d24654_idx'),
+        ('payments', '0001_initial'),
+        ('rides', '0007_ride_rides_ride_custome_73e1dc_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['customer', 'created_at'], name='payments_pa_custome_c3a6fc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['ride', 'status'], name='payments_pa_ride_id_425513_idx'),
+        ),
+    ]
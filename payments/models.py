@@ -50,6 +50,8 @@ class Payment(models.Model):
             models.Index(fields=["status", "created_at"]),
             models.Index(fields=["order_id"]),
             models.Index(fields=["transaction_id"]),
+            models.Index(fields=["customer", "created_at"]),  # payment history
+            models.Index(fields=["ride", "status"]),
         ]
 
     def __str__(self):
@@ -1,3 +1,75 @@
+from decimal import Decimal
+
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+
+from DriveMate import jobs
+from accounts.models import Job
+from accounts.tests import seed_dataset
+from rides.models import Ride, RideRequest
+
+
+class FareTests(TestCase):
+    def setUp(self):
+        data = seed_dataset(n_drivers=2, n_rides=0)
+        self.customer, self.driver, self.ride = data["customer"], data["driver"], data["ride"]
+
+    def login(self, user):
+        session = self.client.session
+        session["user_id"], session["user_role"] = user.id, user.role
+        session.save()
+
+    def test_payment_page_only_reads_a_stored_fare(self):
+        self.login(self.customer)
+        url = reverse("ride_payment", args=[self.ride.id])
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertContains(self.client.get(url), "525.00")
+        self.assertFalse(any(q["sql"].startswith('UPDATE "rides_ride"') for q in ctx.captured_queries))
+
+    def test_payment_page_stores_a_missing_fare_once(self):
+        self.login(self.customer)
+        url = reverse("ride_payment", args=[self.ride.id])
+        Ride.objects.filter(pk=self.ride.pk).update(base_fare=None, tax_amount=None, total_amount=None)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Job.objects.filter(key__startswith="fare:").exists())
+        total = Ride.objects.get(pk=self.ride.pk).total_amount
+        self.assertIsNotNone(total)
+        self.assertContains(response, f'amount">{total}<')
+
+        # a fare stored meanwhile (e.g. by the job) wins over this calculation
+        ride = Ride.objects.select_related("driver").get(pk=self.ride.pk)
+        ride.total_amount = None
+        Ride.objects.filter(pk=ride.pk).update(total_amount=Decimal("105.00"))
+        self.assertEqual(ride.fill_fare(), Decimal("105.00"))
+
+    def test_fare_is_queued_once_when_the_trip_starts(self):
+        ride = Ride.objects.create(
+            customer=self.customer, driver=self.driver, ride_mode=Ride.Mode.DRIVER_ONLY, status=Ride.Status.ACCEPTED,
+            start_location="MG Road, Kochi", start_latitude=Decimal("9.97"), start_longitude=Decimal("76.28"),
+            end_location="Airport, Kochi", end_latitude=Decimal("10.15"), end_longitude=Decimal("76.39"),
+        )
+        ride_request = RideRequest.objects.create(ride=ride, driver=self.driver, status=RideRequest.Status.ACCEPTED)
+        self.login(self.driver.user)
+        self.assertEqual(self.client.post(reverse("set_ride_request_ongoing", args=[ride_request.pk])).status_code, 200)
+        self.assertEqual(Job.objects.filter(key__startswith="fare:").get().key, f"fare:{ride.pk}")
+
+        self.login(self.customer)
+        self.client.get(reverse("ride_payment", args=[ride.id]))
+        self.assertEqual(Job.objects.filter(key__startswith="fare:").count(), 1)
+
+        jobs.run_pending(["default"])
+        ride.refresh_from_db()
+        self.assertIsNotNone(ride.total_amount)
 
-# Create your tests here.
+    def test_create_transaction_leaves_the_fare_alone(self):
+        self.login(self.customer)
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post(reverse("create_transaction"),
+                                    {"ride_id": self.ride.id, "method": "upi", "amount": "525.00"})
+        self.assertEqual(resp.status_code, 200)
+        updates = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith('UPDATE "rides_ride"')]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn("total_amount", updates[0])
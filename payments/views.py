@@ -1,6 +1,8 @@
 from django.shortcuts import render
 from accounts.models import Driver
-from accounts.views import login_required_role
+from accounts.decorators import login_required_role
+from DriveMate.perf import query_budget
+from DriveMate.routers import use_replica
 import uuid
 from decimal import Decimal
 from django.shortcuts import render, get_object_or_404, redirect
@@ -16,6 +18,7 @@ from rides.models import Ride, RideRequest
 
 
 # show payment page for a completed ride
+@query_budget(8)
 @login_required_role(allowed_roles=['customer'])
 def payment_page(request, ride_id):
     uid = request.session.get('user_id')
@@ -27,11 +30,10 @@ def payment_page(request, ride_id):
         messages.error(request, "Payment is available only after the driver has completed the ride.")
         return redirect('trip_detail', ride_id=ride.id)
 
-    # Ensure fare is calculated
+    # the fare is stored by end_ride_request, or by the store_fare job queued
+    # when the trip started; if neither has happened yet, store it here
     if ride.total_amount is None:
-        # calculate_fare sets base_fare, tax_amount and total_amount on self
-        ride.calculate_fare()
-        ride.save(update_fields=['base_fare', 'tax_amount', 'total_amount', 'updated_at'])
+        ride.fill_fare()
 
     payments = ride.payments.all().order_by('-created_at')  # recent payments for the ride
 
@@ -45,6 +47,7 @@ def payment_page(request, ride_id):
 
 
 # create transaction (called by JS to begin a payment)
+@query_budget(8)
 @require_POST
 @login_required_role(allowed_roles=['customer'])
 def create_transaction(request):
@@ -95,7 +98,7 @@ def create_transaction(request):
         )
 
     # Simulate provider-specific payloads:
-    ride.save()
+    ride.save(update_fields=['status', 'updated_at'])
     upi_deeplink = f"upi://pay?pa=merchant@upi&pn=Ride+Payment&am={amount_dec}&cu=INR&tr={payment.id}"
     response = {
         'tx_id': payment.id,
@@ -104,6 +107,7 @@ def create_transaction(request):
     }
     return JsonResponse(response)
 
+@query_budget(3)
 @require_POST
 @login_required_role(allowed_roles=['customer'])
 def finalize_transaction(request):
@@ -133,10 +137,16 @@ def finalize_transaction(request):
     return JsonResponse({'ok': True, 'tx_id': payment.id, 'paid_at': payment.paid_at.isoformat()})
 
 
+@query_budget(2, max_db_ms=100)
+@use_replica
 @login_required_role(allowed_roles=['customer'])
 def customer_payment_history(request):
     uid = request.session.get('user_id')  # get logged-in customer ID
-    payments = Payment.objects.filter(customer_id=uid).order_by('-created_at')
+    payments = (
+        Payment.objects.filter(customer_id=uid)
+        .select_related('ride__driver__user', 'subscription')
+        .order_by('-created_at')
+    )
 
     context = {
         'payments': payments,
@@ -145,13 +155,19 @@ def customer_payment_history(request):
     return render(request, 'customer_payment_history.html', context)
 
 # View for Driver Payment History
+@query_budget(2)
+@use_replica
 @login_required_role(allowed_roles=['driver'])
 def driver_payment_history(request):
     try:
         # Get the driver's profile
         driver = request.session.get('user_id')
         # Fetch payments associated with rides driven by this driver
-        payments = Payment.objects.filter(ride__driver=driver).order_by('-created_at')
+        payments = (
+            Payment.objects.filter(ride__driver=driver)
+            .select_related('ride', 'customer')
+            .order_by('-created_at')
+        )
         context = {
             'payments': payments,
             'user_role': 'driver',
@@ -0,0 +1,167 @@
+"""
+Finding drivers for a ride, and expiring the requests drivers never answer.
+
+Auto dispatch (start_auto_dispatch, from select_driver): instead of the
+customer asking drivers one by one, the ride is offered to the
+AUTO_DISPATCH_WAVE_SIZE nearest eligible drivers at once, one bulk INSERT.
+If nobody has accepted AUTO_DISPATCH_WAVE_TIMEOUT seconds later, a job
+offers it to the next nearest ones, up to AUTO_DISPATCH_MAX_WAVES waves;
+earlier offers stay open meanwhile. The first driver to accept wins through
+RideRequest.accept's conditional UPDATE, and the other requests are closed
+by one UPDATE in the cancel_losing_requests job. Ride.dispatched_at marks
+these rides and is where drivemate_ride_time_to_match_seconds starts.
+
+A PENDING RideRequest older than RIDE_REQUEST_TIMEOUT is auto-cancelled by
+expire_stale_requests(), which the job worker runs every few seconds
+(JOB_SCHEDULE). The stale rows are found through the (status, requested_at)
+index and closed RIDE_REQUEST_SWEEP_BATCH at a time, each batch one UPDATE,
+so a sweep costs O(expired) however many requests have piled up. With
+RIDE_REQUEST_REDISPATCH, a ride left without a pending request is offered
+to the nearest eligible driver who has not been asked yet, up to
+RIDE_REQUEST_MAX_PER_RIDE requests per ride (auto-dispatched rides have
+their waves instead).
+
+Requests created or closed here are announced with the requests_offered and
+requests_closed signals (rides/signals.py) once committed.
+"""
+import heapq
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from accounts.models import Driver
+from DriveMate import metrics
+from DriveMate.jobs import enqueue
+from vehicles.models import Vehicle
+from .models import Ride, RideRequest
+from .signals import requests_offered
+from .utils import haversine_distance
+
+
+def eligible_drivers(ride):
+    """Drivers who could take this ride now, with a known position."""
+    drivers = Driver.objects.filter(is_available=True, verified=True, background_check_passed=True,
+                                    latitude__isnull=False, longitude__isnull=False)
+    if ride.female_driver_preference:
+        drivers = drivers.filter(user__gender="female")
+    if ride.ride_mode == Ride.Mode.CAR_WITH_DRIVER:
+        drivers = drivers.filter(Exists(Vehicle.objects.filter(current_driver=OuterRef("pk"), active=True, verified=True)))
+    on_a_ride = RideRequest.objects.filter(driver=OuterRef("pk"), status=RideRequest.Status.ACCEPTED,
+                                           ride__status__in=[Ride.Status.ACCEPTED, Ride.Status.ONGOING])
+    return drivers.filter(~Exists(on_a_ride))
+
+
+def nearest_drivers(ride, k, exclude=()):
+    """Up to k eligible drivers closest to the pickup, nearest first, as (distance in km, driver)."""
+    if ride.start_latitude is None or ride.start_longitude is None or k <= 0:
+        return []
+    candidates = eligible_drivers(ride).exclude(pk__in=exclude).only("id", "user_id", "latitude", "longitude")
+    nearest = heapq.nsmallest(k, (
+        (haversine_distance(ride.start_latitude, ride.start_longitude, d.latitude, d.longitude), d.pk, d)
+        for d in candidates.iterator()
+    ))
+    return [(distance, driver) for distance, _, driver in nearest]
+
+
+def expire_stale_requests(timeout=None, batch_size=None, redispatch=None, now=None):
+    """Auto-cancel PENDING requests older than `timeout` seconds. Returns (expired, redispatched)."""
+    now = now or timezone.now()
+    timeout = settings.RIDE_REQUEST_TIMEOUT if timeout is None else timeout
+    batch_size = batch_size or settings.RIDE_REQUEST_SWEEP_BATCH
+    redispatch = settings.RIDE_REQUEST_REDISPATCH if redispatch is None else redispatch
+
+    stale = RideRequest.objects.filter(status=RideRequest.Status.PENDING, requested_at__lt=now - timedelta(seconds=timeout))
+    expired, ride_ids = 0, set()
+    while True:
+        batch = list(stale.order_by("requested_at").values_list("pk", "ride_id")[:batch_size])
+        if not batch:
+            break
+        # status stays in the WHERE: a driver accepting in the meantime wins over the sweeper
+        expired += RideRequest.objects.filter(pk__in=[pk for pk, _ in batch], status=RideRequest.Status.PENDING).close(
+            now=now
+        )
+        ride_ids.update(ride_id for _, ride_id in batch)
+        if len(batch) < batch_size:
+            break
+    metrics.inc("drivemate_ride_requests_expired_total", value=expired)
+
+    redispatched = redispatch_rides(ride_ids, now) if redispatch and ride_ids else 0
+    return expired, redispatched
+
+
+def redispatch_rides(ride_ids, now=None):
+    """Offer each ride that is still open, and that no driver is left to answer, to its next nearest driver."""
+    now = now or timezone.now()
+    pending = RideRequest.objects.filter(ride=OuterRef("pk"), status=RideRequest.Status.PENDING)
+    rides = list(Ride.objects.filter(pk__in=ride_ids, status=Ride.Status.REQUESTED, dispatched_at__isnull=True)
+                 .filter(~Exists(pending)))
+    asked = {}
+    for ride_id, driver_id in RideRequest.objects.filter(ride__in=rides).values_list("ride_id", "driver_id"):
+        asked.setdefault(ride_id, set()).add(driver_id)
+
+    offers = []
+    for ride in rides:
+        already = asked.get(ride.pk, set())
+        if len(already) >= settings.RIDE_REQUEST_MAX_PER_RIDE:
+            continue
+        for _, driver in nearest_drivers(ride, 1, exclude=already):
+            offers.append(RideRequest(ride=ride, driver=driver, status=RideRequest.Status.PENDING, requested_at=now))
+    _offer(offers)
+    metrics.inc("drivemate_ride_requests_redispatched_total", value=len(offers))
+    return len(offers)
+
+
+def _offer(requests):
+    """Insert new PENDING requests in one statement and announce them after commit."""
+    # unique (ride, driver): a request the customer sent meanwhile is kept
+    RideRequest.objects.bulk_create(requests, ignore_conflicts=True)
+    by_ride = {}
+    for rr in requests:
+        by_ride.setdefault(rr.ride_id, (rr.ride, []))[1].append(rr.driver_id)
+    for ride, driver_ids in by_ride.values():
+        transaction.on_commit(
+            lambda ride=ride, driver_ids=driver_ids: requests_offered.send(sender=Ride, ride=ride, driver_ids=driver_ids)
+        )
+
+
+def start_auto_dispatch(ride):
+    """Put an open ride in auto dispatch and send the first wave. Returns the drivers asked (0 if already started)."""
+    now = timezone.now()
+    with transaction.atomic():
+        if not Ride.objects.filter(pk=ride.pk, status=Ride.Status.REQUESTED, dispatched_at__isnull=True).update(
+            dispatched_at=now, updated_at=now
+        ):
+            return 0
+        ride.dispatched_at = now
+        return send_wave(ride, 1, now)
+
+
+def send_wave(ride, wave, now=None):
+    """Offer the ride to the next AUTO_DISPATCH_WAVE_SIZE nearest drivers not asked yet, and time the next wave."""
+    now = now or timezone.now()
+    asked = set(RideRequest.objects.filter(ride=ride).values_list("driver_id", flat=True))
+    offers = [
+        RideRequest(ride=ride, driver=driver, status=RideRequest.Status.PENDING, requested_at=now)
+        for _, driver in nearest_drivers(ride, settings.AUTO_DISPATCH_WAVE_SIZE, exclude=asked)
+    ]
+    _offer(offers)
+    metrics.inc("drivemate_dispatch_waves_total", (("result", "sent"),))
+    from .tasks import widen_dispatch
+    enqueue(widen_dispatch, key=f"dispatch:{ride.pk}:{wave + 1}",
+            delay=timedelta(seconds=settings.AUTO_DISPATCH_WAVE_TIMEOUT), ride_id=ride.pk, wave=wave + 1)
+    return len(offers)
+
+
+def widen(ride_id, wave):
+    """Send wave number `wave` if the ride is still waiting for a driver. Returns the drivers asked."""
+    ride = Ride.objects.filter(pk=ride_id, status=Ride.Status.REQUESTED, dispatched_at__isnull=False).first()
+    if ride is None:
+        return 0  # matched or cancelled meanwhile
+    if wave > settings.AUTO_DISPATCH_MAX_WAVES:
+        metrics.inc("drivemate_dispatch_waves_total", (("result", "exhausted"),))
+        return 0  # the offers already out stay open until they expire
+    with transaction.atomic():
+        return send_wave(ride, wave)
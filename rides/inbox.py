@@ -0,0 +1,94 @@
+"""
+The driver's request inbox, pushed over a WebSocket (/ws/driver/inbox/).
+
+driver_home and the requests list open the socket. Each driver subscribes
+to the pub/sub channel "driver:<id>" (DriveMate/pubsub.py); the model
+signals below publish to it after commit:
+
+    request.new     a PENDING request for the driver (post_save on create,
+                    requests_offered for auto-dispatch waves)
+    request.status  a request saved with a new status (post_save)
+    request.closed  requests closed in bulk: the ride was taken, cancelled
+                    or the request expired (requests_closed)
+
+Messages carry what the page needs to show them, so an open inbox costs no
+queries: one session read and one driver lookup on connect, then nothing
+until an event arrives.
+"""
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models.signals import post_save
+
+from accounts.models import Driver
+from DriveMate import metrics, pubsub
+from DriveMate.websocket import FORBIDDEN, relay
+from .models import RideRequest
+from .signals import requests_closed, requests_offered
+
+
+def driver_channel(driver_id):
+    return f"driver:{driver_id}"
+
+
+def request_message(rr, ride):
+    return {
+        "type": "request.new",
+        "id": rr.pk,
+        "ride_id": ride.pk,
+        "pickup": ride.start_location,
+        "drop": ride.end_location,
+        "mode": ride.get_ride_mode_display(),
+        "requested_at": rr.requested_at.isoformat(),
+    }
+
+
+def _publish(driver_id, message):
+    pubsub.publish(driver_channel(driver_id), message)
+    metrics.inc("drivemate_inbox_messages_total", (("type", message["type"]),))
+
+
+def _on_request_saved(sender, instance, created, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    if created:
+        if instance.status != RideRequest.Status.PENDING:
+            return
+        message = request_message(instance, instance.ride)
+    else:
+        message = {"type": "request.status", "id": instance.pk, "status": instance.status}
+    transaction.on_commit(lambda: _publish(instance.driver_id, message), using=using)
+
+
+def _on_requests_offered(sender, ride, driver_ids, **kwargs):
+    offered = RideRequest.objects.filter(ride=ride, driver_id__in=driver_ids, status=RideRequest.Status.PENDING)
+    for rr in offered.only("id", "driver_id", "requested_at"):
+        _publish(rr.driver_id, request_message(rr, ride))
+
+
+def _on_requests_closed(sender, requests, status, **kwargs):
+    for pk, driver_id in requests:
+        _publish(driver_id, {"type": "request.closed", "id": pk, "status": status})
+
+
+def connect_signals():
+    post_save.connect(_on_request_saved, sender=RideRequest, dispatch_uid="drivemate_inbox_saved")
+    requests_offered.connect(_on_requests_offered, dispatch_uid="drivemate_inbox_offered")
+    requests_closed.connect(_on_requests_closed, dispatch_uid="drivemate_inbox_closed")
+
+
+def _driver_id(user_id):
+    return Driver.objects.filter(user_id=user_id).values_list("pk", flat=True).first()
+
+
+async def driver_inbox(socket):
+    """Push the signed-in driver's request events until the page goes away."""
+    session = await socket.session()
+    driver_id = None
+    if socket.same_origin() and session.get("user_role") == "driver":
+        driver_id = await sync_to_async(_driver_id)(session.get("user_id"))
+    if driver_id is None:
+        return await socket.close(FORBIDDEN)
+
+    await socket.accept()
+    async with pubsub.subscribe(driver_channel(driver_id)) as inbox:
+        await relay(socket, inbox)
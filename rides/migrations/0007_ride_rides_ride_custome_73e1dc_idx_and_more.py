@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_driver_accounts_dr_is_avai_d24654_idx'),
+        ('rides', '0006_alter_riderequest_status'),
+        ('vehicles', '0003_vehicle_vehicles_ve_current_26181b_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ride',
+            index=models.Index(fields=['customer', 'status', 'end_time'], name='rides_ride_custome_73e1dc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ride',
+            index=models.Index(fields=['customer', 'created_at'], name='rides_ride_custome_d76719_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='riderequest',
+            index=models.Index(fields=['driver', 'status', 'requested_at'], name='rides_rider_driver__b5e015_idx'),
+        ),
+    ]
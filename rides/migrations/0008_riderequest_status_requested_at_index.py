@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_job'),
+        ('rides', '0007_ride_rides_ride_custome_73e1dc_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='riderequest',
+            index=models.Index(fields=['status', 'requested_at'], name='rides_rider_status_c80002_idx'),
+        ),
+    ]
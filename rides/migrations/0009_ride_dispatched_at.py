@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rides', '0008_riderequest_status_requested_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ride',
+            name='dispatched_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rides', '0009_ride_dispatched_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sosalert',
+            name='delivered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='sosalert',
+            name='escalated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='sosalert',
+            name='tracking_snapshot',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddIndex(
+            model_name='sosalert',
+            index=models.Index(fields=['resolved', 'triggered_at'], name='rides_sosal_resolve_2ec922_idx'),
+        ),
+    ]
@@ -1,5 +1,5 @@
 from decimal import Decimal
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Q
 from django.utils import timezone
 
@@ -45,6 +45,8 @@ class Ride(models.Model):
     status = models.CharField(max_length=20, choices=Status.choices, default=Status.REQUESTED)
 
     female_driver_preference = models.BooleanField(default=False)
+    # set when the customer lets rides/dispatch.py pick drivers (auto dispatch)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
 
     purpose = models.ForeignKey(RidePurpose, on_delete=models.SET_NULL, null=True, blank=True, related_name="rides")
 
@@ -63,7 +65,11 @@ class Ride(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        indexes = [models.Index(fields=["status", "start_time"])]
+        indexes = [
+            models.Index(fields=["status", "start_time"]),
+            models.Index(fields=["customer", "status", "end_time"]),  # customer_dashboard recent ride
+            models.Index(fields=["customer", "created_at"]),  # my_trips
+        ]
 
     def __str__(self):
         return f"Ride #{self.pk} - {self.customer.name} ({self.get_status_display()})"
@@ -92,6 +98,51 @@ class Ride(models.Model):
 
         return self.total_amount
 
+    def fill_fare(self):
+        """
+        Store calculate_fare() unless a fare is stored already, with one UPDATE
+        guarded on total_amount IS NULL. If someone else stored one first, this
+        instance is reloaded with theirs. Returns the stored total.
+        """
+        self.calculate_fare()
+        # as the columns keep them, so the page shows what was stored
+        cents = Decimal("0.01")
+        self.base_fare, self.tax_amount, self.total_amount = (
+            Decimal(value or 0).quantize(cents) for value in (self.base_fare, self.tax_amount, self.total_amount))
+        stored = Ride.objects.filter(pk=self.pk, total_amount__isnull=True).update(
+            base_fare=self.base_fare, tax_amount=self.tax_amount, total_amount=self.total_amount,
+            updated_at=timezone.now(),
+        )
+        if not stored:
+            self.refresh_from_db(fields=["base_fare", "tax_amount", "total_amount"])
+        return self.total_amount
+
+class RideRequestQuerySet(models.QuerySet):
+    def close(self, status=None, now=None):
+        """
+        Close these requests with one UPDATE (keeping this queryset's filters
+        in its WHERE) and send requests_closed after commit for the rows it
+        changed. Returns the count.
+        """
+        status = status or RideRequest.Status.AUTO_CANCELLED
+        now = now or timezone.now()
+        with transaction.atomic(using=self.db):
+            closing = list(self.values_list("pk", "driver_id"))
+            if not closing:
+                return 0
+            closed = self.filter(pk__in=[pk for pk, _ in closing]).update(status=status, responded_at=now)
+            if closed < len(closing):
+                # some rows stopped matching between the read and the UPDATE (a driver
+                # accepted one) and were left alone; only the rows it stamped are news
+                closing = list(RideRequest.objects.using(self.db).filter(
+                    pk__in=[pk for pk, _ in closing], status=status, responded_at=now).values_list("pk", "driver_id"))
+        from .signals import requests_closed
+        if closing:
+            transaction.on_commit(lambda: requests_closed.send(sender=RideRequest, requests=closing, status=status),
+                                  using=self.db)
+        return closed
+
+
 class RideRequest(models.Model):
     class Status(models.TextChoices):
         PENDING = "pending", "Pending"
@@ -106,12 +157,60 @@ class RideRequest(models.Model):
     requested_at = models.DateTimeField(default=timezone.now)
     responded_at = models.DateTimeField(null=True, blank=True)
 
+    objects = RideRequestQuerySet.as_manager()
+
     class Meta:
         unique_together = ("ride", "driver")  # prevent duplicate requests
+        indexes = [
+            # driver_dashboard / driver_requests_list
+            models.Index(fields=["driver", "status", "requested_at"]),
+            # expiry sweeper (rides/dispatch.py): oldest pending first
+            models.Index(fields=["status", "requested_at"]),
+        ]
 
     def __str__(self):
         return f"Ride #{self.ride_id} -> {self.driver.user.name} ({self.status})"
 
+    def accept(self, vehicle=None):
+        """
+        Try to win this request's ride for its driver. Returns False if another
+        driver got there first (or the request/ride is no longer open).
+
+        The ride's status acts as its version column: the conditional
+        UPDATE ... WHERE status='requested' matches for exactly one caller, so
+        concurrent drivers are settled by a single statement without row locks.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            won = Ride.objects.filter(pk=self.ride_id, status=Ride.Status.REQUESTED).update(
+                status=Ride.Status.ACCEPTED, driver_id=self.driver_id, vehicle=vehicle, updated_at=now
+            )
+            if not won:
+                return False
+            updated = RideRequest.objects.filter(pk=self.pk, status=RideRequest.Status.PENDING).update(
+                status=RideRequest.Status.ACCEPTED, responded_at=now
+            )
+            if not updated:
+                # our request was closed meanwhile: give the ride back
+                transaction.set_rollback(True)
+                return False
+            # the other pending requests can no longer win; a job closes them
+            from DriveMate.jobs import enqueue
+            from .tasks import cancel_losing_requests
+            enqueue(cancel_losing_requests, key=f"accept:{self.pk}", accepted_request_id=self.pk)
+
+        self.status = RideRequest.Status.ACCEPTED
+        self.responded_at = now
+        self._record_time_to_match(now)
+        return True
+
+    def _record_time_to_match(self, now):
+        from DriveMate import metrics
+        ride = self.ride  # callers usually select_related it
+        asked_at = ride.dispatched_at or ride.created_at
+        metrics.observe("drivemate_ride_time_to_match_seconds", max(0.0, (now - asked_at).total_seconds()),
+                        (("dispatch", "auto" if ride.dispatched_at else "manual"),))
+
 
 class SubscriptionPlan(models.Model):
     BILLING_PERIOD_CHOICES = (
@@ -188,5 +287,16 @@ class SOSAlert(models.Model):
     resolved = models.BooleanField(default=False)
     resolved_at = models.DateTimeField(null=True, blank=True)
 
+    # filled in by the SOS pipeline (rides/sos.py)
+    tracking_snapshot = models.JSONField(default=list, blank=True)  # latest RideTracking points, newest first
+    delivered_at = models.DateTimeField(null=True, blank=True)  # first pushed to an admin dashboard
+    escalated_at = models.DateTimeField(null=True, blank=True)  # missed the delivery SLO
+
+    class Meta:
+        indexes = [
+            # admin dashboard: open alerts; delivery SLO check
+            models.Index(fields=["resolved", "triggered_at"]),
+        ]
+
     def __str__(self):
         return f"SOS by {self.user.name} at {self.triggered_at:%Y-%m-%d %H:%M:%S}"
@@ -0,0 +1,11 @@
+"""
+Signals for ride requests created or closed in bulk, which send no
+post_save. Both are sent after the transaction commits.
+"""
+from django.dispatch import Signal
+
+# ride=, driver_ids=: new PENDING requests (bulk_create in rides/dispatch.py)
+requests_offered = Signal()
+
+# requests=[(pk, driver_id), ...], status=: requests closed by one UPDATE (RideRequestQuerySet.close)
+requests_closed = Signal()
@@ -0,0 +1,139 @@
+"""
+SOS alerts, from the button to the admin dashboards.
+
+1. trigger_sos (POST /api/sos/) writes the SOSAlert and its job in one
+   transaction and answers; nothing else happens on the request.
+2. process_sos runs on the 'sos' job queue, which has its own worker
+   threads, is claimed first and is polled every 100 ms (JOB_QUEUES,
+   JOB_POLL_INTERVALS), so an alert never waits behind rides, fares or
+   image renditions. It copies the ride's last SOS_TRACKING_POINTS
+   RideTracking points, as of the trigger, into the alert and publishes it
+   on the "admins:sos" channel (DriveMate/pubsub.py).
+3. admin_sos_feed, the WebSocket behind the admin dashboard, pushes it to
+   every open dashboard. The first delivery stamps delivered_at and records
+   trigger-to-delivery time in drivemate_sos_delivery_seconds.
+
+The SLO is SOS_DELIVERY_SLO seconds from trigger to first delivery. A slower
+delivery, or an alert no dashboard has received by then (check_sos_delivery,
+scheduled every few seconds, escalates each once and publishes it again), is
+logged as an error and counted in drivemate_sos_slo_breaches_total.
+"""
+import logging
+from datetime import datetime, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from DriveMate import metrics, pubsub
+from DriveMate.jobs import enqueue
+from DriveMate.websocket import FORBIDDEN, relay
+from .models import Ride, RideTracking, SOSAlert
+
+logger = logging.getLogger(__name__)
+
+ADMIN_CHANNEL = "admins:sos"
+
+
+def active_ride_for(user_id):
+    """The user's ride in progress (as customer or driver), if any."""
+    rides = Ride.objects.filter(status__in=[Ride.Status.ACCEPTED, Ride.Status.ONGOING]).order_by("-updated_at")
+    return (rides.filter(customer_id=user_id).first()
+            or rides.filter(driver__user_id=user_id).first())
+
+
+def raise_alert(user_id, role, ride=None, latitude=None, longitude=None, triggered_at=None):
+    """Record an SOS and queue it on the SOS lane. Returns the alert."""
+    with transaction.atomic():
+        alert = SOSAlert.objects.create(user_id=user_id, ride=ride, latitude=latitude, longitude=longitude,
+                                        triggered_at=triggered_at or timezone.now())
+        from .tasks import process_sos
+        enqueue(process_sos, key=f"sos:{alert.pk}", alert_id=alert.pk)
+    metrics.inc("drivemate_sos_alerts_total", (("role", role),))
+    return alert
+
+
+def tracking_snapshot(alert):
+    """The ride's latest tracking points up to the trigger, newest first."""
+    points = (RideTracking.objects.filter(ride_id=alert.ride_id, timestamp__lte=alert.triggered_at)
+              .order_by("-timestamp")
+              .values_list("latitude", "longitude", "speed_kmph", "heading_deg", "timestamp")[:settings.SOS_TRACKING_POINTS])
+    return [
+        {"lat": float(lat), "lng": float(lng), "speed_kmph": None if speed is None else float(speed),
+         "heading_deg": None if heading is None else float(heading), "at": at.isoformat()}
+        for lat, lng, speed, heading, at in points
+    ]
+
+
+def alert_message(alert):
+    return {
+        "type": "sos",
+        "id": alert.pk,
+        "user": alert.user.name,
+        "phone": alert.user.phone,
+        "ride_id": alert.ride_id,
+        "latitude": None if alert.latitude is None else float(alert.latitude),
+        "longitude": None if alert.longitude is None else float(alert.longitude),
+        "triggered_at": alert.triggered_at.isoformat(),
+        "tracking": alert.tracking_snapshot,
+    }
+
+
+def process(alert_id):
+    """Snapshot the ride's tracking into the alert and push it to the admin dashboards."""
+    alert = SOSAlert.objects.select_related("user").filter(pk=alert_id).first()
+    if alert is None or alert.resolved:
+        return
+    if alert.ride_id and not alert.tracking_snapshot:
+        alert.tracking_snapshot = tracking_snapshot(alert)
+        if alert.latitude is None and alert.tracking_snapshot:
+            # no fix from the phone: the last known position of the ride
+            alert.latitude, alert.longitude = alert.tracking_snapshot[0]["lat"], alert.tracking_snapshot[0]["lng"]
+        alert.save(update_fields=["tracking_snapshot", "latitude", "longitude"])
+    pubsub.publish(ADMIN_CHANNEL, alert_message(alert))
+
+
+def mark_delivered(alert_id, triggered_at, now=None):
+    """Stamp the first delivery to a dashboard and check it against the SLO. Returns the latency, or None if not first."""
+    now = now or timezone.now()
+    if not SOSAlert.objects.filter(pk=alert_id, delivered_at__isnull=True).update(delivered_at=now):
+        return None
+    latency = max(0.0, (now - triggered_at).total_seconds())
+    metrics.observe("drivemate_sos_delivery_seconds", latency)
+    if latency > settings.SOS_DELIVERY_SLO:
+        metrics.inc("drivemate_sos_slo_breaches_total", (("reason", "slow"),))
+        logger.error("SOS alert %s reached an admin after %.2fs (SLO %.1fs)", alert_id, latency, settings.SOS_DELIVERY_SLO)
+    return latency
+
+
+def check_delivery(now=None):
+    """Escalate open alerts no dashboard received within the SLO, once each, and push them again. Returns the count."""
+    now = now or timezone.now()
+    late = SOSAlert.objects.filter(resolved=False, delivered_at__isnull=True, escalated_at__isnull=True,
+                                   triggered_at__lt=now - timedelta(seconds=settings.SOS_DELIVERY_SLO))
+    alerts = list(late.select_related("user"))
+    if not alerts:
+        return 0
+    SOSAlert.objects.filter(pk__in=[a.pk for a in alerts], escalated_at__isnull=True).update(escalated_at=now)
+    metrics.inc("drivemate_sos_slo_breaches_total", (("reason", "undelivered"),), value=len(alerts))
+    logger.error("SOS alert(s) %s not delivered to any admin dashboard within %.1fs",
+                 ", ".join(str(a.pk) for a in alerts), settings.SOS_DELIVERY_SLO)
+    for alert in alerts:
+        pubsub.publish(ADMIN_CHANNEL, alert_message(alert))  # for dashboards opened since
+    return len(alerts)
+
+
+async def admin_sos_feed(socket):
+    """Push SOS alerts to a signed-in admin's dashboard."""
+    session = await socket.session()
+    if not socket.same_origin() or session.get("user_role") != "admin":
+        return await socket.close(FORBIDDEN)
+
+    async def delivered(message):
+        triggered_at = datetime.fromisoformat(message["triggered_at"])
+        await sync_to_async(mark_delivered)(message["id"], triggered_at)
+
+    await socket.accept()
+    async with pubsub.subscribe(ADMIN_CHANNEL) as feed:
+        await relay(socket, feed, on_sent=delivered)
@@ -0,0 +1,64 @@
+"""
+Side effects of the ride and payment views that run as background jobs
+(DriveMate/jobs.py) instead of on the request. Each may run more than once.
+"""
+from django.db.models import Avg, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from accounts.models import Driver
+from DriveMate.jobs import job
+from .dispatch import expire_stale_requests, widen
+from .models import Rating, Ride, RideRequest
+from . import sos
+
+
+@job()
+def update_rating_averages(driver_id):
+    """Recompute a driver's average rating in one UPDATE, so concurrent runs cannot overwrite each other."""
+    average = Rating.objects.filter(driver_id=OuterRef("pk")).values("driver_id").annotate(avg=Avg("score"))
+    Driver.objects.filter(pk=driver_id).update(rating=Coalesce(Subquery(average.values("avg")[:1]), F("rating")))
+
+
+@job()
+def cancel_losing_requests(accepted_request_id):
+    """Close the other requests that were still pending when a driver won the ride."""
+    accepted = RideRequest.objects.filter(pk=accepted_request_id).values("ride_id", "responded_at").first()
+    if accepted is None:
+        return
+    # requests sent after the win (the ride was reopened meanwhile) are not ours to close
+    RideRequest.objects.filter(
+        ride_id=accepted["ride_id"], status=RideRequest.Status.PENDING, requested_at__lte=accepted["responded_at"],
+    ).exclude(pk=accepted_request_id).close()
+
+
+@job()
+def store_fare(ride_id):
+    """Store the fare of a started ride that has none yet (set_ride_request_ongoing)."""
+    ride = Ride.objects.select_related("driver", "vehicle").filter(pk=ride_id, total_amount__isnull=True).first()
+    if ride is None:
+        return
+    ride.fill_fare()
+
+
+@job()
+def expire_ride_requests():
+    """Scheduled sweep of unanswered requests (rides/dispatch.py)."""
+    expire_stale_requests()
+
+
+@job()
+def widen_dispatch(ride_id, wave):
+    """Next auto-dispatch wave for a ride nobody has accepted yet."""
+    widen(ride_id, wave)
+
+
+@job(queue="sos", max_attempts=10, backoff=(1, 10))
+def process_sos(alert_id):
+    """Snapshot and push an SOS alert to the admin dashboards (rides/sos.py)."""
+    sos.process(alert_id)
+
+
+@job(queue="sos")
+def check_sos_delivery():
+    """Scheduled: escalate SOS alerts that missed the delivery SLO."""
+    sos.check_delivery()
@@ -1,3 +1,539 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from importlib.util import find_spec
+from unittest import mock, skipUnless
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.db import OperationalError, connection, connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from DriveMate import jobs, metrics, pubsub
+from accounts.models import Driver, Job, User
+from accounts.tests import seed_dataset
+from rides import sos
+from rides.dispatch import expire_stale_requests, start_auto_dispatch
+from rides.models import Rating, Ride, RideRequest, RideRequestQuerySet, RideTracking, SOSAlert
+from rides.signals import requests_closed, requests_offered
+from rides.tasks import expire_ride_requests
+
+
+class RatingJobTests(TestCase):
+    def test_rating_average_is_updated_by_a_job(self):
+        data = seed_dataset(n_drivers=2, n_rides=4)
+        ride, driver = data["ride"], data["driver"]
+        Rating.objects.filter(driver=driver).delete()
+        session = self.client.session
+        session["user_id"], session["user_role"] = data["customer"].id, "customer"
+        session.save()
+        self.client.post(reverse("rate_ride", args=[ride.id]), {"score": 2, "feedback": ""})
+        self.assertEqual(Job.objects.get(key=f"rating:{ride.rating.pk}").status, Job.Status.QUEUED)
+
+        jobs.run_pending(["default"])
+        driver.refresh_from_db()
+        self.assertEqual(driver.rating, 2.0)
+
+
+@override_settings(RIDE_REQUEST_TIMEOUT=300, RIDE_REQUEST_MAX_PER_RIDE=3)
+class RideRequestExpiryTests(TestCase):
+    def setUp(self):
+        data = seed_dataset(n_drivers=6, n_rides=0)
+        self.drivers = list(Driver.objects.order_by("pk"))
+        self.ride = Ride.objects.create(
+            customer=data["customer"], ride_mode=Ride.Mode.DRIVER_ONLY, status=Ride.Status.REQUESTED,
+            start_location="Fort Kochi", start_latitude=Decimal("9.93"), start_longitude=Decimal("76.26"),
+            end_location="Airport, Kochi", end_latitude=Decimal("10.15"), end_longitude=Decimal("76.39"),
+        )
+        self.old = timezone.now() - timedelta(minutes=10)
+
+    def request(self, driver, requested_at=None):
+        return RideRequest.objects.create(ride=self.ride, driver=driver, requested_at=requested_at or timezone.now())
+
+    def test_only_requests_past_the_timeout_expire(self):
+        stale = [self.request(d, self.old) for d in self.drivers[:3]]
+        fresh = self.request(self.drivers[3])
+        self.assertEqual(expire_stale_requests(batch_size=2, redispatch=False), (3, 0))
+        for rr in stale:
+            rr.refresh_from_db()
+            self.assertEqual(rr.status, RideRequest.Status.AUTO_CANCELLED)
+            self.assertIsNotNone(rr.responded_at)
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.status, RideRequest.Status.PENDING)
+
+    def test_expired_ride_goes_to_the_next_nearest_driver(self):
+        for d in self.drivers[:2]:
+            self.request(d, self.old)
+        Driver.objects.filter(pk=self.drivers[2].pk).update(is_available=False)
+        self.assertEqual(expire_stale_requests(redispatch=True), (2, 1))
+        offered = RideRequest.objects.get(ride=self.ride, status=RideRequest.Status.PENDING)
+        self.assertEqual(offered.driver, self.drivers[3])
+
+        # the per-ride cap stops the waves
+        RideRequest.objects.filter(pk=offered.pk).update(requested_at=self.old)
+        self.assertEqual(expire_stale_requests(redispatch=True), (1, 0))
+
+    def test_sweep_uses_the_status_requested_at_index(self):
+        stale = RideRequest.objects.filter(status=RideRequest.Status.PENDING, requested_at__lt=self.old)
+        plan = stale.order_by("requested_at").values_list("pk", "ride_id")[:500].explain()
+        index = RideRequest._meta.indexes[1].name
+        self.assertIn(index, plan)
+
+    def test_only_requests_the_update_closed_are_announced(self):
+        lost, won = self.request(self.drivers[0], self.old), self.request(self.drivers[1], self.old)
+        update = RideRequestQuerySet.update
+
+        def accepted_meanwhile(queryset, **values):
+            update(RideRequest.objects.filter(pk=won.pk), status=RideRequest.Status.ACCEPTED)
+            return update(queryset, **values)
+
+        announced = []
+        requests_closed.connect(lambda requests, **kwargs: announced.extend(requests), weak=False, dispatch_uid="test")
+        self.addCleanup(requests_closed.disconnect, dispatch_uid="test")
+        with mock.patch.object(RideRequestQuerySet, "update", accepted_meanwhile), \
+                self.captureOnCommitCallbacks(execute=True):
+            closed = RideRequest.objects.filter(status=RideRequest.Status.PENDING).close()
+        self.assertEqual(closed, 1)
+        self.assertEqual(announced, [(lost.pk, lost.driver_id)])
+
+    def test_the_job_runs_the_sweep(self):
+        rr = self.request(self.drivers[0], self.old)
+        jobs.enqueue(expire_ride_requests)
+        jobs.run_pending(["default"])
+        rr.refresh_from_db()
+        self.assertEqual(rr.status, RideRequest.Status.AUTO_CANCELLED)
+
+
+@override_settings(AUTO_DISPATCH_WAVE_SIZE=2, AUTO_DISPATCH_MAX_WAVES=2)
+class AutoDispatchTests(TestCase):
+    def setUp(self):
+        data = seed_dataset(n_drivers=6, n_rides=0)
+        self.drivers = list(Driver.objects.order_by("pk"))
+        self.ride = Ride.objects.create(
+            customer=data["customer"], ride_mode=Ride.Mode.DRIVER_ONLY, status=Ride.Status.REQUESTED,
+            start_location="Fort Kochi", start_latitude=Decimal("9.93"), start_longitude=Decimal("76.26"),
+            end_location="Airport, Kochi", end_latitude=Decimal("10.15"), end_longitude=Decimal("76.39"),
+        )
+        session = self.client.session
+        session["user_id"], session["user_role"] = data["customer"].id, "customer"
+        session.save()
+        metrics.reset()
+
+    def pending_drivers(self):
+        return set(RideRequest.objects.filter(ride=self.ride, status=RideRequest.Status.PENDING)
+                   .values_list("driver_id", flat=True))
+
+    def next_wave(self):
+        Job.objects.filter(task="rides.tasks.widen_dispatch").update(run_at=timezone.now())
+        jobs.run_pending(["default"])
+
+    def test_waves_widen_until_the_first_accept_wins(self):
+        offered = []
+        def on_offer(ride, driver_ids, **kwargs):
+            offered.append(sorted(driver_ids))
+        requests_offered.connect(on_offer)
+        self.addCleanup(requests_offered.disconnect, on_offer)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("select_driver", args=[self.ride.id]), {"action": "auto_dispatch"})
+        self.assertRedirects(response, reverse("trip_detail", args=[self.ride.id]), fetch_redirect_response=False)
+        first = {d.pk for d in self.drivers[:2]}
+        self.assertEqual(self.pending_drivers(), first)
+        self.assertEqual(offered, [sorted(first)])
+
+        self.next_wave()  # nobody answered: the next two nearest are asked too
+        self.assertEqual(self.pending_drivers(), {d.pk for d in self.drivers[:4]})
+
+        winner = RideRequest.objects.select_related("ride").get(ride=self.ride, driver=self.drivers[3])
+        self.assertTrue(winner.accept())
+        loser = RideRequest.objects.get(ride=self.ride, driver=self.drivers[0])
+        self.assertFalse(loser.accept())
+        self.next_wave()  # closes the losers; the ride is taken, so no third wave
+        self.assertEqual(self.pending_drivers(), set())
+        self.assertEqual(RideRequest.objects.filter(ride=self.ride).count(), 4)
+
+        _, histograms = metrics.snapshot()
+        self.assertEqual(histograms[("drivemate_ride_time_to_match_seconds", (("dispatch", "auto"),))][2], 1)
+
+    def test_dispatch_stops_after_the_last_wave(self):
+        start_auto_dispatch(self.ride)
+        self.assertEqual(start_auto_dispatch(self.ride), 0)  # already started
+        self.next_wave()
+        self.next_wave()
+        self.assertEqual(len(self.pending_drivers()), 4)
+        counters, _ = metrics.snapshot()
+        self.assertEqual(counters[("drivemate_dispatch_waves_total", (("result", "exhausted"),))], 1)
+
+        # the sweeper leaves auto-dispatched rides to their waves
+        RideRequest.objects.update(requested_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(expire_stale_requests(redispatch=True), (4, 0))
+
+
+class SocketClient:
+    """Plays the ASGI server's side of one WebSocket connection."""
+
+    def __init__(self, app, path, headers):
+        self.inbound, self.outbound = asyncio.Queue(), asyncio.Queue()
+        scope = {"type": "websocket", "path": path,
+                 "headers": [(k.encode(), v.encode()) for k, v in headers.items()]}
+        self.task = asyncio.ensure_future(app(scope, self.inbound.get, self.outbound.put))
+
+    async def connect(self):
+        await self.inbound.put({"type": "websocket.connect"})
+        return await self.next()
+
+    async def next(self):
+        event = await asyncio.wait_for(self.outbound.get(), 2)
+        return json.loads(event["text"]) if event["type"] == "websocket.send" else event
+
+    async def disconnect(self):
+        await self.inbound.put({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(self.task, 2)
+
+
+class DriverInboxTests(TestCase):
+    def setUp(self):
+        data = seed_dataset(n_drivers=2, n_rides=0)
+        self.driver, self.customer = data["driver"], data["customer"]
+        self.ride = Ride.objects.create(
+            customer=self.customer, ride_mode=Ride.Mode.DRIVER_ONLY, status=Ride.Status.REQUESTED,
+            start_location="Fort Kochi", start_latitude=Decimal("9.93"), start_longitude=Decimal("76.26"),
+            end_location="Airport, Kochi", end_latitude=Decimal("10.15"), end_longitude=Decimal("76.39"),
+        )
+
+    def headers(self, user, origin="http://testserver"):
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session["user_id"], session["user_role"] = user.id, user.role
+        session.save()
+        return {"host": "testserver", "origin": origin, "cookie": f"{settings.SESSION_COOKIE_NAME}={session.session_key}"}
+
+    def test_requests_are_pushed_as_they_happen(self):
+        from DriveMate.asgi import application
+        headers = self.headers(self.driver.user)
+
+        def offer():
+            with self.captureOnCommitCallbacks(execute=True):
+                return RideRequest.objects.create(ride=self.ride, driver=self.driver).pk
+
+        def close(pk):
+            with self.captureOnCommitCallbacks(execute=True):
+                RideRequest.objects.filter(pk=pk, status=RideRequest.Status.PENDING).close()
+
+        async def scenario():
+            inbox = SocketClient(application, "/ws/driver/inbox/", headers)
+            self.assertEqual((await inbox.connect())["type"], "websocket.accept")
+            pk = await sync_to_async(offer)()
+            new = await inbox.next()
+            self.assertEqual((new["type"], new["id"], new["pickup"]), ("request.new", pk, "Fort Kochi"))
+            await sync_to_async(close)(pk)
+            self.assertEqual(await inbox.next(), {"type": "request.closed", "id": pk, "status": "auto_cancelled"})
+
+            # waiting and receiving cost no queries: messages carry what the page shows
+            before = len(queries)
+            await asyncio.sleep(0.05)
+            pubsub.publish(f"driver:{self.driver.pk}", {"type": "request.status", "id": pk, "status": "rejected"})
+            self.assertEqual((await inbox.next())["status"], "rejected")
+            self.assertEqual(len(queries), before)
+            await inbox.disconnect()
+
+        with CaptureQueriesContext(connection) as queries:
+            async_to_sync(scenario)()
+
+    def test_only_the_signed_in_driver_from_this_site_may_listen(self):
+        from DriveMate.asgi import application
+        cases = [self.headers(self.customer), self.headers(self.driver.user, origin="https://evil.example"),
+                 {"host": "testserver", "origin": "http://testserver"}]
+
+        async def scenario():
+            for headers in cases:
+                inbox = SocketClient(application, "/ws/driver/inbox/", headers)
+                self.assertEqual(await inbox.connect(), {"type": "websocket.close", "code": 4403})
+            other = SocketClient(application, "/ws/nope/", cases[0])
+            self.assertEqual((await other.connect())["code"], 4404)
+
+        async_to_sync(scenario)()
+
+
+class SOSPipelineTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+        data = seed_dataset(n_drivers=2, n_rides=0)
+        self.driver, self.customer, self.admin = data["driver"], data["customer"], data["admin"]
+        self.ride = Ride.objects.create(
+            customer=self.customer, driver=self.driver, ride_mode=Ride.Mode.DRIVER_ONLY, status=Ride.Status.ONGOING,
+            start_location="Fort Kochi", start_latitude=Decimal("9.93"), start_longitude=Decimal("76.26"),
+            end_location="Airport, Kochi", end_latitude=Decimal("10.15"), end_longitude=Decimal("76.39"),
+        )
+        start = timezone.now() - timedelta(minutes=5)
+        RideTracking.objects.bulk_create(
+            RideTracking(ride=self.ride, latitude=Decimal("9.93") + Decimal(i) / 1000, longitude=Decimal("76.26"),
+                         timestamp=start + timedelta(seconds=10 * i))
+            for i in range(25)
+        )
+
+    def login(self, user):
+        session = self.client.session
+        session["user_id"], session["user_role"] = user.id, user.role
+        session.save()
+
+    def socket_headers(self, user):
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session["user_id"], session["user_role"] = user.id, user.role
+        session.save()
+        return {"host": "testserver", "origin": "http://testserver", "cookie": f"{settings.SESSION_COOKIE_NAME}={session.session_key}"}
+
+    def test_trigger_queues_the_alert_on_the_sos_lane(self):
+        self.login(self.customer)
+        resp = self.client.post(reverse("trigger_sos"), {"latitude": "not a number"})
+        self.assertEqual(resp.status_code, 201)
+        alert = SOSAlert.objects.get(pk=resp.json()["id"])
+        self.assertEqual((alert.ride_id, alert.latitude), (self.ride.pk, None))  # the active ride; bad fix ignored
+        self.assertEqual(Job.objects.get(key=f"sos:{alert.pk}").queue, "sos")
+        self.assertEqual(list(settings.JOB_QUEUES)[0], "sos")  # claimed first on every worker pass
+
+        self.login(self.driver.user)
+        resp = self.client.post(reverse("trigger_sos"), data=json.dumps({"ride_id": self.ride.pk, "latitude": 9.95, "longitude": 76.27}),
+                                content_type="application/json")
+        self.assertEqual(SOSAlert.objects.get(pk=resp.json()["id"]).latitude, Decimal("9.950000"))
+        other = Ride.objects.create(customer=self.customer, ride_mode=Ride.Mode.DRIVER_ONLY, start_location="A",
+                                    start_latitude=0, start_longitude=0, end_location="B", end_latitude=0, end_longitude=0)
+        self.assertEqual(self.client.post(reverse("trigger_sos"), {"ride_id": other.pk}).status_code, 404)
+        self.assertEqual(self.client.get(reverse("trigger_sos")).status_code, 405)
+
+    def test_alert_reaches_an_admin_dashboard_with_the_ride_tracking(self):
+        from DriveMate.asgi import application
+        headers = self.socket_headers(self.admin)
+
+        def trigger():
+            alert = sos.raise_alert(self.customer.id, "customer", ride=self.ride)
+            jobs.run_pending(["sos"])
+            return alert.pk
+
+        async def scenario():
+            dashboard = SocketClient(application, "/ws/admin/sos/", headers)
+            self.assertEqual((await dashboard.connect())["type"], "websocket.accept")
+            pk = await sync_to_async(trigger)()
+            message = await dashboard.next()
+            self.assertEqual((message["type"], message["id"], message["ride_id"]), ("sos", pk, self.ride.pk))
+            self.assertEqual(len(message["tracking"]), settings.SOS_TRACKING_POINTS)
+            self.assertEqual(message["latitude"], message["tracking"][0]["lat"])  # last known position
+            await asyncio.sleep(0.05)  # delivery is recorded after the send
+            await dashboard.disconnect()
+            return pk
+
+        pk = async_to_sync(scenario)()
+        alert = SOSAlert.objects.get(pk=pk)
+        self.assertIsNotNone(alert.delivered_at)
+        self.assertEqual(alert.tracking_snapshot[0]["lat"], 9.954)
+        _, histograms = metrics.snapshot()
+        self.assertEqual(histograms[("drivemate_sos_delivery_seconds", ())][2], 1)
+
+    def test_a_stopped_car_is_still_snapshotted_and_pushed(self):
+        # the usual emergency: last point reports speed 0, heading 0
+        RideTracking.objects.create(ride=self.ride, latitude=Decimal("9.96"), longitude=Decimal("76.26"),
+                                    speed_kmph=Decimal("0.00"), heading_deg=Decimal("0.00"))
+        alert = sos.raise_alert(self.customer.id, "customer", ride=self.ride,
+                                latitude=Decimal("0.000000"), longitude=Decimal("76.260000"))
+        jobs.run_pending(["sos"])
+        alert.refresh_from_db()
+        self.assertEqual(Job.objects.get(key=f"sos:{alert.pk}").status, Job.Status.DONE)
+        self.assertEqual((alert.tracking_snapshot[0]["speed_kmph"], alert.tracking_snapshot[0]["heading_deg"]), (0.0, 0.0))
+        self.assertEqual(sos.alert_message(alert)["latitude"], 0.0)
+
+    def test_only_admins_from_this_site_may_listen(self):
+        from DriveMate.asgi import application
+        headers = [self.socket_headers(self.customer), {**self.socket_headers(self.admin), "origin": "https://evil.example"}]
+
+        async def scenario():
+            for h in headers:
+                dashboard = SocketClient(application, "/ws/admin/sos/", h)
+                self.assertEqual(await dashboard.connect(), {"type": "websocket.close", "code": 4403})
+
+        async_to_sync(scenario)()
+
+    @override_settings(SOS_DELIVERY_SLO=2.0)
+    def test_slo_breaches_are_counted_and_undelivered_alerts_escalated_once(self):
+        now = timezone.now()
+        late = sos.raise_alert(self.customer.id, "customer", triggered_at=now - timedelta(seconds=10))
+        with self.assertLogs("rides.sos", "ERROR"):
+            self.assertEqual(sos.check_delivery(now=now), 1)
+        self.assertEqual(sos.check_delivery(now=now), 0)
+        late.refresh_from_db()
+        self.assertEqual(late.escalated_at, now)
+
+        with self.assertLogs("rides.sos", "ERROR"):
+            self.assertEqual(sos.mark_delivered(late.pk, late.triggered_at, now=now), 10.0)
+        self.assertIsNone(sos.mark_delivered(late.pk, late.triggered_at, now=now))  # first delivery only
+        counters, _ = metrics.snapshot()
+        self.assertEqual(counters[("drivemate_sos_slo_breaches_total", (("reason", "undelivered"),))], 1)
+        self.assertEqual(counters[("drivemate_sos_slo_breaches_total", (("reason", "slow"),))], 1)
+
+    def test_admin_dashboard_lists_and_resolves_open_alerts(self):
+        alert = sos.raise_alert(self.customer.id, "customer", ride=self.ride)
+        self.login(self.admin)
+        self.assertContains(self.client.get(reverse("admin_dashboard")), f'data-sos-id="{alert.pk}"')
+        self.client.post(reverse("resolve_sos", args=[alert.pk]))
+        alert.refresh_from_db()
+        self.assertTrue(alert.resolved)
+
+
+class AcceptRaceTests(TransactionTestCase):
+    """N drivers accept the same ride at once: exactly one wins."""
+
+    n_drivers = 50
+
+    def setUp(self):
+        customer = User.objects.create(name="Cust", email="cust@example.com", phone="900000000", role="customer")
+        self.ride = Ride.objects.create(
+            customer=customer, ride_mode=Ride.Mode.DRIVER_ONLY,
+            start_location="MG Road, Kochi", start_latitude=Decimal("9.97"), start_longitude=Decimal("76.28"),
+            end_location="Airport, Kochi", end_latitude=Decimal("10.15"), end_longitude=Decimal("76.39"),
+        )
+        self.requests = []
+        for i in range(self.n_drivers):
+            user = User.objects.create(name=f"Driver {i}", email=f"driver{i}@example.com", phone=f"91{i:08d}",
+                                       role="driver")
+            driver = Driver.objects.create(user=user, license_number=f"LIC{i:05d}", verified=True)
+            self.requests.append(RideRequest.objects.create(ride=self.ride, driver=driver))
+
+    def accept(self, ride_request, barrier, results):
+        barrier.wait()
+        try:
+            while True:
+                try:
+                    results[ride_request.pk] = ride_request.accept()
+                    return
+                except OperationalError:
+                    # SQLite's shared-cache test database reports lock contention
+                    # instead of waiting; a real client would simply retry
+                    time.sleep(0.001)
+        finally:
+            connections.close_all()
+
+    def test_exactly_one_winner(self):
+        barrier = threading.Barrier(self.n_drivers)
+        results = {}
+        threads = [threading.Thread(target=self.accept, args=(rr, barrier, results)) for rr in self.requests]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        jobs.run_pending()  # closes the losing requests
+        winners = [pk for pk, won in results.items() if won]
+        self.assertEqual(len(results), self.n_drivers)
+        self.assertEqual(len(winners), 1)
+
+        self.ride.refresh_from_db()
+        winner = RideRequest.objects.get(pk=winners[0])
+        self.assertEqual(self.ride.status, Ride.Status.ACCEPTED)
+        self.assertEqual(self.ride.driver_id, winner.driver_id)
+        self.assertEqual(winner.status, RideRequest.Status.ACCEPTED)
+        self.assertEqual(
+            RideRequest.objects.filter(ride=self.ride, status=RideRequest.Status.AUTO_CANCELLED).count(),
+            self.n_drivers - 1,
+        )
+
+    def test_loser_gets_already_taken(self):
+        first, second = self.requests[:2]
+        self.assertTrue(first.accept())
+        # second driver loaded the request before the ride was taken
+        self.assertFalse(second.accept())
+        jobs.run_pending()
+        second.refresh_from_db()
+        self.assertEqual(second.status, RideRequest.Status.AUTO_CANCELLED)
+
+        session = self.client.session
+        session["user_id"], session["user_role"] = second.driver.user_id, "driver"
+        session.save()
+        response = self.client.post(reverse("accept_ride_request", args=[second.pk]))
+        self.assertRedirects(response, reverse("driver_requests_list"), fetch_redirect_response=False)
+        self.assertIn("no longer available", str(list(get_messages(response.wsgi_request))[0]))
+
+
+
+@skipUnless(find_spec("gunicorn") and find_spec("uvicorn") and find_spec("websockets"), "needs the production server")
+class ProductionSOSDeliveryTests(SimpleTestCase):
+    """gunicorn -c gunicorn.conf.py, as deployed: an SOS reaches an admin's WebSocket within the SLO."""
+
+    def manage(self, *args, **kwargs):
+        return subprocess.run([sys.executable, "manage.py", *args], cwd=settings.BASE_DIR, env=self.env,
+                              capture_output=True, text=True, check=True, **kwargs).stdout
+
+    def shell(self, code):
+        return self.manage("shell", "-v", "0", "-c", code).strip()
+
+    def setUp(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            self.port = probe.getsockname()[1]
+        self.env = {**os.environ, "DATABASE_URL": f"sqlite:///{tmp}/db.sqlite3", "PORT": str(self.port),
+                    "BIND": f"127.0.0.1:{self.port}", "WEB_WORKERS": "1", "PUBSUB_BROKER_SOCKET": f"{tmp}/pubsub.sock"}
+        for name in ("WEB_WORKER_CLASS", "WEB_SIDECARS"):
+            self.env.pop(name, None)  # the defaults are what is under test
+        self.manage("migrate", "--noinput")
+        self.customer_id, self.admin_session = self.shell(
+            "from importlib import import_module; from django.conf import settings; from accounts.models import User;"
+            "c = User.objects.create(name='Cust', email='c@example.com', phone='900000000', role='customer');"
+            "a = User.objects.create(name='Admin', email='a@example.com', phone='900000001', role='admin');"
+            "s = import_module(settings.SESSION_ENGINE).SessionStore(); s['user_id'], s['user_role'] = a.id, 'admin';"
+            "s.save(); print(c.id, s.session_key)"
+        ).split()
+
+        log = open(f"{tmp}/gunicorn.log", "w+")
+        self.addCleanup(log.close)
+        server = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"], cwd=settings.BASE_DIR,
+                                  env=self.env, stdout=log, stderr=subprocess.STDOUT)
+
+        def stop():
+            server.terminate()
+            server.wait(40)
+        self.addCleanup(stop)
+        # up once the port answers and both sidecars have started
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline and server.poll() is None:
+            log.seek(0)
+            output = log.read()
+            if "pubsub broker on" in output and "\nworker " in output:
+                try:
+                    socket.create_connection(("127.0.0.1", self.port), timeout=1).close()
+                    return
+                except OSError:
+                    pass
+            time.sleep(0.2)
+        log.seek(0)
+        self.fail(f"gunicorn did not come up (exit code {server.poll()}):\n{log.read()}")
+
+    def test_alert_is_pushed_to_the_admin_dashboard(self):
+        from websockets.asyncio.client import connect
+
+        async def scenario():
+            headers = {"Origin": f"http://127.0.0.1:{self.port}",
+                       "Cookie": f"{settings.SESSION_COOKIE_NAME}={self.admin_session}"}
+            async with connect(f"ws://127.0.0.1:{self.port}/ws/admin/sos/", additional_headers=headers) as dashboard:
+                alert_id = await asyncio.get_running_loop().run_in_executor(None, self.shell, (
+                    f"from rides.sos import raise_alert; print(raise_alert({self.customer_id}, 'customer').pk)"))
+                message = json.loads(await asyncio.wait_for(dashboard.recv(), settings.SOS_DELIVERY_SLO))
+                self.assertEqual((message["type"], message["id"]), ("sos", int(alert_id)))
+            return alert_id
+
+        alert_id = asyncio.run(scenario())
+        delivered = self.shell(f"from rides.models import SOSAlert; a = SOSAlert.objects.get(pk={alert_id});"
+                               "print(a.delivered_at is not None, a.escalated_at is None)")
+        self.assertEqual(delivered, "True True")
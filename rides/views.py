@@ -7,7 +7,13 @@ from payments.models import Payment
 from .models import Ride, RideRequest, RidePurpose, Rating
 from accounts.models import Driver
 from vehicles.models import Vehicle
-from accounts.views import login_required_role
+from accounts.decorators import login_required_role
+from DriveMate.jobs import enqueue
+from DriveMate.perf import query_budget
+from DriveMate.routers import use_replica
+from .dispatch import start_auto_dispatch
+from .sos import active_ride_for, raise_alert
+from .tasks import update_rating_averages
 from django.utils import timezone
 from decimal import Decimal
 import math
@@ -24,6 +30,7 @@ from django.db.models import Avg
 from django.utils import timezone
 import datetime as _time
 
+@query_budget(2)
 @login_required_role(['customer'])
 def create_ride(request):
     if request.method == 'POST':
@@ -83,6 +90,7 @@ def create_ride(request):
     })
 
 
+@query_budget(6, max_db_ms=100)
 @login_required_role(['customer'])
 def select_driver(request, ride_id):
     DESIRED_RESULTS = 20  # change this if you want more/less
@@ -92,6 +100,17 @@ def select_driver(request, ride_id):
         messages.error(request, "Ride not found or you don't have permission.")
         return redirect('home')
 
+    if request.method == 'POST' and request.POST.get('action') == 'auto_dispatch':
+        if ride.dispatched_at is not None:
+            messages.warning(request, "We are already finding you a driver.")
+        elif ride.status != Ride.Status.REQUESTED:
+            messages.error(request, "This ride is no longer open.")
+        elif start_auto_dispatch(ride):
+            messages.success(request, "Request sent to the nearest drivers. The first to accept gets the ride.")
+        else:
+            messages.warning(request, "No driver is available nearby right now. We will keep trying.")
+        return redirect('trip_detail', ride_id=ride.id)
+
     if request.method == 'POST':
         driver_id = request.POST.get('driver_id')
         if driver_id:
@@ -205,7 +224,7 @@ def select_driver(request, ride_id):
 
     else:  # CAR_WITH_DRIVER
         # Build base_qs with user filters
-        base_qs = Vehicle.objects.select_related('current_driver__user')
+        base_qs = Vehicle.objects.select_related('current_driver__user').prefetch_related('images')
         if ride.female_driver_preference:
             base_qs = base_qs.filter(current_driver__user__gender='female')
         if vehicle_type:
@@ -281,6 +300,7 @@ def select_driver(request, ride_id):
     return render(request, 'select_driver.html', context)
 
 
+@query_budget(3)
 @login_required_role(['customer'])
 def get_driver_details(request, driver_id):
     try:
@@ -302,13 +322,19 @@ def get_driver_details(request, driver_id):
 
 
 
+@query_budget(2, max_db_ms=100)
+@use_replica
 @login_required_role(['customer'])
 def my_trips(request):
     """
     Show a paginated list (simple) of the customer's rides with quick actions.
     """
     customer_id = request.session.get('user_id')
-    rides = Ride.objects.filter(customer_id=customer_id).order_by('-created_at')
+    rides = (
+        Ride.objects.filter(customer_id=customer_id)
+        .select_related('driver__user')
+        .order_by('-created_at')
+    )
 
     # optional: simple status filter from querystring
     status = request.GET.get('status')
@@ -323,13 +349,18 @@ def my_trips(request):
 
 from vehicles.models import VehicleImage
 
+@query_budget(5, max_db_ms=100)
+@use_replica
 @login_required_role(['customer'])
 def trip_detail(request, ride_id):
     """
     Show ride details and driver requests. Allow cancelling or reopening (try another driver).
     """
     customer_id = request.session.get('user_id')
-    ride = get_object_or_404(Ride, id=ride_id, customer_id=customer_id)
+    ride = get_object_or_404(
+        Ride.objects.select_related('driver__user', 'vehicle').prefetch_related('vehicle__images'),
+        id=ride_id, customer_id=customer_id,
+    )
     payment = Payment.objects.filter(
         Q(ride=ride) & Q(status__in=[Payment.Status.SUCCESS, Payment.Status.PENDING, Payment.Status.FAILED, Payment.Status.REFUNDED])
     ).select_related("customer").first()
@@ -347,9 +378,7 @@ def trip_detail(request, ride_id):
                     ride.updated_at = timezone.now()
                     ride.save()
                     # mark pending requests as auto-cancelled
-                    RideRequest.objects.filter(ride=ride, status=RideRequest.Status.PENDING).update(
-                        status=RideRequest.Status.AUTO_CANCELLED, responded_at=timezone.now()
-                    )
+                    RideRequest.objects.filter(ride=ride, status=RideRequest.Status.PENDING).close()
                     messages.success(request, "Ride cancelled.")
                     return redirect('my_trips')
 
@@ -358,12 +387,11 @@ def trip_detail(request, ride_id):
                     ride.status = Ride.Status.REQUESTED
                     ride.driver = None
                     ride.vehicle = None
+                    ride.dispatched_at = None  # back to picking drivers by hand
                     ride.updated_at = timezone.now()
                     ride.save()
                     # mark previously accepted request (if any) as auto_cancelled
-                    RideRequest.objects.filter(ride=ride, status=RideRequest.Status.ACCEPTED).update(
-                        status=RideRequest.Status.AUTO_CANCELLED, responded_at=timezone.now()
-                    )
+                    RideRequest.objects.filter(ride=ride, status=RideRequest.Status.ACCEPTED).close()
                     messages.success(request, "Ride reopened. Please choose another driver.")
                     return redirect('select_driver', ride_id=ride.id)
 
@@ -431,6 +459,7 @@ class RatingForm(forms.ModelForm):
         fields = ['score', 'feedback']
 
 # View for Customer to Rate a Ride (Driver and Vehicle)
+@query_budget(10)
 @login_required_role(allowed_roles=['customer'])
 def rate_ride(request, ride_id):
     ride = get_object_or_404(Ride, pk=ride_id, customer__id=request.session.get('user_id'), status=Ride.Status.COMPLETED)
@@ -448,23 +477,11 @@ def rate_ride(request, ride_id):
             rating.customer_id = request.session.get('user_id')
             rating.driver = ride.driver
             rating.vehicle = ride.vehicle
-            rating.save()
-            
-            # Update driver's average rating
-            if ride.driver:
-                driver_ratings = Rating.objects.filter(driver=ride.driver)
-                if driver_ratings.exists():
-                    avg_driver_rating = driver_ratings.aggregate(Avg('score'))['score__avg']
-                    ride.driver.rating = avg_driver_rating
-                    ride.driver.save()
-            
-            # Update vehicle's average rating (assuming Vehicle has a 'rating' field)
-            if ride.vehicle:
-                vehicle_ratings = Rating.objects.filter(vehicle=ride.vehicle)
-                if vehicle_ratings.exists():
-                    avg_vehicle_rating = vehicle_ratings.aggregate(Avg('score'))['score__avg']
-                    ride.vehicle.rating = avg_vehicle_rating
-                    ride.vehicle.save()
+            with transaction.atomic():
+                rating.save()
+                # the driver's average is recomputed by a background job
+                if ride.driver_id:
+                    enqueue(update_rating_averages, key=f"rating:{rating.pk}", driver_id=ride.driver_id)
             
             messages.success(request, "Rating submitted successfully.")
             return redirect('my_trips')  # Redirect after success
@@ -478,10 +495,12 @@ def rate_ride(request, ride_id):
     return render(request, 'rate_ride.html', context)
 
 # View for Customer to View Driver Rating
+@query_budget(4)
+@use_replica
 @login_required_role(allowed_roles=['customer'])
 def view_driver_rating(request, driver_id):
-    driver = get_object_or_404(Driver, pk=driver_id)
-    ratings = Rating.objects.filter(driver=driver)
+    driver = get_object_or_404(Driver.objects.select_related('user'), pk=driver_id)
+    ratings = Rating.objects.filter(driver=driver).select_related('ride__customer')
     avg_rating = ratings.aggregate(Avg('score'))['score__avg'] if ratings.exists() else 0.0
     context = {
         'driver': driver,
@@ -491,3 +510,52 @@ def view_driver_rating(request, driver_id):
     return render(request, 'view_driver_rating.html', context)
 
 
+
+
+def _coordinate(value, limit):
+    try:
+        value = Decimal(str(value)).quantize(Decimal("0.000001"))
+    except (ArithmeticError, ValueError, TypeError):
+        return None
+    return value if value.is_finite() and abs(value) <= limit else None
+
+
+@query_budget(5)
+@login_required_role(['customer', 'driver'])
+def trigger_sos(request):
+    """
+    POST (JSON or form, all optional): ride_id, latitude, longitude
+
+    Records the alert and hands it to the SOS job lane (rides/sos.py); the
+    response does not wait for anything else. A bad or missing position is
+    not an error: the ride's last tracking point is used instead.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except json.JSONDecodeError:
+            data = {}
+        if not isinstance(data, dict):
+            data = {}
+    else:
+        data = request.POST
+
+    user_id = request.session['user_id']
+    ride = None
+    if data.get('ride_id'):
+        ride_id = str(data['ride_id'])
+        mine = Q(customer_id=user_id) | Q(driver__user_id=user_id)
+        ride = Ride.objects.filter(mine, pk=ride_id).first() if ride_id.isdigit() else None
+        if ride is None:
+            return JsonResponse({'error': 'Ride not found'}, status=404)
+    else:
+        ride = active_ride_for(user_id)
+
+    latitude = _coordinate(data.get('latitude'), 90)
+    longitude = _coordinate(data.get('longitude'), 180)
+    if latitude is None or longitude is None:
+        latitude = longitude = None
+    alert = raise_alert(user_id, request.session.get('user_role'), ride=ride, latitude=latitude, longitude=longitude)
+    return JsonResponse({'id': alert.pk, 'status': 'received', 'ride_id': alert.ride_id}, status=201)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_driver_accounts_dr_is_avai_d24654_idx'),
+        ('vehicles', '0002_auto_20250829_2243'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['current_driver', 'active', 'verified'], name='vehicles_ve_current_26181b_idx'),
+        ),
+    ]
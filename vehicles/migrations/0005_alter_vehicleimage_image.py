@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:17
+
+import DriveMate.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0004_vehicleimage_renditions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='vehicleimage',
+            name='image',
+            field=models.ImageField(storage=DriveMate.storage.content_addressed_storage, upload_to='vehicle_images/'),
+        ),
+    ]
@@ -3,6 +3,8 @@ from django.db import models
 from django.db.models import Q
 from django.utils import timezone
 
+from DriveMate.storage import ContentAddressedFilesMixin, content_addressed_storage
+
 
 class Vehicle(models.Model):
     class VehicleType(models.TextChoices):
@@ -60,17 +62,24 @@ class Vehicle(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        indexes = [models.Index(fields=["registration_number"])]
+        indexes = [
+            models.Index(fields=["registration_number"]),
+            models.Index(fields=["current_driver", "active", "verified"]),
+        ]
 
     def __str__(self):
         return f"{self.make} {self.model} ({self.registration_number})"
 
-class VehicleImage(models.Model):
+class VehicleImage(ContentAddressedFilesMixin, models.Model):
+    content_addressed_fields = ("image",)
+
     vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name="images")
-    image = models.ImageField(upload_to="vehicle_images/")
+    image = models.ImageField(upload_to="vehicle_images/", storage=content_addressed_storage)
     caption = models.CharField(max_length=120, blank=True)
     is_primary = models.BooleanField(default=False)
     uploaded_at = models.DateTimeField(default=timezone.now)
+    # resized AVIF/WebP copies of image, filled in after upload (DriveMate/images.py)
+    renditions = models.JSONField(default=dict, blank=True, editable=False)
 
     class Meta:
         constraints = [
@@ -0,0 +1,31 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from DriveMate.images import CONTENT_TYPES
+
+register = template.Library()
+
+
+@register.simple_tag
+def picture(field_file, renditions, sizes="100vw", **attrs):
+    """<picture> with a srcset per rendition format, falling back to the original.
+
+    {% picture img.image img.renditions sizes="(min-width: 640px) 50vw, 100vw" class="w-full" loading="lazy" %}
+    """
+    if not field_file:
+        return ""
+    img_attrs = format_html_join("", ' {}="{}"', ((k.replace("_", "-"), v) for k, v in attrs.items()))
+    img = format_html('<img src="{}"{}>', field_file.url, img_attrs)
+    renditions = renditions or {}
+    if renditions.get("source") != field_file.name:
+        return img  # not rendered yet, or rendered for a replaced file
+    storage = field_file.storage
+    sources = format_html_join(
+        "", '<source type="{}" srcset="{}" sizes="{}">',
+        (
+            (CONTENT_TYPES.get(fmt, f"image/{fmt}"), ", ".join(f"{storage.url(name)} {w}w" for w, name in entries), sizes)
+            for fmt, entries in renditions.get("sources", {}).items() if entries
+        ),
+    )
+    # display: contents keeps the <img> sized by the surrounding layout as before
+    return format_html('<picture style="display: contents">{}{}</picture>', sources, img)
@@ -7,5 +7,5 @@ from django.http import HttpResponseForbidden
 
 from rides.models import Ride, RideRequest
 from accounts.models import Driver as DriverModel  
-from accounts.views import login_required_role  
+from accounts.decorators import login_required_role  
 